@@ -0,0 +1,190 @@
+"""
+Análise das conversas em historico_usuarios/: distribuição de categorias, taxas de
+fallback e de DESCONHECIDO, uso das respostas "initial" e "continuation" e volume
+por hora. Os arquivos são lidos linha a linha, em vários processos, e só os
+agregados ficam na memória. O resultado vai para arquivos pequenos em <saida>/:
+resumo.json, categorias.csv, caminhos.csv, tipos_resposta.csv e volume_por_hora.csv.
+
+Uso: python analise_historico.py [diretorio_historico] [--saida analises] [--trabalhadores 4]
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from historico_armazenamento import ArmazenamentoHistorico
+from serializacao import de_json
+
+CAMINHOS_FALLBACK = ("palavra_chave", "similaridade")
+# Interações gravadas antes de o histórico registrar o caminho da decisão
+CAMINHO_NAO_REGISTRADO = "nao_registrado"
+# Interações gravadas antes de o histórico registrar a versão da resposta ('initial'/'continuation')
+TIPO_NAO_REGISTRADO = "nao_registrado"
+
+
+def ler_registros(caminho: str):
+    """
+    Gera as interações de um histórico JSONL (arquivado em gzip ou não, ou JSON legado),
+    ignorando linhas inválidas.
+    """
+    if caminho.endswith(ArmazenamentoHistorico.EXTENSAO_LEGADO):
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            yield from json.load(arquivo)
+        return
+    abrir = gzip.open if caminho.endswith('.gz') else open
+    with abrir(caminho, 'rb') as arquivo:
+        for linha in arquivo:
+            try:
+                yield de_json(linha)
+            except ValueError:
+                continue
+
+
+def analisar_arquivos(usuarios: list) -> dict:
+    """
+    Agrega um grupo de históricos (roda em um processo trabalhador). Cada item é a
+    lista de arquivos de um usuário: arquivado, layout plano e ativo.
+    """
+    agregados = {
+        "categorias": Counter(),
+        "caminhos": Counter(),
+        "tipos_resposta": Counter(),  # (categoria, tipo)
+        "volume_por_hora": Counter(),  # 'AAAA-MM-DDTHH'
+        "desconhecido_por_hora": Counter(),
+        "interacoes": 0,
+        "usuarios": 0
+    }
+    categorias = agregados["categorias"]
+    caminhos_decisao = agregados["caminhos"]
+    tipos = agregados["tipos_resposta"]
+    volume = agregados["volume_por_hora"]
+    desconhecido = agregados["desconhecido_por_hora"]
+
+    for caminhos in usuarios:
+        quantidade = 0
+        for registro in (registro for caminho in caminhos for registro in ler_registros(caminho)):
+            categoria = registro.get("categoria")
+            hora = (registro.get("timestamp") or "")[:13]
+            categorias[categoria] += 1
+            caminhos_decisao[registro.get("caminho") or (
+                "desconhecido" if categoria == "DESCONHECIDO" else CAMINHO_NAO_REGISTRADO)] += 1
+            tipos[(categoria, registro.get("tipo_resposta") or TIPO_NAO_REGISTRADO)] += 1
+            volume[hora] += 1
+            if categoria == "DESCONHECIDO":
+                desconhecido[hora] += 1
+            quantidade += 1
+        agregados["interacoes"] += quantidade
+        agregados["usuarios"] += quantidade > 0
+    return agregados
+
+
+def _juntar(total: dict, parcial: dict):
+    for chave, valor in parcial.items():
+        if isinstance(valor, Counter):
+            total[chave].update(valor)
+        else:
+            total[chave] += valor
+
+
+def analisar_diretorio(diretorio: str = 'historico_usuarios', trabalhadores: int = None) -> dict:
+    armazenamento = ArmazenamentoHistorico(diretorio)
+    usuarios = []
+    for id_usuario in armazenamento.listar_usuarios():
+        caminhos = armazenamento.arquivos_usuario(id_usuario)
+        if caminhos:
+            usuarios.append((sum(os.path.getsize(caminho) for caminho in caminhos), caminhos))
+
+    # Grupos equilibrados por tamanho em bytes, alguns por processo
+    trabalhadores = trabalhadores or os.cpu_count() or 2
+    quantidade_grupos = max(1, min(len(usuarios), trabalhadores * 4))
+    grupos = [[] for _ in range(quantidade_grupos)]
+    tamanhos = [0] * quantidade_grupos
+    for tamanho, caminhos in sorted(usuarios, key=lambda usuario: usuario[0], reverse=True):
+        indice = tamanhos.index(min(tamanhos))
+        grupos[indice].append(caminhos)
+        tamanhos[indice] += tamanho
+
+    total = analisar_arquivos([])
+    if trabalhadores == 1 or len(usuarios) < 2:
+        _juntar(total, analisar_arquivos([caminhos for _, caminhos in usuarios]))
+    else:
+        with ProcessPoolExecutor(trabalhadores) as executor:
+            for parcial in executor.map(analisar_arquivos, grupos):
+                _juntar(total, parcial)
+    total["arquivos"] = sum(len(caminhos) for _, caminhos in usuarios)
+    total["bytes"] = sum(tamanhos)
+    return total
+
+
+def resumir(agregados: dict) -> dict:
+    interacoes = agregados["interacoes"]
+    caminhos = agregados["caminhos"]
+    com_caminho = interacoes - caminhos[CAMINHO_NAO_REGISTRADO]
+    tipos = Counter()
+    for (_, tipo), quantidade in agregados["tipos_resposta"].items():
+        tipos[tipo] += quantidade
+
+    def taxa(parte, todo):
+        return round(parte / todo, 4) if todo else None
+
+    return {
+        "usuarios": agregados["usuarios"],
+        "interacoes": interacoes,
+        "arquivos": agregados.get("arquivos"),
+        "bytes": agregados.get("bytes"),
+        "taxa_desconhecido": taxa(agregados["categorias"]["DESCONHECIDO"], interacoes),
+        # Só entre as interações que registram o caminho da decisão
+        "taxa_fallback": taxa(sum(caminhos[caminho] for caminho in CAMINHOS_FALLBACK), com_caminho),
+        "interacoes_com_caminho": com_caminho,
+        # Só entre as interações que registram a versão da resposta
+        "interacoes_com_tipo_resposta": interacoes - tipos[TIPO_NAO_REGISTRADO],
+        "respostas_initial": tipos["initial"],
+        "respostas_continuation": tipos["continuation"],
+        "taxa_continuation": taxa(tipos["continuation"], interacoes - tipos[TIPO_NAO_REGISTRADO])
+    }
+
+
+def gravar_resultados(agregados: dict, diretorio_saida: str) -> dict:
+    os.makedirs(diretorio_saida, exist_ok=True)
+    resumo = resumir(agregados)
+    with open(os.path.join(diretorio_saida, 'resumo.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(resumo, arquivo, ensure_ascii=False, indent=2)
+
+    def gravar_csv(nome, cabecalho, linhas):
+        with open(os.path.join(diretorio_saida, nome), 'w', encoding='utf-8', newline='') as arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(cabecalho)
+            escritor.writerows(linhas)
+
+    interacoes = agregados["interacoes"] or 1
+    gravar_csv('categorias.csv', ['categoria', 'interacoes', 'fracao'],
+               [(categoria, quantidade, round(quantidade / interacoes, 4))
+                for categoria, quantidade in agregados["categorias"].most_common()])
+    gravar_csv('caminhos.csv', ['caminho', 'interacoes'], agregados["caminhos"].most_common())
+    gravar_csv('tipos_resposta.csv', ['categoria', 'tipo', 'interacoes'],
+               [(categoria, tipo, quantidade)
+                for (categoria, tipo), quantidade in sorted(agregados["tipos_resposta"].items(), key=str)])
+    gravar_csv('volume_por_hora.csv', ['hora', 'interacoes', 'desconhecido'],
+               [(hora, quantidade, agregados["desconhecido_por_hora"][hora])
+                for hora, quantidade in sorted(agregados["volume_por_hora"].items())])
+    return resumo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Análise agregada do histórico de conversas.")
+    parser.add_argument('diretorio', nargs='?', default='historico_usuarios')
+    parser.add_argument('--saida', default='analises')
+    parser.add_argument('--trabalhadores', type=int, default=None)
+    argumentos = parser.parse_args()
+
+    inicio = time.perf_counter()
+    agregados = analisar_diretorio(argumentos.diretorio, argumentos.trabalhadores)
+    resumo = gravar_resultados(agregados, argumentos.saida)
+    duracao = time.perf_counter() - inicio
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    print(f"✅ {resumo['interacoes']} interações de {resumo['usuarios']} usuários em {duracao:.2f} s "
+          f"({resumo['bytes'] / max(duracao, 1e-9) / 1e6:.1f} MB/s) -> {argumentos.saida}/")
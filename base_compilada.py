@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sys
+
+from normalizacao import normalizar_texto
+
+# 2: frases sem acentos e sem pontuação (normalizar_texto)
+VERSAO_FORMATO = 2
+
+
+def _origem(arquivo_base: str) -> dict:
+    estado = os.stat(arquivo_base)
+    return {"tamanho": estado.st_size, "modificado_em": estado.st_mtime_ns}
+
+
+def hash_conteudo(frases: list, categorias: list) -> str:
+    """Impressão digital dos pares (frase, categoria) usados no treino do modelo."""
+    conteudo = json.dumps([frases, categorias], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def compilar_base(arquivo_base: str) -> dict:
+    """
+    Lê a base de conhecimento, normaliza as frases, remove pares repetidos (a primeira
+    ocorrência de cada frase vence) e calcula o hash do conteúdo.
+    """
+    with open(arquivo_base, 'r', encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+    frases_originais, categorias_originais = dados['frases'], dados['categorias']
+    quantidade = min(len(frases_originais), len(categorias_originais))
+
+    vistas = {}
+    frases, categorias = [], []
+    conflitos = 0
+    for frase, categoria in zip(frases_originais[:quantidade], categorias_originais[:quantidade]):
+        frase = normalizar_texto(frase)
+        if not frase:
+            continue
+        if frase in vistas:
+            conflitos += vistas[frase] != categoria
+            continue
+        vistas[frase] = categoria
+        frases.append(frase)
+        categorias.append(categoria)
+
+    return {
+        "versao": VERSAO_FORMATO,
+        "origem": _origem(arquivo_base),
+        "hash": hash_conteudo(frases, categorias),
+        "frases": frases,
+        "categorias": categorias,
+        "palavras_chave": dados.get('palavras_chave'),
+        "estatisticas": {
+            "pares_originais": quantidade,
+            "pares_compilados": len(frases),
+            "repetidas": quantidade - len(frases),
+            "conflitos": conflitos
+        }
+    }
+
+
+def salvar_base_compilada(base: dict, arquivo_compilado: str):
+    caminho_temporario = f"{arquivo_compilado}.{os.getpid()}.tmp"
+    with open(caminho_temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(base, arquivo, ensure_ascii=False, separators=(',', ':'))
+    os.replace(caminho_temporario, arquivo_compilado)
+
+
+def carregar_base_compilada(arquivo_base: str, arquivo_compilado: str) -> dict:
+    """
+    Usa o artefato compilado se ele foi gerado a partir da versão atual de 'arquivo_base'
+    (mesmo tamanho e data de modificação); senão, compila de novo e grava o artefato.
+    """
+    if os.path.exists(arquivo_compilado):
+        try:
+            with open(arquivo_compilado, 'r', encoding='utf-8') as arquivo:
+                base = json.load(arquivo)
+            if base.get("versao") == VERSAO_FORMATO and base.get("origem") == _origem(arquivo_base):
+                return base
+        except (json.JSONDecodeError, OSError):
+            pass
+
+    base = compilar_base(arquivo_base)
+    try:
+        salvar_base_compilada(base, arquivo_compilado)
+    except OSError as erro:
+        print(f"⚠️  Não foi possível gravar a base compilada: {erro}")
+    return base
+
+
+if __name__ == "__main__":
+    arquivo_base = sys.argv[1] if len(sys.argv) > 1 else 'base_conhecimento.json'
+    arquivo_compilado = sys.argv[2] if len(sys.argv) > 2 else 'base_conhecimento_compilada.json'
+    base = compilar_base(arquivo_base)
+    salvar_base_compilada(base, arquivo_compilado)
+    estatisticas = base["estatisticas"]
+    print(f"✅ {estatisticas['pares_compilados']} frases compiladas em '{arquivo_compilado}' "
+          f"({estatisticas['repetidas']} repetidas, {estatisticas['conflitos']} com categorias conflitantes). "
+          f"Hash: {base['hash'][:12]}")
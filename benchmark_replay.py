@@ -0,0 +1,324 @@
+"""
+Benchmark de replay: reenvia um trace de mensagens (gravado ou sintético) pelo
+ChatbotClinica.processar_mensagem, pela rota /api/chat/mensagem (cliente de teste
+do Flask) ou por um servidor em execução, e mede latência, vazão e o tempo de cada
+etapa. Roda em um diretório temporário: não toca no histórico real.
+
+Exemplos:
+    python benchmark_replay.py --sintetico 2000
+    python benchmark_replay.py --trace historico_usuarios/d8/f6/anonimo_historico.jsonl --modo http
+    python benchmark_replay.py --sintetico 1000 --curvas
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+ETAPAS = ("carregar_estado", "classificacao_ml", "palavras_chave", "similaridade", "salvar_historico")
+
+
+# --- Traces ---
+def carregar_trace(caminho: str) -> list:
+    """Lê um JSONL com 'mensagem' (ou 'mensagem_usuario', como no histórico) e 'usuario_id' opcional."""
+    trace = []
+    with open(caminho, 'r', encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            if not linha.strip():
+                continue
+            registro = json.loads(linha)
+            mensagem = registro.get('mensagem', registro.get('mensagem_usuario'))
+            if mensagem is not None:
+                trace.append({"mensagem": mensagem, "usuario_id": registro.get('usuario_id', 'anonimo')})
+    return trace
+
+
+def gerar_trace_sintetico(frases: list, quantidade: int, usuarios: int = 50, semente: int = 42) -> list:
+    """
+    Mistura frases da base (caminho do ML), frases com erros de digitação (fallback) e
+    mensagens sem relação com a base (DESCONHECIDO). Poucos usuários concentram a maior parte.
+    """
+    aleatorio = random.Random(semente)
+    aleatorias = ["qual o nome do médico", "xpto", "vocês atendem sábado", "meu filho está com febre", "ok"]
+    trace = []
+    for _ in range(quantidade):
+        sorteio = aleatorio.random()
+        frase = aleatorio.choice(frases)
+        if sorteio < 0.6:
+            mensagem = frase
+        elif sorteio < 0.9 and len(frase) > 3:
+            posicao = aleatorio.randrange(len(frase))
+            mensagem = frase[:posicao] + frase[posicao + 1:]
+        else:
+            mensagem = aleatorio.choice(aleatorias)
+        usuario = f"usuario_{min(int(aleatorio.paretovariate(1.2)), usuarios)}"
+        trace.append({"mensagem": mensagem, "usuario_id": usuario})
+    return trace
+
+
+# --- Medição ---
+class MedidorEtapas:
+    """Acumula a duração de cada etapa do processamento (seguro entre threads)."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.duracoes = {etapa: [] for etapa in ETAPAS}
+
+    def registrar(self, etapa: str, segundos: float):
+        with self._trava:
+            self.duracoes[etapa].append(segundos)
+
+
+def instrumentar(chatbot, medidor: MedidorEtapas):
+    """Registra o medidor nos ganchos de métricas do ChatbotClinica, cronometrando todas as chamadas."""
+    chatbot.metricas.taxa_amostragem = 1.0
+    chatbot.metricas.observadores.append(
+        lambda etapa, segundos: etapa in medidor.duracoes and medidor.registrar(etapa, segundos)
+    )
+
+
+def percentis(valores: list) -> dict:
+    if not valores:
+        return {"n": 0}
+    ordenados = sorted(valores)
+
+    def percentil(fracao):
+        return ordenados[min(len(ordenados) - 1, int(fracao * len(ordenados)))] * 1000
+
+    return {
+        "n": len(ordenados),
+        "media_ms": round(sum(ordenados) / len(ordenados) * 1000, 4),
+        "p50_ms": round(percentil(0.50), 4),
+        "p95_ms": round(percentil(0.95), 4),
+        "p99_ms": round(percentil(0.99), 4)
+    }
+
+
+def executar_replay(enviar, trace: list, concorrencia: int = 1) -> dict:
+    latencias = []
+    trava = threading.Lock()
+
+    def enviar_medindo(item):
+        inicio = time.perf_counter()
+        enviar(item)
+        duracao = time.perf_counter() - inicio
+        with trava:
+            latencias.append(duracao)
+
+    inicio = time.perf_counter()
+    if concorrencia <= 1:
+        for item in trace:
+            enviar_medindo(item)
+    else:
+        with ThreadPoolExecutor(concorrencia) as executor:
+            list(executor.map(enviar_medindo, trace))
+    duracao_total = time.perf_counter() - inicio
+
+    return {
+        "requisicoes": len(trace),
+        "concorrencia": concorrencia,
+        "requisicoes_por_segundo": round(len(trace) / duracao_total, 1) if duracao_total else None,
+        "latencia": percentis(latencias)
+    }
+
+
+# --- Ambiente isolado ---
+def preparar_ambiente(diretorio_origem: str, multiplicador_base: int = 1, semente: int = 42) -> str:
+    """
+    Cria um diretório temporário com a base de conhecimento (ampliada com variações
+    sintéticas se 'multiplicador_base' > 1) e o modelo, e passa a trabalhar nele.
+    """
+    diretorio = tempfile.mkdtemp(prefix='benchmark_chatbot_')
+    with open(os.path.join(diretorio_origem, 'base_conhecimento.json'), 'r', encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+
+    if multiplicador_base > 1:
+        aleatorio = random.Random(semente)
+        originais = list(zip(dados['frases'], dados['categorias']))
+        frases, categorias = list(dados['frases']), list(dados['categorias'])
+        for _ in range(len(originais) * (multiplicador_base - 1)):
+            frase, categoria = aleatorio.choice(originais)
+            extra = aleatorio.choice(originais)[0].split()[0]
+            frases.append(f"{frase} {extra}")
+            categorias.append(categoria)
+        dados['frases'], dados['categorias'] = frases, categorias
+    else:
+        for nome in ('modelo_chatbot.joblib', 'modelo_compilado'):
+            origem = os.path.join(diretorio_origem, nome)
+            if os.path.isdir(origem):
+                shutil.copytree(origem, os.path.join(diretorio, nome))
+            elif os.path.exists(origem):
+                shutil.copy(origem, diretorio)
+
+    with open(os.path.join(diretorio, 'base_conhecimento.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, ensure_ascii=False)
+    os.chdir(diretorio)
+    return diretorio
+
+
+def preencher_historicos(chatbot, usuarios: set, turnos: int):
+    """Grava 'turnos' interações antigas para cada usuário do trace."""
+    registro = {"mensagem_usuario": "oi", "resposta_chatbot": "Olá!", "categoria": "SAUDAÇÃO",
+                "timestamp": "2024-01-01T00:00:00"}
+    for usuario in usuarios:
+        chatbot.armazenamento_historico.anexar_varios(usuario, [registro] * turnos)
+
+
+def criar_chatbot(usar_pontuador_compilado: bool, sem_cache: bool, janela_micro_lote_ms: float = 0,
+                  modo_historico: str = 'sincrono'):
+    from chatbot_core import ChatbotClinica
+
+    chatbot = ChatbotClinica(usar_pontuador_compilado=usar_pontuador_compilado,
+                             janela_micro_lote_ms=janela_micro_lote_ms, modo_historico=modo_historico)
+    if sem_cache:
+        chatbot.cache_predicao.cache.capacidade = 0
+    return chatbot
+
+
+def medir_em_processo(trace: list, concorrencia: int, usar_pontuador_compilado: bool,
+                      sem_cache: bool, turnos_historico: int = 0, janela_micro_lote_ms: float = 0,
+                      modo_historico: str = 'sincrono') -> dict:
+    chatbot = criar_chatbot(usar_pontuador_compilado, sem_cache, janela_micro_lote_ms, modo_historico)
+    preencher_historicos(chatbot, {item['usuario_id'] for item in trace}, turnos_historico)
+    medidor = MedidorEtapas()
+    instrumentar(chatbot, medidor)
+
+    resultado = executar_replay(
+        lambda item: chatbot.processar_mensagem(item['mensagem'], item['usuario_id']), trace, concorrencia
+    )
+    chatbot.encerrar()  # descarrega o buffer do histórico antes de apagar o diretório temporário
+    resultado["etapas"] = {etapa: percentis(duracoes) for etapa, duracoes in medidor.duracoes.items()}
+    if chatbot.micro_lote is not None:
+        resultado["micro_lote"] = chatbot.micro_lote.estatisticas()
+    return resultado
+
+
+def medir_http(trace: list, concorrencia: int, url: str = None) -> dict:
+    if url:
+        import urllib.request
+
+        def enviar(item):
+            requisicao = urllib.request.Request(
+                url.rstrip('/') + '/api/chat/mensagem', data=json.dumps(item).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}, method='POST'
+            )
+            with urllib.request.urlopen(requisicao) as resposta:
+                resposta.read()
+        return executar_replay(enviar, trace, concorrencia)
+
+    # O replay envia o mais rápido possível: sem controle de admissão, a não ser que o ambiente defina um
+    os.environ.setdefault('CHATBOT_LIMITE_EM_ANDAMENTO', '0')
+    os.environ.setdefault('CHATBOT_TAXA_POR_USUARIO', '0')
+    import servidor_api
+
+    medidor = MedidorEtapas()
+    instrumentar(servidor_api.chatbot, medidor)
+    cliente = servidor_api.app.test_client()
+    resultado = executar_replay(lambda item: cliente.post('/api/chat/mensagem', json=item), trace, concorrencia)
+    resultado["etapas"] = {etapa: percentis(duracoes) for etapa, duracoes in medidor.duracoes.items()}
+    return resultado
+
+
+def curvas_de_escala(diretorio_origem: str, trace: list, argumentos) -> dict:
+    """Repete a medição variando tamanho da base, tamanho do histórico e concorrência."""
+    curvas = {"tamanho_base": [], "turnos_historico": [], "concorrencia": []}
+
+    for multiplicador in argumentos.multiplicadores_base:
+        diretorio = preparar_ambiente(diretorio_origem, multiplicador)
+        resultado = medir_em_processo(trace, 1, argumentos.compilado, argumentos.sem_cache)
+        resultado["multiplicador_base"] = multiplicador
+        curvas["tamanho_base"].append(resultado)
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    for turnos in argumentos.turnos_historico:
+        diretorio = preparar_ambiente(diretorio_origem)
+        resultado = medir_em_processo(trace, 1, argumentos.compilado, argumentos.sem_cache, turnos)
+        resultado["turnos_historico"] = turnos
+        curvas["turnos_historico"].append(resultado)
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    for concorrencia in argumentos.niveis_concorrencia:
+        diretorio = preparar_ambiente(diretorio_origem)
+        curvas["concorrencia"].append(medir_em_processo(trace, concorrencia, argumentos.compilado, argumentos.sem_cache,
+                                                        janela_micro_lote_ms=argumentos.janela_micro_lote_ms,
+                                                       modo_historico=argumentos.modo_historico))
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    return curvas
+
+
+def imprimir_resultado(titulo: str, resultado: dict):
+    latencia = resultado["latencia"]
+    print(f"\n📊 {titulo}")
+    print(f"   {resultado['requisicoes']} requisições | concorrência {resultado['concorrencia']} | "
+          f"{resultado['requisicoes_por_segundo']} req/s")
+    print(f"   latência: p50 {latencia.get('p50_ms')} ms | p95 {latencia.get('p95_ms')} ms | "
+          f"p99 {latencia.get('p99_ms')} ms")
+    for etapa, medida in resultado.get("etapas", {}).items():
+        if medida["n"]:
+            print(f"   • {etapa:<18} n={medida['n']:<6} média {medida['media_ms']} ms | p99 {medida['p99_ms']} ms")
+    if resultado.get("micro_lote"):
+        micro_lote = resultado["micro_lote"]
+        print(f"   micro-lotes: {micro_lote['lotes']} chamadas ao modelo, {micro_lote['media_por_lote']} mensagens por lote")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de replay do chatbot (offline).")
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument('--trace', help="JSONL com 'mensagem'/'mensagem_usuario' e 'usuario_id'")
+    origem.add_argument('--sintetico', type=int, default=1000, help="tamanho do trace sintético")
+    parser.add_argument('--modo', choices=['processo', 'http'], default='processo')
+    parser.add_argument('--url', help="servidor em execução (modo http); sem ele usa o cliente de teste do Flask")
+    parser.add_argument('--concorrencia', type=int, default=1)
+    parser.add_argument('--compilado', action='store_true', help="usa o pontuador NumPy em vez do scikit-learn")
+    parser.add_argument('--sem-cache', action='store_true', help="desativa o cache de predições")
+    parser.add_argument('--curvas', action='store_true', help="mede curvas de escala (base, histórico, concorrência)")
+    parser.add_argument('--multiplicadores-base', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--turnos-historico', type=int, nargs='+', default=[0, 1000, 10000])
+    parser.add_argument('--niveis-concorrencia', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--janela-micro-lote-ms', type=float, default=0,
+                        help="agrupa requisições simultâneas em micro-lotes (0 = desligado)")
+    parser.add_argument('--modo-historico', choices=['sincrono', 'agrupado', 'assincrono'], default='sincrono')
+    parser.add_argument('--saida', help="grava o relatório completo em JSON")
+    argumentos = parser.parse_args()
+
+    diretorio_projeto = os.path.dirname(os.path.abspath(__file__))
+    diretorio_dados = os.getcwd()
+    sys.path.insert(0, diretorio_projeto)
+    if not os.path.exists(os.path.join(diretorio_dados, 'base_conhecimento.json')):
+        print("❌ Execute na pasta que contém base_conhecimento.json.")
+        sys.exit(1)
+
+    with open(os.path.join(diretorio_dados, 'base_conhecimento.json'), 'r', encoding='utf-8') as arquivo:
+        frases_base = json.load(arquivo)['frases']
+    trace = carregar_trace(argumentos.trace) if argumentos.trace else gerar_trace_sintetico(frases_base, argumentos.sintetico)
+
+    relatorio = {"trace": argumentos.trace or f"sintetico:{argumentos.sintetico}"}
+    if argumentos.curvas:
+        relatorio["curvas"] = curvas_de_escala(diretorio_dados, trace, argumentos)
+        for nome, pontos in relatorio["curvas"].items():
+            for ponto in pontos:
+                rotulo = {k: v for k, v in ponto.items() if k in ('multiplicador_base', 'turnos_historico')}
+                imprimir_resultado(f"Curva {nome} {rotulo or ''}", ponto)
+    else:
+        diretorio_temporario = preparar_ambiente(diretorio_dados)
+        if argumentos.modo == 'http':
+            relatorio["resultado"] = medir_http(trace, argumentos.concorrencia, argumentos.url)
+        else:
+            relatorio["resultado"] = medir_em_processo(trace, argumentos.concorrencia,
+                                                       argumentos.compilado, argumentos.sem_cache,
+                                                       janela_micro_lote_ms=argumentos.janela_micro_lote_ms,
+                                                       modo_historico=argumentos.modo_historico)
+        imprimir_resultado(f"Replay ({argumentos.modo})", relatorio["resultado"])
+        shutil.rmtree(diretorio_temporario, ignore_errors=True)
+
+    if argumentos.saida:
+        with open(os.path.join(diretorio_dados, argumentos.saida), 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=4)
+        print(f"\n💾 Relatório salvo em {argumentos.saida}")
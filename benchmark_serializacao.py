@@ -0,0 +1,158 @@
+"""
+Benchmark da serialização JSON: compara o formato anterior (jsonify padrão do Flask
+nas respostas; JSON indentado no histórico) com o serializacao.py, no json da
+biblioteca padrão e no orjson (se instalado). Mede o custo por requisição de
+/api/chat/mensagem e /api/chat/lote e, no histórico, o tamanho e o tempo de
+escrita e leitura por MB. Não usa o modelo nem toca em arquivos.
+
+Exemplos:
+    python benchmark_serializacao.py
+    python benchmark_serializacao.py --mb-historico 20 --saida benchmark_serializacao.json
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+
+import serializacao
+from chatbot_core import RESPOSTAS_PRE_DEFINIDAS
+
+
+def _flask_padrao(dados) -> bytes:
+    """O que o DefaultJSONProvider do Flask gera fora do modo debug."""
+    return json.dumps(dados, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _legado_historico(registros) -> bytes:
+    """Formato do histórico antes do JSONL: a lista inteira, indentada."""
+    return json.dumps(registros, indent=4, ensure_ascii=False).encode('utf-8')
+
+
+CODIFICADORES = {"flask_padrao": _flask_padrao, "json_compacto": serializacao._json_para_bytes}
+DECODIFICADORES = {"json": json.loads}
+if serializacao.orjson is not None:
+    CODIFICADORES["orjson"] = serializacao.orjson.dumps
+    DECODIFICADORES["orjson"] = serializacao.orjson.loads
+
+
+def medir(funcao, argumento, repeticoes: int, rodadas: int = 5) -> float:
+    """Melhor tempo médio por chamada, em segundos."""
+    melhor = float('inf')
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao(argumento)
+        melhor = min(melhor, (time.perf_counter() - inicio) / repeticoes)
+    return melhor
+
+
+# --- Dados de exemplo ---
+def gerar_interacoes(quantidade: int, semente: int = 42) -> list:
+    """Interações no formato do histórico (ChatbotClinica.salvar_interacoes_usuario)."""
+    aleatorio = random.Random(semente)
+    categorias = list(RESPOSTAS_PRE_DEFINIDAS)
+    inicio = datetime.datetime(2026, 1, 1)
+    interacoes = []
+    for indice in range(quantidade):
+        categoria = aleatorio.choice(categorias)
+        interacoes.append({
+            "mensagem_usuario": aleatorio.choice(["olá, bom dia", "quero marcar uma consulta com o cardiologista",
+                                                  "vocês aceitam convênio?", "qual o endereço da clínica"]),
+            "resposta_chatbot": aleatorio.choice(list(RESPOSTAS_PRE_DEFINIDAS[categoria].values())),
+            "categoria": categoria,
+            "timestamp": (inicio + datetime.timedelta(seconds=indice * 37)).isoformat(),
+            "caminho": aleatorio.choice(["ml", "ml", "ml", "palavra_chave", "similaridade", "desconhecido"])
+        })
+    return interacoes
+
+
+def _resposta(interacao: dict) -> dict:
+    return {"resposta": interacao["resposta_chatbot"], "categoria": interacao["categoria"],
+            "usou_base_conhecimento": interacao["caminho"] != "desconhecido", "timestamp": interacao["timestamp"]}
+
+
+# --- Medições ---
+def medir_requisicoes(interacoes: list, repeticoes: int) -> dict:
+    mensagem = {"success": True, "data": _resposta(interacoes[0])}
+    lote = {"success": True, "data": [_resposta(interacao) for interacao in interacoes[:500]]}
+    corpo = serializacao._json_para_bytes({"mensagem": interacoes[0]["mensagem_usuario"], "usuario_id": "maria"})
+
+    resultado = {}
+    for rota, dados, vezes in (("mensagem", mensagem, repeticoes), ("lote_500", lote, max(1, repeticoes // 100))):
+        resultado[rota] = {
+            nome: {"us": round(medir(codificar, dados, vezes) * 1e6, 2), "bytes": len(codificar(dados))}
+            for nome, codificar in CODIFICADORES.items()
+        }
+    resultado["corpo_requisicao"] = {nome: {"us": round(medir(decodificar, corpo, repeticoes) * 1e6, 2)}
+                                     for nome, decodificar in DECODIFICADORES.items()}
+    return resultado
+
+
+def medir_historico(interacoes: list) -> dict:
+    linhas_json = [serializacao._json_para_bytes(interacao) for interacao in interacoes]
+    conteudo = b'\n'.join(linhas_json) + b'\n'
+    megabytes = len(conteudo) / 1e6
+
+    def escrever(codificar):
+        return lambda registros: b''.join(codificar(registro) + b'\n' for registro in registros)
+
+    def ler(decodificar):
+        return lambda linhas: [decodificar(linha) for linha in linhas]
+
+    escrita = {"indentado_legado": medir(_legado_historico, interacoes, 1, 3)}
+    escrita.update({nome: medir(escrever(codificar), interacoes, 1, 3)
+                    for nome, codificar in CODIFICADORES.items() if nome != "flask_padrao"})
+    linhas = conteudo.splitlines()
+    leitura = {"indentado_legado": medir(json.loads, _legado_historico(interacoes), 1, 3)}
+    leitura.update({nome: medir(ler(decodificar), linhas, 1, 3) for nome, decodificar in DECODIFICADORES.items()})
+
+    return {
+        "interacoes": len(interacoes),
+        "mb_compacto": round(megabytes, 2),
+        "mb_indentado_legado": round(len(_legado_historico(interacoes)) / 1e6, 2),
+        "escrita_ms_por_mb": {nome: round(segundos / megabytes * 1e3, 2) for nome, segundos in escrita.items()},
+        "leitura_ms_por_mb": {nome: round(segundos / megabytes * 1e3, 2) for nome, segundos in leitura.items()}
+    }
+
+
+def imprimir(relatorio: dict):
+    print(f"📊 Backend em uso: {relatorio['backend']}")
+    for rota in ("mensagem", "lote_500"):
+        valores = relatorio["requisicoes"][rota]
+        base = valores["flask_padrao"]["us"]
+        print(f"  /api/chat/{rota.split('_')[0]} ({rota}):")
+        for nome, valor in valores.items():
+            print(f"    {nome:<16} {valor['us']:>10.2f} µs  {valor['bytes']:>8d} bytes  ({base / valor['us']:.1f}x)")
+    for nome, valor in relatorio["requisicoes"]["corpo_requisicao"].items():
+        print(f"  Leitura do corpo  {nome:<16} {valor['us']:>8.2f} µs")
+
+    historico = relatorio["historico"]
+    print(f"  Histórico: {historico['interacoes']} interações, {historico['mb_compacto']} MB compacto "
+          f"x {historico['mb_indentado_legado']} MB indentado")
+    for operacao in ("escrita_ms_por_mb", "leitura_ms_por_mb"):
+        for nome, valor in historico[operacao].items():
+            print(f"    {operacao.split('_')[0]:<8} {nome:<16} {valor:>8.2f} ms/MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da serialização JSON (respostas e histórico).")
+    parser.add_argument('--repeticoes', type=int, default=20000, help="chamadas por medição de requisição")
+    parser.add_argument('--mb-historico', type=float, default=10, help="tamanho aproximado do histórico medido")
+    parser.add_argument('--saida', help="grava o relatório em JSON")
+    argumentos = parser.parse_args()
+
+    amostra = gerar_interacoes(1000)
+    bytes_por_interacao = sum(len(serializacao._json_para_bytes(interacao)) + 1 for interacao in amostra) / len(amostra)
+    interacoes = gerar_interacoes(max(500, int(argumentos.mb_historico * 1e6 / bytes_por_interacao)))
+
+    relatorio = {
+        "backend": serializacao.BACKEND,
+        "requisicoes": medir_requisicoes(interacoes, argumentos.repeticoes),
+        "historico": medir_historico(interacoes)
+    }
+    imprimir(relatorio)
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(serializacao.formatar(relatorio))
+        print(f"\n💾 Relatório salvo em {argumentos.saida}")
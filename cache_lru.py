@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Cache em memória com limite de itens (LRU) e expiração opcional por tempo (TTL).
+    Seguro para uso por várias threads do servidor.
+    """
+
+    def __init__(self, capacidade: int = 10000, ttl_segundos: float = None):
+        self.capacidade = capacidade
+        self.ttl_segundos = ttl_segundos
+        self._itens = OrderedDict()  # chave -> (instante_expiracao, valor)
+        self._trava = threading.Lock()
+
+    def obter(self, chave, padrao=None):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return padrao
+            expira_em, valor = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._itens[chave]
+                return padrao
+            self._itens.move_to_end(chave)
+            return valor
+
+    def definir(self, chave, valor):
+        expira_em = time.monotonic() + self.ttl_segundos if self.ttl_segundos else None
+        with self._trava:
+            self._itens[chave] = (expira_em, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._trava:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+from cache_lru import CacheLRU
+
+
+class CachePredicao:
+    """
+    Cache da classificação por mensagem normalizada: guarda (categoria, probabilidade,
+    caminho) para não repetir TF-IDF + Naive Bayes nas mensagens mais frequentes.
+
+    Cada item leva a versão em que foi calculado. A versão muda sozinha quando o
+    arquivo do modelo ou da base de conhecimento é alterado (verificado no máximo a
+    cada 'intervalo_verificacao' segundos) ou quando 'invalidar()' é chamado.
+    """
+
+    def __init__(self, arquivos_monitorados: list, capacidade: int = 5000,
+                 ttl_segundos: float = 3600, intervalo_verificacao: float = 2.0):
+        self.arquivos_monitorados = arquivos_monitorados
+        self.intervalo_verificacao = intervalo_verificacao
+        self.cache = CacheLRU(capacidade, ttl_segundos)
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self._trava = threading.Lock()
+        self._assinatura_arquivos = self._assinar_arquivos()
+        self._versao = 0
+        self._ultima_verificacao = time.monotonic()
+
+    def _assinar_arquivos(self) -> tuple:
+        assinatura = []
+        for caminho in self.arquivos_monitorados:
+            try:
+                estado = os.stat(caminho)
+                assinatura.append((estado.st_mtime_ns, estado.st_size))
+            except OSError:
+                assinatura.append(None)
+        return tuple(assinatura)
+
+    def _verificar_arquivos(self):
+        agora = time.monotonic()
+        if agora - self._ultima_verificacao < self.intervalo_verificacao:
+            return
+        self._ultima_verificacao = agora
+        assinatura = self._assinar_arquivos()
+        if assinatura != self._assinatura_arquivos:
+            self._assinatura_arquivos = assinatura
+            self.invalidar()
+
+    def invalidar(self):
+        """Descarta todas as predições (ex.: modelo substituído em memória)."""
+        with self._trava:
+            self._versao += 1
+            self.invalidacoes += 1
+        self.cache.limpar()
+
+    def versao_atual(self) -> int:
+        """Versão a ser informada em 'definir' para a predição que será calculada agora."""
+        self._verificar_arquivos()
+        return self._versao
+
+    def obter(self, mensagem_normalizada: str):
+        item = self.cache.obter(mensagem_normalizada)
+        if item is not None and item[0] == self.versao_atual():
+            self.acertos += 1
+            return item[1]
+        self.falhas += 1
+        return None
+
+    def definir(self, mensagem_normalizada: str, predicao: tuple, versao: int):
+        # Predições calculadas antes de uma invalidação não entram no cache
+        if versao == self._versao:
+            self.cache.definir(mensagem_normalizada, (versao, predicao))
+
+    def estatisticas(self) -> dict:
+        total = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 4) if total else 0.0,
+            "itens": len(self.cache),
+            "invalidacoes": self.invalidacoes
+        }
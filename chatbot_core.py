@@ -1,59 +1,269 @@
 import json
 import os
 import datetime
-import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import Pipeline
-from difflib import SequenceMatcher as ComparadorSequencia
+import hashlib
+import threading
+import time
+from collections import Counter
+from historico_armazenamento import ArmazenamentoHistorico
+from estado_sessao import EstadoSessoes
+from indice_similaridade import IndiceSimilaridade, buscar_linear
+from palavras_chave import CorrespondentePalavrasChave
+from cache_predicao import CachePredicao
+from pontuador_numpy import PontuadorNumPy, exportar_modelo_compilado
+from metricas import MetricasChatbot
+from micro_lote import DespachanteMicroLote
+from historico_buffer import BufferHistorico
+from base_compilada import carregar_base_compilada, hash_conteudo
+from normalizacao import normalizar_texto
+
+# Respostas por categoria: "initial" e, quando existe, "continuation" (após SAUDAÇÃO/AJUDA)
+RESPOSTAS_PRE_DEFINIDAS = {
+    "SAUDAÇÃO": {"initial": "Olá! Seja bem-vindo à nossa clínica. Como posso ajudar você hoje?"},
+    "AJUDA": {
+        "initial": "Claro! Posso ajudar com informações, agendamentos, ou dúvidas gerais. O que você precisa?",
+        "continuation": "Em que mais posso ajudar agora?"
+    },
+    "INFORMAÇÃO": {
+        "initial": "📋 Horário: Seg-Sex 7h-19h | Tel: (11) 3333-4444 | End: Rua Saúde, 123",
+        "continuation": "Precisa de mais alguma informação?"
+    },
+    "CANCELAMENTO": {
+        "initial": "Para cancelamento, vou transferir para um atendente...",
+        "continuation": "Transferindo para atendente..."
+    },
+    "EXAMES": {
+        "initial": "Serviços: Agendamento e consulta de resultados de exames.",
+        "continuation": "Sobre exames, em que mais posso ajudar?"
+    },
+    "VALORES": {
+        "initial": "Para orçamentos, consulte diretamente na clínica.",
+        "continuation": "Consulte na clínica para valores precisos."
+    },
+    "DESCONHECIDO": {
+        "initial": "Desculpe, não entendi. Pode reformular?"
+    }
+}
+
+# Em ordem de prioridade; pode ser substituída pela chave "palavras_chave" da base de conhecimento
+PALAVRAS_CHAVE_PADRAO = {
+    "cancelar": "CANCELAMENTO", "exame": "EXAMES", "horário": "INFORMAÇÃO",
+    "ajuda": "AJUDA", "oi": "SAUDAÇÃO", "orçamento": "VALORES", "preço": "VALORES"
+}
+
+# Parâmetros do TfidfVectorizer + MultinomialNB quando não há seleção de modelo (selecao_modelo.py)
+PARAMETROS_MODELO_PADRAO = {"analyzer": "word", "ngram_range": [1, 1], "alpha": 1.0}
+
+
+def treinar_pipeline_ml(frases, categorias, parametros=None):
+    """Treina o pipeline TfidfVectorizer + MultinomialNB com os 'parametros' informados."""
+    # Importado só quando é preciso treinar: o serviço com o pontuador NumPy não depende do scikit-learn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+    parametros = {**PARAMETROS_MODELO_PADRAO, **(parametros or {})}
+    pipeline_ml = Pipeline([
+        # O texto já chega normalizado (normalizar_texto), sem maiúsculas nem acentos
+        ('vetorizacao', TfidfVectorizer(lowercase=False, analyzer=parametros["analyzer"],
+                                        ngram_range=tuple(parametros["ngram_range"]))),
+        ('classificador', MultinomialNB(alpha=parametros["alpha"]))
+    ])
+    pipeline_ml.fit(frases, categorias)
+    return pipeline_ml
+
 
 class ChatbotClinica:
-    def __init__(self):
+    def __init__(self, comparar_fallback_legado=False, usar_pontuador_compilado=False, modo_multiprocesso=False,
+                 taxa_amostragem_metricas=1.0, janela_micro_lote_ms=0, tamanho_maximo_micro_lote=64,
+                 modo_historico='sincrono', aquecer=True):
+        inicio_inicializacao = time.perf_counter()
         self.ARQUIVO_BASE_CONHECIMENTO = 'base_conhecimento.json'
+        # Frases normalizadas e sem repetição, com o hash do conteúdo; refeito quando a base muda
+        self.ARQUIVO_BASE_COMPILADA = 'base_conhecimento_compilada.json'
         self.ARQUIVO_MODELO_ML = 'modelo_chatbot.joblib'
+        # Parâmetros e limiares escolhidos pelo selecao_modelo.py (com o relatório da avaliação)
+        self.ARQUIVO_SELECAO_MODELO = 'modelo_chatbot_selecao.json'
+        self.parametros_modelo = dict(PARAMETROS_MODELO_PADRAO)
+        self.limiar_confianca_ml = 0.4
+        self.limiar_similaridade = 0.5
+        self.carregar_selecao_modelo()
+        self.DIRETORIO_MODELO_COMPILADO = 'modelo_compilado'
+        # Serve com o pontuador NumPy exportado do modelo, sem importar o scikit-learn
+        self.usar_pontuador_compilado = usar_pontuador_compilado
+        # Vários processos servindo: estado de sessão validado no disco e modelo recarregado quando outro processo retreina
+        self.modo_multiprocesso = modo_multiprocesso
+        self.INTERVALO_VERIFICACAO_MODELO = 5.0
         self.DIRETORIO_HISTORICO_USUARIOS = 'historico_usuarios'
+        # Latência por etapa (amostrada) e contadores de categoria/caminho, expostos em /api/metrics
+        self.metricas = MetricasChatbot(taxa_amostragem_metricas)
+        self.armazenamento_historico = ArmazenamentoHistorico(self.DIRETORIO_HISTORICO_USUARIOS)
+        # Última categoria por usuário, sem precisar ler o histórico a cada mensagem
+        self.estado_sessoes = EstadoSessoes(
+            self.armazenamento_historico,
+            os.path.join(self.DIRETORIO_HISTORICO_USUARIOS, '_sessoes'),
+            capacidade=10000,
+            ttl_segundos=1800,
+            validar_entre_processos=modo_multiprocesso
+        )
+        # Gravação do histórico: 'sincrono', 'agrupado' (espera a descarga do grupo) ou 'assincrono'
+        self.TAMANHO_GRUPO_HISTORICO = 256
+        self.INTERVALO_GRUPO_HISTORICO = 0.05
+        self.buffer_historico = BufferHistorico(
+            self._gravar_registros_historico,
+            modo=modo_historico,
+            tamanho_grupo=self.TAMANHO_GRUPO_HISTORICO,
+            intervalo_segundos=self.INTERVALO_GRUPO_HISTORICO,
+            guardar_falha=self.armazenamento_historico.guardar_falha
+        )
         
-        # Carrega tudo ao inicializar
+        # Carrega tudo ao inicializar (duração de cada fase em tempos_inicializacao)
+        self.tempos_inicializacao = {}
+        inicio = time.perf_counter()
+        self.palavras_chave_base = None
+        self.hash_base_conhecimento = None
         self.frases, self.categorias = self.carregar_base_conhecimento()
         self.frases, self.categorias = self.verificar_consistencia_dados(self.frases, self.categorias)
+        self.tempos_inicializacao["base"] = time.perf_counter() - inicio
+        inicio = time.perf_counter()
         self.modelo = self.carregar_ou_treinar_modelo_ml(self.frases, self.categorias)
+        self.tempos_inicializacao["modelo"] = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        self._origem_modelo_carregado = self._origem_modelo_ml()
+        self._ultima_verificacao_modelo = time.monotonic()
+        self._trava_recarga_modelo = threading.Lock()
         self.respostas = self._carregar_respostas_pre_definidas()
+        self.palavras_chave = CorrespondentePalavrasChave(
+            self.palavras_chave_base or self._carregar_palavras_chave_padrao()
+        )
+        self.indice_similaridade = IndiceSimilaridade(self.frases, self.categorias)
+        self.tempos_inicializacao["indices"] = time.perf_counter() - inicio
+
+        # Quando ativo, cada fallback por similaridade também roda a varredura antiga para comparação
+        self.comparar_fallback_legado = comparar_fallback_legado
+        self.comparacao_fallback = {"comparacoes": 0, "divergencias": 0}
+
+        # Predições das mensagens mais frequentes; invalidado quando o modelo ou a base mudam
+        self.cache_predicao = CachePredicao(
+            [self.ARQUIVO_MODELO_ML, self.ARQUIVO_BASE_CONHECIMENTO, self.ARQUIVO_SELECAO_MODELO,
+             os.path.join(self.DIRETORIO_MODELO_COMPILADO, 'configuracao.json')],
+            capacidade=5000,
+            ttl_segundos=3600
+        )
         
-        print("🚀 Chatbot inicializado com sucesso!")
+        # Com janela > 0, requisições simultâneas compartilham uma única chamada ao modelo
+        self.micro_lote = DespachanteMicroLote(
+            self.classificar_lote, janela_micro_lote_ms, tamanho_maximo_micro_lote
+        ) if janela_micro_lote_ms > 0 else None
 
-    def _carregar_respostas_pre_definidas(self):
-        return {
-            "SAUDAÇÃO": {"initial": "Olá! Seja bem-vindo à nossa clínica. Como posso ajudar você hoje?"},
-            "AJUDA": {
-                "initial": "Claro! Posso ajudar com informações, agendamentos, ou dúvidas gerais. O que você precisa?",
-                "continuation": "Em que mais posso ajudar agora?"
-            },
-            "INFORMAÇÃO": {
-                "initial": "📋 Horário: Seg-Sex 7h-19h | Tel: (11) 3333-4444 | End: Rua Saúde, 123",
-                "continuation": "Precisa de mais alguma informação?"
-            },
-            "CANCELAMENTO": {
-                "initial": "Para cancelamento, vou transferir para um atendente...",
-                "continuation": "Transferindo para atendente..."
-            },
-            "EXAMES": {
-                "initial": "Serviços: Agendamento e consulta de resultados de exames.",
-                "continuation": "Sobre exames, em que mais posso ajudar?"
-            },
-            "VALORES": {
-                "initial": "Para orçamentos, consulte diretamente na clínica.",
-                "continuation": "Consulte na clínica para valores precisos."
-            },
-            "DESCONHECIDO": {
-                "initial": "Desculpe, não entendi. Pode reformular?"
+        # Aquecimento: a primeira requisição real não paga as alocações e leituras preguiçosas
+        self.LIMITE_FRASES_AQUECIMENTO = 1000
+        self.aquecimento = {"concluido": False}
+        if aquecer:
+            self.aquecer()
+        self.tempos_inicializacao["aquecimento"] = self.aquecimento.get("duracao_ms", 0) / 1000
+
+        self.tempos_inicializacao["total"] = time.perf_counter() - inicio_inicializacao
+        print(f"🚀 Chatbot inicializado com sucesso! ({self.tempos_inicializacao['total'] * 1000:.0f} ms: "
+              f"base {self.tempos_inicializacao['base'] * 1000:.0f} ms, "
+              f"modelo {self.tempos_inicializacao['modelo'] * 1000:.0f} ms, "
+              f"índices {self.tempos_inicializacao['indices'] * 1000:.0f} ms, "
+              f"aquecimento {self.tempos_inicializacao['aquecimento'] * 1000:.0f} ms)")
+
+    def aquecer(self):
+        """
+        Passa mensagens representativas por todos os caminhos da decisão: ML (uma mensagem
+        e a base em lote), palavras-chave, similaridade, DESCONHECIDO e a tabela de respostas.
+        As frases da base entram no cache de predições. Não grava histórico nem métricas.
+        """
+        inicio = time.perf_counter()
+        metricas, self.metricas = self.metricas, MetricasChatbot(0)
+        caminhos = Counter()
+        try:
+            frases = list(dict.fromkeys(normalizar_texto(frase) for frase in self.frases))[:self.LIMITE_FRASES_AQUECIMENTO]
+            self._aquecer_estruturas(self.modelo, self.indice_similaridade, self.palavras_chave, frases)
+
+            versao = self.cache_predicao.versao_atual()
+            for mensagem, (categoria_ml, probabilidade) in zip(frases, self.classificar_lote(frases)):
+                categoria, caminho = self._decidir_categoria(mensagem, categoria_ml, probabilidade)
+                self.cache_predicao.definir(mensagem, (categoria, float(probabilidade), caminho), versao)
+                caminhos[caminho] += 1
+
+            # O fallback roda mesmo que o ML já decida todas as frases da base
+            for palavra, _, _ in self.palavras_chave.entradas[:1]:
+                caminhos[self.classificar_fallback(palavra)[1] or "desconhecido"] += 1
+            for mensagem in frases[:1] + ["mensagem de aquecimento sem relacao com a clinica"]:
+                caminhos[self.classificar_fallback(mensagem, limiar_similaridade=0.0)[1] or "desconhecido"] += 1
+                caminhos[self.classificar_fallback(mensagem, limiar_similaridade=1.01)[1] or "desconhecido"] += 1
+
+            for categoria in self.respostas:
+                for ultima_categoria in (None, "SAUDAÇÃO"):
+                    self.obter_texto_resposta(categoria, ultima_categoria)
+
+            self.aquecimento = {
+                "concluido": True,
+                "erro": None,
+                "mensagens": len(frases),
+                "caminhos": dict(caminhos),
+                "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                "momento": datetime.datetime.now().isoformat()
             }
+        except Exception as erro:
+            print(f"⚠️  Aquecimento do chatbot falhou: {erro}")
+            self.aquecimento = {"concluido": False, "erro": str(erro),
+                                "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1)}
+        finally:
+            self.metricas = metricas
+
+    @staticmethod
+    def _aquecer_estruturas(modelo, indice_similaridade, palavras_chave, frases):
+        """Primeiras chamadas do modelo (lote de 1 e lote cheio) e dos índices, fora do caminho das requisições."""
+        if not frases:
+            return
+        modelo.predict_proba(frases[:1])
+        modelo.predict_proba(frases)
+        palavras_chave.buscar(frases[0])
+        indice_similaridade.buscar(frases[0])
+
+    def impressao_digital_modelo(self):
+        """Identifica o modelo em uso: processos com o mesmo resumo servem o mesmo modelo."""
+        dados = {
+            "tipo": type(self.modelo).__name__,
+            "hash_base": self.hash_base_conhecimento,
+            "parametros": self.parametros_modelo,
+            "limiares": {"confianca_ml": self.limiar_confianca_ml, "similaridade": self.limiar_similaridade},
+            "origem": self._origem_modelo_carregado
         }
+        dados["resumo"] = hashlib.sha256(json.dumps(dados, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        return dados
+
+    def _carregar_respostas_pre_definidas(self):
+        return {categoria: dict(textos) for categoria, textos in RESPOSTAS_PRE_DEFINIDAS.items()}
+
+    def _carregar_palavras_chave_padrao(self):
+        return dict(PALAVRAS_CHAVE_PADRAO)
+
+    def carregar_selecao_modelo(self):
+        """Adota os parâmetros do modelo e os limiares gravados pelo selecao_modelo.py, se houver."""
+        if not os.path.exists(self.ARQUIVO_SELECAO_MODELO):
+            return
+        try:
+            with open(self.ARQUIVO_SELECAO_MODELO, 'r', encoding='utf-8') as arquivo:
+                vencedor = json.load(arquivo)["vencedor"]
+            parametros = {**PARAMETROS_MODELO_PADRAO, **vencedor["parametros"]}
+            limiares = (float(vencedor["limiares"]["confianca_ml"]), float(vencedor["limiares"]["similaridade"]))
+        except (ValueError, KeyError, TypeError) as erro:
+            print(f"⚠️  Seleção de modelo inválida em '{self.ARQUIVO_SELECAO_MODELO}', usando o padrão: {erro}")
+            return
+        self.parametros_modelo = parametros
+        self.limiar_confianca_ml, self.limiar_similaridade = limiares
 
     def carregar_base_conhecimento(self):
         if os.path.exists(self.ARQUIVO_BASE_CONHECIMENTO):
-            with open(self.ARQUIVO_BASE_CONHECIMENTO, 'r', encoding='utf-8') as arquivo:
-                dados = json.load(arquivo)
-                return dados['frases'], dados['categorias']
+            base = carregar_base_compilada(self.ARQUIVO_BASE_CONHECIMENTO, self.ARQUIVO_BASE_COMPILADA)
+            self.palavras_chave_base = base['palavras_chave']
+            self.hash_base_conhecimento = base['hash']
+            return base['frases'], base['categorias']
         else:
             # SUA BASE ATUAL AQUI (copie e cole do seu main.py)
             frases_iniciais = ["bom dia", "boa tarde", "oi", "olá", ...]  # Cole suas frases
@@ -68,129 +278,382 @@ class ChatbotClinica:
         return frases, categorias
 
     def criar_e_treinar_pipeline_ml(self, frases, categorias):
-        pipeline_ml = Pipeline([
-            ('vetorizacao', TfidfVectorizer(lowercase=True)),
-            ('classificador', MultinomialNB())
-        ])
-        pipeline_ml.fit(frases, categorias)
+        pipeline_ml = treinar_pipeline_ml(frases, categorias, self.parametros_modelo)
+        # Carimbo da base e dos parâmetros usados no treino: um modelo diferente é retreinado ao carregar
+        pipeline_ml.hash_base_conhecimento = hash_conteudo(frases, categorias)
+        pipeline_ml.parametros_modelo = dict(self.parametros_modelo)
         return pipeline_ml
 
     def carregar_ou_treinar_modelo_ml(self, frases, categorias):
+        if self.usar_pontuador_compilado:
+            pontuador = self._carregar_pontuador_compilado()
+            if pontuador is not None:
+                return pontuador
+
+        modelo = self._carregar_ou_treinar_pipeline_ml(frases, categorias)
+        if self.usar_pontuador_compilado:
+            return self._exportar_pontuador_compilado(modelo, frases)
+        return modelo
+
+    def _origem_modelo_ml(self):
+        """Identifica o arquivo .joblib do qual o artefato compilado foi exportado."""
+        if not os.path.exists(self.ARQUIVO_MODELO_ML):
+            return None
+        estado = os.stat(self.ARQUIVO_MODELO_ML)
+        return {"tamanho": estado.st_size, "modificado_em": estado.st_mtime_ns}
+
+    def _carregar_pontuador_compilado(self):
+        if not PontuadorNumPy.existe(self.DIRETORIO_MODELO_COMPILADO):
+            return None
+        pontuador = PontuadorNumPy(self.DIRETORIO_MODELO_COMPILADO)
+        origem = self._origem_modelo_ml()
+        # Sem o .joblib, o artefato compilado é a única fonte; com ele, precisa ser da mesma versão
+        if origem is not None and pontuador.configuracao.get("origem") != origem:
+            return None
+        if not self._modelo_atualizado(pontuador.configuracao.get("hash_base"), pontuador.configuracao.get("parametros")):
+            return None
+        return pontuador
+
+    def _modelo_atualizado(self, hash_base, parametros):
+        if parametros != self.parametros_modelo:
+            return False
+        # Sem a base no disco não há com o que comparar: o modelo existente é mantido
+        return self.hash_base_conhecimento is None or hash_base == self.hash_base_conhecimento
+
+    def _exportar_pontuador_compilado(self, modelo, frases):
+        try:
+            exportar_modelo_compilado(modelo, self.DIRETORIO_MODELO_COMPILADO,
+                                      frases_verificacao=frases, origem=self._origem_modelo_ml())
+            return PontuadorNumPy(self.DIRETORIO_MODELO_COMPILADO)
+        except Exception as erro:
+            print(f"Erro ao exportar pontuador NumPy, usando o pipeline do scikit-learn: {erro}")
+            return modelo
+
+    def _carregar_ou_treinar_pipeline_ml(self, frases, categorias):
+        import joblib
+
         if os.path.exists(self.ARQUIVO_MODELO_ML):
             try:
-                return joblib.load(self.ARQUIVO_MODELO_ML)
+                # mmap: processos que carregam o mesmo arquivo compartilham as páginas dos arrays
+                modelo = joblib.load(self.ARQUIVO_MODELO_ML, mmap_mode='r')
+                if self._modelo_atualizado(getattr(modelo, 'hash_base_conhecimento', None),
+                                           getattr(modelo, 'parametros_modelo', None)):
+                    return modelo
+                print("🔄 Modelo treinado com outra base de conhecimento ou outros parâmetros, retreinando...")
+                modelo = self.criar_e_treinar_pipeline_ml(frases, categorias)
+                self._salvar_modelo_ml(modelo)
+                return modelo
             except Exception as erro:
                 print(f"Erro ao carregar modelo, retreinando: {erro}")
                 modelo = self.criar_e_treinar_pipeline_ml(frases, categorias)
-                joblib.dump(modelo, self.ARQUIVO_MODELO_ML)
+                self._salvar_modelo_ml(modelo)
                 return modelo
         else:
             modelo = self.criar_e_treinar_pipeline_ml(frases, categorias)
-            joblib.dump(modelo, self.ARQUIVO_MODELO_ML)
+            self._salvar_modelo_ml(modelo)
             return modelo
 
-    def obter_texto_resposta(self, categoria, historico_usuario):
+    def _salvar_modelo_ml(self, modelo):
+        import joblib
+
+        # Escrita atômica: outros processos nunca leem um .joblib pela metade
+        caminho_temporario = f"{self.ARQUIVO_MODELO_ML}.{os.getpid()}.tmp"
+        joblib.dump(modelo, caminho_temporario)
+        os.replace(caminho_temporario, self.ARQUIVO_MODELO_ML)
+
+    def retreinar_modelo(self):
+        """
+        Relê a base de conhecimento, treina um novo modelo e o coloca em uso sem
+        reiniciar o serviço. Retorna o número de frases usadas no treinamento.
+        """
+        self.carregar_selecao_modelo()
+        self.palavras_chave_base = None
+        self.hash_base_conhecimento = None
+        frases, categorias = self.carregar_base_conhecimento()
+        frases, categorias = self.verificar_consistencia_dados(frases, categorias)
+
+        modelo = self.criar_e_treinar_pipeline_ml(frases, categorias)
+        self._salvar_modelo_ml(modelo)
+        if self.usar_pontuador_compilado:
+            modelo = self._exportar_pontuador_compilado(modelo, frases)
+
+        self.substituir_modelo(modelo, frases, categorias)
+        return len(frases)
+
+    def substituir_modelo(self, modelo, frases, categorias):
+        """
+        Troca o modelo e as estruturas derivadas da base em memória. Tudo é montado
+        antes da troca; requisições em andamento terminam com as referências que já
+        tinham lido, e as seguintes passam a usar o novo modelo.
+        """
+        indice_similaridade = IndiceSimilaridade(frases, categorias)
+        palavras_chave = CorrespondentePalavrasChave(
+            self.palavras_chave_base or self._carregar_palavras_chave_padrao()
+        )
+        try:
+            self._aquecer_estruturas(modelo, indice_similaridade, palavras_chave,
+                                     [normalizar_texto(frase) for frase in frases[:self.LIMITE_FRASES_AQUECIMENTO]])
+        except Exception as erro:
+            print(f"⚠️  Aquecimento do novo modelo falhou: {erro}")
+
+        self.modelo = modelo
+        self.frases, self.categorias = frases, categorias
+        self.indice_similaridade = indice_similaridade
+        self.palavras_chave = palavras_chave
+        self._origem_modelo_carregado = self._origem_modelo_ml()
+        self.cache_predicao.invalidar()
+
+    def recarregar_modelo_se_alterado(self):
+        """
+        Adota o modelo gravado por outro processo (ex.: retreino feito em outro
+        trabalhador). Verifica o arquivo no máximo a cada INTERVALO_VERIFICACAO_MODELO segundos.
+        """
+        agora = time.monotonic()
+        if agora - self._ultima_verificacao_modelo < self.INTERVALO_VERIFICACAO_MODELO:
+            return False
+        if not self._trava_recarga_modelo.acquire(blocking=False):
+            return False
+        try:
+            self._ultima_verificacao_modelo = agora
+            if self._origem_modelo_ml() == self._origem_modelo_carregado:
+                return False
+
+            self.carregar_selecao_modelo()
+            self.palavras_chave_base = None
+            self.hash_base_conhecimento = None
+            frases, categorias = self.carregar_base_conhecimento()
+            frases, categorias = self.verificar_consistencia_dados(frases, categorias)
+            modelo = self.carregar_ou_treinar_modelo_ml(frases, categorias)
+            self.substituir_modelo(modelo, frases, categorias)
+            print(f"🔄 Modelo atualizado por outro processo recarregado (pid {os.getpid()}).")
+            return True
+        finally:
+            self._trava_recarga_modelo.release()
+
+    def obter_tipo_resposta(self, categoria, ultima_categoria):
+        """Versão da resposta ('initial' ou 'continuation'), gravada no histórico com a interação."""
+        if categoria in self.respostas and "continuation" in self.respostas[categoria] \
+                and ultima_categoria in ["SAUDAÇÃO", "AJUDA"]:
+            return "continuation"
+        return "initial"
+
+    def obter_texto_resposta(self, categoria, ultima_categoria):
         if categoria not in self.respostas:
             return self.respostas["DESCONHECIDO"]["initial"]
+        return self.respostas[categoria][self.obter_tipo_resposta(categoria, ultima_categoria)]
 
-        if not historico_usuario:
-            return self.respostas[categoria]["initial"]
+    def obter_resposta_fallback(self, mensagem, ultima_categoria, limiar_similaridade=None):
+        categoria, _ = self.classificar_fallback(normalizar_texto(mensagem), limiar_similaridade)
+        if categoria is not None:
+            return self.obter_texto_resposta(categoria, ultima_categoria), categoria, True
+        return None, None, False
 
-        ultima_categoria = historico_usuario[-1]['categoria'] if historico_usuario and 'categoria' in historico_usuario[-1] else None
+    def classificar_fallback(self, mensagem, limiar_similaridade=None):
+        """
+        Palavras-chave e, depois, similaridade com a base, sobre a mensagem já normalizada.
+        Retorna (categoria, caminho) ou (None, None).
+        """
+        if limiar_similaridade is None:
+            limiar_similaridade = self.limiar_similaridade
+        inicio = self.metricas.iniciar()
+        categoria = self.palavras_chave.buscar(mensagem)
+        self.metricas.registrar_etapa("palavras_chave", inicio)
+        if categoria is not None:
+            return categoria, "palavra_chave"
 
-        if "continuation" in self.respostas[categoria] and ultima_categoria in ["SAUDAÇÃO", "AJUDA"]:
-            return self.respostas[categoria]["continuation"]
-        
-        return self.respostas[categoria]["initial"]
+        inicio = self.metricas.iniciar()
+        maior_similaridade, categoria_mais_similar = self.indice_similaridade.buscar(mensagem)
+        self.metricas.registrar_etapa("similaridade", inicio)
+        if self.comparar_fallback_legado:
+            self._comparar_fallback_legado(mensagem, maior_similaridade, categoria_mais_similar, limiar_similaridade)
 
-    def obter_resposta_fallback(self, mensagem, historico_usuario, limiar_similaridade=0.5):
-        mensagem_lower = mensagem.lower()
-        
-        palavras_chave_prioritarias = {
-            "cancelar": "CANCELAMENTO", "exame": "EXAMES", "horário": "INFORMAÇÃO",
-            "ajuda": "AJUDA", "oi": "SAUDAÇÃO", "orçamento": "VALORES", "preço": "VALORES"
-        }
-        
-        for palavra, categoria in palavras_chave_prioritarias.items():
-            if palavra in mensagem_lower:
-                return self.obter_texto_resposta(categoria, historico_usuario), categoria, True
+        if maior_similaridade >= limiar_similaridade and categoria_mais_similar in self.respostas:
+            return categoria_mais_similar, "similaridade"
 
-        maior_similaridade = 0
-        categoria_mais_similar = None
+        return None, None
 
-        for frase_base, categoria_base in zip(self.frases, self.categorias):
-            similaridade = ComparadorSequencia(None, mensagem_lower, frase_base.lower()).ratio()
-            if similaridade > maior_similaridade:
-                maior_similaridade = similaridade
-                categoria_mais_similar = categoria_base
+    def _comparar_fallback_legado(self, mensagem, similaridade, categoria, limiar_similaridade):
+        similaridade_linear, categoria_linear = buscar_linear(self.frases, self.categorias, mensagem)
+        decisao_indice = categoria if similaridade >= limiar_similaridade else None
+        decisao_linear = categoria_linear if similaridade_linear >= limiar_similaridade else None
 
-        if maior_similaridade >= limiar_similaridade and categoria_mais_similar in self.respostas:
-            return self.obter_texto_resposta(categoria_mais_similar, historico_usuario), categoria_mais_similar, True
-        
-        return None, None, False
+        self.comparacao_fallback["comparacoes"] += 1
+        if decisao_indice != decisao_linear:
+            self.comparacao_fallback["divergencias"] += 1
+            print(f"⚠️  Fallback divergente para '{mensagem}': índice={decisao_indice} "
+                  f"({similaridade:.2f}), linear={decisao_linear} ({similaridade_linear:.2f})")
 
     def carregar_historico_usuario(self, id_usuario):
-        caminho_arquivo = os.path.join(self.DIRETORIO_HISTORICO_USUARIOS, f"{id_usuario}_historico.json")
-        if os.path.exists(caminho_arquivo):
-            with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                return json.load(arquivo)
-        return []
+        # Inclui as interações que ainda estão na fila de gravação
+        return self.buffer_historico.carregar_com_pendentes(id_usuario, self.armazenamento_historico.carregar)
+
+    def ler_historico_reverso(self, id_usuario, cursor=None, desde=None, ate=None):
+        """
+        Gera (cursor, interação) da mais recente para a mais antiga, lendo do disco
+        só o que for consumido. 'cursor' é o da última interação já vista; se o arquivo
+        foi reescrito desde então, a leitura levanta CursorExpirado.
+        """
+        self.buffer_historico.descarregar_usuario(id_usuario)
+        return self.armazenamento_historico.ler_reverso(id_usuario, cursor, desde, ate)
 
     def salvar_historico_usuario(self, id_usuario, mensagem, resposta_bot, categoria):
-        if not os.path.exists(self.DIRETORIO_HISTORICO_USUARIOS):
-            os.makedirs(self.DIRETORIO_HISTORICO_USUARIOS)
-
-        historico = self.carregar_historico_usuario(id_usuario)
-        historico.append({
-            "mensagem_usuario": mensagem,
-            "resposta_chatbot": resposta_bot,
-            "categoria": categoria,
-            "timestamp": datetime.datetime.now().isoformat()
-        })
-        
-        caminho_arquivo = os.path.join(self.DIRETORIO_HISTORICO_USUARIOS, f"{id_usuario}_historico.json")
-        with open(caminho_arquivo, 'w', encoding='utf-8') as arquivo:
-            json.dump(historico, arquivo, indent=4, ensure_ascii=False)
+        self.salvar_interacoes_usuario(id_usuario, [(mensagem, resposta_bot, categoria)])
 
-    def processar_mensagem(self, mensagem_usuario, id_usuario="anonimo"):
+    def salvar_interacoes_usuario(self, id_usuario, interacoes):
         """
-        MÉTODO PRINCIPAL PARA A API
+        Grava várias interações (mensagem, resposta, categoria[, caminho[, tipo_resposta]]) do mesmo
+        usuário de uma vez. O caminho da decisão ('ml', 'palavra_chave', ...) e a versão da resposta
+        ('initial'/'continuation') alimentam a análise do histórico.
         """
-        historico_atual = self.carregar_historico_usuario(id_usuario)
-        
-        mensagem_limpa = mensagem_usuario.strip().lower()
-
-        # Classificação com ML
-        probabilidades = self.modelo.predict_proba([mensagem_limpa])[0]
-        indice_maior_prob = probabilidades.argmax()
-        maior_probabilidade = probabilidades[indice_maior_prob]
-        categoria_prevista_ml = self.modelo.classes_[indice_maior_prob]
-
-        if maior_probabilidade >= 0.4 and categoria_prevista_ml in self.respostas:
-            texto_resposta = self.obter_texto_resposta(categoria_prevista_ml, historico_atual)
-            categoria_detectada = categoria_prevista_ml
-            usou_base_conhecimento = True
+        if not interacoes:
+            return
+        inicio = self.metricas.iniciar()
+        agora = datetime.datetime.now().isoformat()
+        registros = []
+        for mensagem, resposta_bot, categoria, *detalhes in interacoes:
+            registro = {
+                "mensagem_usuario": mensagem,
+                "resposta_chatbot": resposta_bot,
+                "categoria": categoria,
+                "timestamp": agora
+            }
+            registro.update(zip(("caminho", "tipo_resposta"), detalhes))
+            registros.append(registro)
+        self.buffer_historico.anexar(id_usuario, registros)
+        self.metricas.registrar_etapa("salvar_historico", inicio)
+
+    def _gravar_registros_historico(self, id_usuario, registros):
+        """Escrita de fato no histórico (na hora ou na descarga do buffer_historico)."""
+        # Garante o estado carregado antes da escrita (a reconstrução não deve contar estas interações)
+        self.estado_sessoes.obter(id_usuario)
+        self.armazenamento_historico.anexar_varios(
+            id_usuario, registros,
+            # O estado é atualizado ainda com a trava do histórico, sem intercalar com outro processo
+            apos_gravar=lambda tamanho: self.estado_sessoes.registrar(
+                id_usuario, registros[-1]["categoria"], len(registros), tamanho
+            ))
+
+    def ultima_categoria_usuario(self, id_usuario):
+        """Última categoria do usuário, considerando interações ainda não gravadas."""
+        pendente = self.buffer_historico.ultima_categoria(id_usuario)
+        if pendente is not None:
+            return pendente
+        return self.estado_sessoes.obter(id_usuario)["ultima_categoria"]
+
+    def encerrar(self):
+        """Grava o que estiver pendente no buffer do histórico antes de o processo terminar."""
+        self.buffer_historico.encerrar()
+
+    def classificar_lote(self, mensagens_limpas):
+        """Classifica várias mensagens com uma única chamada vetorizada de predict_proba."""
+        inicio = self.metricas.iniciar()
+        modelo = self.modelo  # referência única: o modelo pode ser trocado durante a chamada
+        probabilidades = modelo.predict_proba(mensagens_limpas)
+        indices_maior_prob = probabilidades.argmax(axis=1)
+        maiores_probabilidades = probabilidades.max(axis=1)
+        categorias_previstas = modelo.classes_[indices_maior_prob]
+        self.metricas.registrar_etapa("classificacao_ml", inicio)
+        return list(zip(categorias_previstas, maiores_probabilidades))
+
+    def _decidir_categoria(self, mensagem_limpa, categoria_prevista_ml, maior_probabilidade):
+        """Aplica o limiar do ML e, abaixo dele, o fallback. Retorna (categoria, caminho)."""
+        if maior_probabilidade >= self.limiar_confianca_ml and categoria_prevista_ml in self.respostas:
+            return categoria_prevista_ml, "ml"
+
+        # Fallback
+        categoria_fallback, caminho = self.classificar_fallback(mensagem_limpa)
+        if categoria_fallback is not None:
+            return categoria_fallback, caminho
+
+        return "DESCONHECIDO", "desconhecido"
+
+    def classificar_mensagens(self, mensagens_limpas):
+        """
+        Decide a categoria de cada mensagem, consultando antes o cache de predições.
+        Só as mensagens ausentes do cache passam pelo modelo, em uma única chamada.
+        Retorna uma lista de (categoria, probabilidade, caminho).
+        """
+        decisoes = [self.cache_predicao.obter(mensagem) for mensagem in mensagens_limpas]
+        pendentes = [indice for indice, decisao in enumerate(decisoes) if decisao is None]
+        if not pendentes:
+            return decisoes
+
+        versao = self.cache_predicao.versao_atual()
+        mensagens_pendentes = [mensagens_limpas[indice] for indice in pendentes]
+        if self.micro_lote is not None:
+            classificacoes = self.micro_lote.classificar(mensagens_pendentes)
         else:
-            # Fallback
-            texto_fallback, categoria_fallback, fallback_usado = self.obter_resposta_fallback(mensagem_limpa, historico_atual)
-            if fallback_usado:
-                texto_resposta = texto_fallback
-                categoria_detectada = categoria_fallback
-                usou_base_conhecimento = True
-            else:
-                texto_resposta = self.respostas["DESCONHECIDO"]["initial"]
-                categoria_detectada = "DESCONHECIDO"
-                usou_base_conhecimento = False
-
-        # Salva no histórico
-        self.salvar_historico_usuario(id_usuario, mensagem_usuario, texto_resposta, categoria_detectada)
+            classificacoes = self.classificar_lote(mensagens_pendentes)
+        for indice, (categoria_ml, probabilidade) in zip(pendentes, classificacoes):
+            categoria, caminho = self._decidir_categoria(mensagens_limpas[indice], categoria_ml, probabilidade)
+            decisoes[indice] = (categoria, float(probabilidade), caminho)
+            self.cache_predicao.definir(mensagens_limpas[indice], decisoes[indice], versao)
+        return decisoes
 
-        return {
-            "success": True,
-            "data": {
+    def processar_lote(self, itens):
+        """
+        Processa uma rajada de mensagens: [{"mensagem": str, "usuario_id": str}, ...].
+        A classificação é feita de uma vez; a escolha da resposta segue a ordem de
+        chegada de cada usuário e o histórico é gravado agrupado por usuário.
+        """
+        if not itens:
+            return []
+        inicio_total = self.metricas.iniciar()
+        resultados, interacoes_por_usuario = self.preparar_respostas(itens)
+        self.salvar_interacoes(interacoes_por_usuario)
+        self.metricas.registrar_etapa("total", inicio_total)
+        return resultados
+
+    def preparar_respostas(self, itens):
+        """
+        Classifica e monta as respostas sem gravar o histórico. Retorna (resultados,
+        interações por usuário) para salvar_interacoes, que pode rodar depois (ex.: servidor_async.py).
+        """
+        if self.modo_multiprocesso:
+            self.recarregar_modelo_se_alterado()
+
+        # Ids numéricos e em texto do mesmo usuário levam ao mesmo histórico
+        ids_usuarios = [str(item.get('usuario_id') or 'anonimo') for item in itens]
+        # Normalização única por mensagem, reaproveitada pelo cache, modelo, palavras-chave e similaridade
+        mensagens_limpas = [normalizar_texto(item['mensagem']) for item in itens]
+        decisoes = self.classificar_mensagens(mensagens_limpas)
+
+        ultimas_categorias = {}
+        interacoes_por_usuario = {}
+        resultados = []
+        for item, id_usuario, (categoria_detectada, _, caminho) in zip(itens, ids_usuarios, decisoes):
+            if id_usuario not in ultimas_categorias:
+                inicio = self.metricas.iniciar()
+                ultimas_categorias[id_usuario] = self.ultima_categoria_usuario(id_usuario)
+                self.metricas.registrar_etapa("carregar_estado", inicio)
+            self.metricas.contar_decisao(categoria_detectada, caminho)
+
+            texto_resposta = self.obter_texto_resposta(categoria_detectada, ultimas_categorias[id_usuario])
+            tipo_resposta = self.obter_tipo_resposta(categoria_detectada, ultimas_categorias[id_usuario])
+            usou_base_conhecimento = caminho != "desconhecido"
+            ultimas_categorias[id_usuario] = categoria_detectada
+            interacoes_por_usuario.setdefault(id_usuario, []).append(
+                (item['mensagem'], texto_resposta, categoria_detectada, caminho, tipo_resposta)
+            )
+            resultados.append({
                 "resposta": texto_resposta,
                 "categoria": categoria_detectada,
                 "usou_base_conhecimento": usou_base_conhecimento,
                 "timestamp": datetime.datetime.now().isoformat()
-            }
-        }
\ No newline at end of file
+            })
+        return resultados, interacoes_por_usuario
+
+    def salvar_interacoes(self, interacoes_por_usuario):
+        """Salva no histórico o retorno de preparar_respostas, uma escrita por usuário."""
+        for id_usuario, interacoes in interacoes_por_usuario.items():
+            self.salvar_interacoes_usuario(id_usuario, interacoes)
+
+    def processar_mensagem(self, mensagem_usuario, id_usuario="anonimo"):
+        """
+        MÉTODO PRINCIPAL PARA A API
+        """
+        resultado = self.processar_lote([{"mensagem": mensagem_usuario, "usuario_id": id_usuario}])[0]
+        return {
+            "success": True,
+            "data": resultado
+        }
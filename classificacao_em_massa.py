@@ -0,0 +1,234 @@
+"""
+Reclassifica arquivos grandes de mensagens (exportações do WhatsApp, históricos em
+JSONL) com o modelo atual, usando a mesma decisão do atendimento (ML e, abaixo do
+limiar, palavras-chave e similaridade). O arquivo é lido em blocos, cada bloco é
+classificado com uma chamada vetorizada em um pool de processos e o resultado é
+gravado em ordem, sem carregar o arquivo inteiro na memória.
+
+O progresso (byte da entrada já processado) fica em <saida>.progresso; --retomar
+continua de onde parou. Cada registro deve ocupar uma linha, inclusive no CSV.
+
+Exemplos:
+    python classificacao_em_massa.py historico_usuarios/d8/f6/anonimo_historico.jsonl auditoria.jsonl
+    python classificacao_em_massa.py whatsapp.csv whatsapp_rotulado.csv --coluna texto --trabalhadores 8
+    python classificacao_em_massa.py whatsapp.csv whatsapp_rotulado.csv --retomar
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from normalizacao import normalizar_texto
+from serializacao import de_json, para_texto
+
+_chatbot = None
+
+
+# --- Processos trabalhadores ---
+def _iniciar_trabalhador(usar_pontuador_compilado: bool):
+    # Com fork, o chatbot criado no processo principal já chega pronto (modelo compartilhado)
+    global _chatbot
+    if _chatbot is None:
+        from chatbot_core import ChatbotClinica
+        _chatbot = ChatbotClinica(usar_pontuador_compilado=usar_pontuador_compilado)
+
+
+def _classificar_bloco(mensagens: list) -> list:
+    return _chatbot.classificar_mensagens([normalizar_texto(mensagem) for mensagem in mensagens])
+
+
+# --- Leitura em blocos ---
+def ler_blocos(caminho: str, formato: str, coluna: str, inicio_byte: int, tamanho_bloco: int, contagem: Counter):
+    """
+    Gera (registros, mensagens, byte_final) a cada 'tamanho_bloco' linhas válidas.
+    'byte_final' é a posição da entrada logo após o bloco, usada para retomar.
+    """
+    with open(caminho, 'rb') as arquivo:
+        campos = None
+        if formato == 'csv':
+            campos = next(csv.reader([arquivo.readline().decode('utf-8-sig')]))
+            if coluna not in campos:
+                raise ValueError(f"Coluna '{coluna}' não encontrada no CSV: {', '.join(campos)}")
+        if inicio_byte > arquivo.tell():
+            arquivo.seek(inicio_byte)
+
+        registros, mensagens = [], []
+        for linha in iter(arquivo.readline, b''):
+            texto = linha.decode('utf-8', errors='replace').strip()
+            if not texto:
+                continue
+            try:
+                if formato == 'csv':
+                    registro = dict(zip(campos, next(csv.reader([texto]))))
+                else:
+                    registro = de_json(texto)
+                mensagem = registro.get(coluna, registro.get('mensagem_usuario'))
+            except (json.JSONDecodeError, StopIteration, AttributeError):
+                mensagem = None
+            if not isinstance(mensagem, str):
+                contagem["invalidas"] += 1
+                continue
+
+            registros.append(registro)
+            mensagens.append(mensagem)
+            if len(registros) >= tamanho_bloco:
+                yield registros, mensagens, arquivo.tell()
+                registros, mensagens = [], []
+        if registros:
+            yield registros, mensagens, arquivo.tell()
+
+
+# --- Escrita ---
+class EscritorResultados:
+    """Grava os registros com 'categoria_prevista', 'probabilidade' e 'caminho', no formato da entrada."""
+
+    CAMPOS_NOVOS = ('categoria_prevista', 'probabilidade', 'caminho')
+
+    def __init__(self, caminho: str, formato: str, anexar: bool):
+        self.formato = formato
+        self.arquivo = open(caminho, 'a' if anexar else 'w', encoding='utf-8', newline='')
+        self.escritor_csv = None
+        self._anexando = anexar and self.arquivo.tell() > 0
+
+    def escrever(self, registros: list, decisoes: list):
+        if self.formato == 'csv' and self.escritor_csv is None:
+            campos = list(registros[0]) + [campo for campo in self.CAMPOS_NOVOS if campo not in registros[0]]
+            self.escritor_csv = csv.DictWriter(self.arquivo, fieldnames=campos, extrasaction='ignore')
+            if not self._anexando:
+                self.escritor_csv.writeheader()
+
+        for registro, (categoria, probabilidade, caminho) in zip(registros, decisoes):
+            registro.update(categoria_prevista=categoria, probabilidade=round(probabilidade, 4), caminho=caminho)
+            if self.escritor_csv is not None:
+                self.escritor_csv.writerow(registro)
+            else:
+                self.arquivo.write(para_texto(registro) + '\n')
+        self.arquivo.flush()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+def salvar_progresso(caminho: str, entrada: str, byte: int, registros: int, byte_saida: int):
+    caminho_temporario = f"{caminho}.tmp"
+    with open(caminho_temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({"entrada": os.path.abspath(entrada), "byte": byte, "registros": registros,
+                   "byte_saida": byte_saida}, arquivo)
+    os.replace(caminho_temporario, caminho)
+
+
+def ler_progresso(caminho: str) -> dict:
+    if not os.path.exists(caminho):
+        return {"byte": 0, "registros": 0, "byte_saida": 0}
+    with open(caminho, 'r', encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+# --- Execução ---
+def classificar_arquivo(entrada: str, saida: str, formato: str, coluna: str = 'mensagem',
+                        trabalhadores: int = None, tamanho_bloco: int = 2000, inicio_byte: int = 0,
+                        anexar: bool = False, usar_pontuador_compilado: bool = True) -> dict:
+    global _chatbot
+    from chatbot_core import ChatbotClinica
+
+    # Treina/exporta o modelo uma única vez, antes de criar os processos
+    _chatbot = ChatbotClinica(usar_pontuador_compilado=usar_pontuador_compilado)
+    trabalhadores = trabalhadores or os.cpu_count() or 2
+    contexto = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+
+    caminho_progresso = f"{saida}.progresso"
+    registros_anteriores = ler_progresso(caminho_progresso)["registros"] if anexar else 0
+    contagem = Counter()
+    categorias = Counter()
+    caminhos = Counter()
+    total = 0
+    tamanho_entrada = os.path.getsize(entrada)
+    escritor = EscritorResultados(saida, formato, anexar)
+    inicio = time.perf_counter()
+
+    def concluir(tarefa):
+        nonlocal total
+        futuro, registros, byte_final = tarefa
+        decisoes = futuro.result()
+        escritor.escrever(registros, decisoes)
+        for registro, (categoria, _, caminho) in zip(registros, decisoes):
+            categorias[categoria] += 1
+            caminhos[caminho] += 1
+            if 'categoria' in registro:
+                contagem["com_categoria_original"] += 1
+                contagem["divergentes"] += registro['categoria'] != categoria
+        total += len(registros)
+        salvar_progresso(caminho_progresso, entrada, byte_final, registros_anteriores + total, escritor.arquivo.tell())
+        duracao = time.perf_counter() - inicio
+        print(f"\r⏳ {total} mensagens | {total / duracao:.0f} msg/s | byte {byte_final}/{tamanho_entrada} "
+              f"({byte_final / max(tamanho_entrada, 1):.0%})", end='', file=sys.stderr, flush=True)
+
+    try:
+        with ProcessPoolExecutor(trabalhadores, mp_context=contexto, initializer=_iniciar_trabalhador,
+                                 initargs=(usar_pontuador_compilado,)) as executor:
+            # Poucos blocos em andamento por vez: a memória não cresce com o tamanho do arquivo
+            em_andamento = deque()
+            for registros, mensagens, byte_final in ler_blocos(entrada, formato, coluna, inicio_byte,
+                                                               tamanho_bloco, contagem):
+                em_andamento.append((executor.submit(_classificar_bloco, mensagens), registros, byte_final))
+                if len(em_andamento) >= trabalhadores * 2:
+                    concluir(em_andamento.popleft())
+            while em_andamento:
+                concluir(em_andamento.popleft())
+    finally:
+        escritor.fechar()
+        print(file=sys.stderr)
+
+    duracao = time.perf_counter() - inicio
+    return {
+        "mensagens": total,
+        "linhas_invalidas": contagem["invalidas"],
+        "segundos": round(duracao, 2),
+        "mensagens_por_segundo": round(total / duracao, 1) if duracao else None,
+        "trabalhadores": trabalhadores,
+        "categorias": dict(categorias.most_common()),
+        "caminhos": dict(caminhos.most_common()),
+        "divergencias_categoria_original": contagem["divergentes"] if contagem["com_categoria_original"] else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classificação em massa de mensagens (JSONL ou CSV).")
+    parser.add_argument('entrada')
+    parser.add_argument('saida')
+    parser.add_argument('--formato', choices=['jsonl', 'csv'], help="padrão: pela extensão da entrada")
+    parser.add_argument('--coluna', default='mensagem', help="campo com o texto (JSONL também aceita 'mensagem_usuario')")
+    parser.add_argument('--trabalhadores', type=int, default=None, help="processos (padrão: número de CPUs)")
+    parser.add_argument('--tamanho-bloco', type=int, default=2000)
+    parser.add_argument('--inicio-byte', type=int, default=0, help="começa neste byte da entrada e anexa à saída")
+    parser.add_argument('--retomar', action='store_true', help="continua do byte salvo em <saida>.progresso")
+    parser.add_argument('--sklearn', action='store_true', help="usa o pipeline do scikit-learn em vez do pontuador NumPy")
+    argumentos = parser.parse_args()
+
+    formato = argumentos.formato or ('csv' if argumentos.entrada.lower().endswith('.csv') else 'jsonl')
+    inicio_byte = argumentos.inicio_byte
+    if argumentos.retomar:
+        progresso = ler_progresso(f"{argumentos.saida}.progresso")
+        if progresso.get("entrada") not in (None, os.path.abspath(argumentos.entrada)):
+            print(f"❌ O progresso salvo é de outra entrada: {progresso['entrada']}")
+            sys.exit(1)
+        inicio_byte = progresso["byte"]
+        if os.path.exists(argumentos.saida):
+            # Descarta resultados gravados depois do último progresso salvo (interrupção no meio de um bloco)
+            os.truncate(argumentos.saida, progresso.get("byte_saida", os.path.getsize(argumentos.saida)))
+        print(f"↪️  Retomando do byte {inicio_byte} ({progresso['registros']} mensagens já classificadas)")
+
+    resumo = classificar_arquivo(
+        argumentos.entrada, argumentos.saida, formato, argumentos.coluna, argumentos.trabalhadores,
+        argumentos.tamanho_bloco, inicio_byte, anexar=argumentos.retomar or inicio_byte > 0,
+        usar_pontuador_compilado=not argumentos.sklearn
+    )
+    print(f"✅ {resumo['mensagens']} mensagens em {resumo['segundos']} s "
+          f"({resumo['mensagens_por_segundo']} msg/s, {resumo['trabalhadores']} processos)")
+    print(json.dumps({chave: valor for chave, valor in resumo.items() if chave not in ('mensagens', 'segundos')},
+                     ensure_ascii=False, indent=2))
@@ -0,0 +1,98 @@
+"""
+Instância do chatbot compartilhada pelos servidores (servidor_api.py e servidor_async.py),
+configurada pelas variáveis de ambiente CHATBOT_*. Não importa o Flask: o servidor
+assíncrono sobe sem ele.
+"""
+import datetime
+import os
+
+from chatbot_core import ChatbotClinica
+from controle_admissao import ControleAdmissao
+from historico_armazenamento import id_usuario_valido
+from manutencao_historico import ManutencaoHistorico
+
+# Instância global do chatbot (servindo com o pontuador NumPy exportado do modelo).
+# CHATBOT_MULTIPROCESSO=1 é definido pelo servidor_producao.py, que roda vários processos.
+chatbot = ChatbotClinica(
+    usar_pontuador_compilado=True,
+    modo_multiprocesso=os.environ.get('CHATBOT_MULTIPROCESSO') == '1',
+    # Fração das etapas cronometradas (1.0 = todas); os contadores de /api/metrics são sempre completos
+    taxa_amostragem_metricas=float(os.environ.get('CHATBOT_TAXA_AMOSTRAGEM_METRICAS', '1.0')),
+    # Micro-lotes: requisições simultâneas dentro da janela viram uma única chamada ao modelo (0 = desligado)
+    janela_micro_lote_ms=float(os.environ.get('CHATBOT_JANELA_MICRO_LOTE_MS', '0')),
+    tamanho_maximo_micro_lote=int(os.environ.get('CHATBOT_TAMANHO_MICRO_LOTE', '64')),
+    # Gravação do histórico: sincrono (padrão), agrupado ou assincrono
+    modo_historico=os.environ.get('CHATBOT_MODO_HISTORICO', 'sincrono')
+)
+
+# Controle de admissão em /api/chat/mensagem (por processo; 0 desliga o limite correspondente)
+controle_admissao = ControleAdmissao(
+    limite_em_andamento=int(os.environ.get('CHATBOT_LIMITE_EM_ANDAMENTO', '32')),
+    limite_fila=int(os.environ.get('CHATBOT_LIMITE_FILA', '64')),
+    espera_maxima_segundos=float(os.environ.get('CHATBOT_ESPERA_FILA_MS', '250')) / 1000,
+    # Balde de tokens por usuario_id: rajada inicial e reposição em mensagens por segundo
+    taxa_por_usuario=float(os.environ.get('CHATBOT_TAXA_POR_USUARIO', '2')),
+    rajada_por_usuario=int(os.environ.get('CHATBOT_RAJADA_POR_USUARIO', '10'))
+)
+
+# Retenção do histórico: arquiva (gzip) interações antigas; sem CHATBOT_RETENCAO_* fica desligada
+manutencao_historico = ManutencaoHistorico(
+    chatbot.armazenamento_historico,
+    dias_retencao=float(os.environ.get('CHATBOT_RETENCAO_DIAS', '0')),
+    turnos_retencao=int(os.environ.get('CHATBOT_RETENCAO_TURNOS', '0')),
+    intervalo_segundos=float(os.environ.get('CHATBOT_INTERVALO_ARQUIVAMENTO_S', '3600'))
+)
+manutencao_historico.iniciar()
+
+
+def usuario_id_aceito(usuario_id) -> bool:
+    """O usuario_id vira nome de arquivo do histórico: só texto ou número, não vazio e de tamanho limitado."""
+    return isinstance(usuario_id, (str, int)) and not isinstance(usuario_id, bool) and id_usuario_valido(usuario_id)
+
+
+def dados_saude():
+    """Conteúdo de /api/health"""
+    return {
+        "status": "online",
+        "service": "chatbot-clinica",
+        "cache_predicao": chatbot.cache_predicao.estatisticas(),
+        "metricas": chatbot.metricas.resumo(),
+        "micro_lote": chatbot.micro_lote.estatisticas() if chatbot.micro_lote else None,
+        "historico": chatbot.buffer_historico.estatisticas(),
+        "admissao": controle_admissao.estatisticas(),
+        "retencao_historico": manutencao_historico.estatisticas(),
+        "timestamp": datetime.datetime.now().isoformat()
+    }
+
+
+def dados_prontidao():
+    """
+    Conteúdo de /api/ready: (pronto, dados). O processo só está pronto depois do
+    aquecimento; o balanceador de carga deve mandar tráfego apenas com status 200.
+    """
+    pronto = chatbot.aquecimento.get("concluido", False)
+    try:
+        bytes_base = os.path.getsize(chatbot.ARQUIVO_BASE_CONHECIMENTO)
+    except OSError:
+        bytes_base = None
+    cache = chatbot.cache_predicao
+    return pronto, {
+        "status": "pronto" if pronto else "nao_pronto",
+        "pid": os.getpid(),
+        "modelo": chatbot.impressao_digital_modelo(),
+        "aquecimento": chatbot.aquecimento,
+        "tempos_inicializacao_ms": {fase: round(segundos * 1000, 1)
+                                    for fase, segundos in chatbot.tempos_inicializacao.items()},
+        "cache_predicao": {
+            "itens": len(cache.cache),
+            "capacidade": cache.cache.capacidade,
+            "ocupacao": round(len(cache.cache) / cache.cache.capacidade, 4) if cache.cache.capacidade else None
+        },
+        "base_conhecimento": {
+            "frases": len(chatbot.frases),
+            "categorias": len(set(chatbot.categorias)),
+            "palavras_chave": len(chatbot.palavras_chave),
+            "bytes": bytes_base
+        },
+        "timestamp": datetime.datetime.now().isoformat()
+    }
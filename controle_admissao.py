@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import Counter
+
+from cache_lru import CacheLRU
+
+
+class ControleAdmissao:
+    """
+    Limita o trabalho aceito pelo servidor em rajadas:
+    - no máximo 'limite_em_andamento' requisições processando ao mesmo tempo; as
+      excedentes esperam em uma fila de até 'limite_fila' lugares, por no máximo
+      'espera_maxima_segundos', e depois são recusadas (503) em vez de acumular;
+    - balde de tokens por usuário: 'rajada_por_usuario' mensagens seguidas e, depois,
+      'taxa_por_usuario' mensagens por segundo (429 com o tempo de espera).
+
+    Zero em 'limite_em_andamento' ou 'taxa_por_usuario' desliga o respectivo limite.
+    Os baldes ficam em um cache LRU: um usuário descartado volta com o balde cheio.
+    """
+
+    def __init__(self, limite_em_andamento: int = 32, limite_fila: int = 64, espera_maxima_segundos: float = 0.25,
+                 taxa_por_usuario: float = 2.0, rajada_por_usuario: int = 10, capacidade_usuarios: int = 100000):
+        self.limite_em_andamento = limite_em_andamento
+        self.limite_fila = limite_fila
+        self.espera_maxima_segundos = espera_maxima_segundos
+        self.taxa_por_usuario = taxa_por_usuario
+        self.rajada_por_usuario = rajada_por_usuario
+        self._baldes = CacheLRU(capacidade_usuarios)  # id_usuario -> (tokens, instante da última consulta)
+        self._trava_baldes = threading.Lock()
+        self._condicao = threading.Condition()
+        self._em_andamento = 0
+        self._na_fila = 0
+        self.contagem = Counter()
+
+    # --- Limite por usuário ---
+    def consumir_usuario(self, id_usuario: str, quantidade: int = 1) -> float:
+        """Retorna 0 se o usuário pode enviar agora; senão, os segundos até ter tokens suficientes."""
+        return self.consumir_usuarios({id_usuario: quantidade})
+
+    def consumir_usuarios(self, quantidades: dict) -> float:
+        """
+        Consome de uma vez os tokens de vários usuários ({id_usuario: mensagens}, ex.: um lote):
+        ou todos têm tokens suficientes, ou nada é consumido. Retorna 0 se admitido; senão, os
+        segundos até o usuário mais limitado ter tokens, ou infinito se ele pede mais que a rajada.
+        """
+        if not self.taxa_por_usuario or not quantidades:
+            return 0.0
+        agora = time.monotonic()
+        with self._trava_baldes:
+            saldos = {}
+            espera = 0.0
+            for id_usuario, quantidade in quantidades.items():
+                tokens, instante = self._baldes.obter(id_usuario, (self.rajada_por_usuario, agora))
+                saldos[id_usuario] = min(self.rajada_por_usuario, tokens + (agora - instante) * self.taxa_por_usuario)
+                if quantidade > self.rajada_por_usuario:
+                    espera = float('inf')
+                elif saldos[id_usuario] < quantidade:
+                    espera = max(espera, (quantidade - saldos[id_usuario]) / self.taxa_por_usuario)
+
+            for id_usuario, quantidade in quantidades.items():
+                self._baldes.definir(id_usuario, (saldos[id_usuario] - (0 if espera else quantidade), agora))
+            if espera:
+                self.contagem["rejeitadas_limite_usuario"] += 1
+        return espera
+
+    def devolver_usuarios(self, quantidades: dict):
+        """Devolve os tokens de um consumir_usuarios admitido cuja requisição acabou recusada (503)."""
+        if not self.taxa_por_usuario or not quantidades:
+            return
+        agora = time.monotonic()
+        with self._trava_baldes:
+            for id_usuario, quantidade in quantidades.items():
+                tokens, instante = self._baldes.obter(id_usuario, (self.rajada_por_usuario, agora))
+                tokens = tokens + (agora - instante) * self.taxa_por_usuario + quantidade
+                self._baldes.definir(id_usuario, (min(self.rajada_por_usuario, tokens), agora))
+
+    # --- Limite de requisições em andamento ---
+    def entrar(self, bloquear: bool = True) -> bool:
+        """
+        Ocupa um lugar entre as requisições em andamento. Com 'bloquear', espera na fila
+        (se houver lugar nela) até 'espera_maxima_segundos'. Retorna False se recusada.
+        """
+        if not self.limite_em_andamento:
+            with self._condicao:
+                self._em_andamento += 1
+                self.contagem["admitidas"] += 1
+            return True
+
+        with self._condicao:
+            if self._em_andamento < self.limite_em_andamento:
+                self._em_andamento += 1
+                self.contagem["admitidas"] += 1
+                return True
+            if not bloquear or self._na_fila >= self.limite_fila:
+                self.contagem["rejeitadas_sobrecarga"] += 1
+                return False
+
+            self._na_fila += 1
+            try:
+                admitida = self._condicao.wait_for(lambda: self._em_andamento < self.limite_em_andamento,
+                                                   timeout=self.espera_maxima_segundos)
+            finally:
+                self._na_fila -= 1
+            if not admitida:
+                self.contagem["rejeitadas_espera"] += 1
+                return False
+            self._em_andamento += 1
+            self.contagem["admitidas"] += 1
+            return True
+
+    def sair(self):
+        with self._condicao:
+            self._em_andamento -= 1
+            self._condicao.notify()
+
+    def estatisticas(self) -> dict:
+        return {
+            "em_andamento": self._em_andamento,
+            "limite_em_andamento": self.limite_em_andamento,
+            "fila": self._na_fila,
+            "limite_fila": self.limite_fila,
+            "admitidas": self.contagem["admitidas"],
+            "rejeitadas_sobrecarga": self.contagem["rejeitadas_sobrecarga"],
+            "rejeitadas_espera": self.contagem["rejeitadas_espera"],
+            "rejeitadas_limite_usuario": self.contagem["rejeitadas_limite_usuario"],
+            "usuarios_monitorados": len(self._baldes)
+        }
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import datetime
+from contextlib import nullcontext
+
+from cache_lru import CacheLRU
+from historico_armazenamento import subcaminho_usuario
+from serializacao import de_json, para_bytes
+
+
+class EstadoSessoes:
+    """
+    Guarda, por usuário, apenas o que o atendimento precisa a cada mensagem:
+    a última categoria e o número de interações. Fica em um cache LRU com TTL,
+    com um índice pequeno em disco (um arquivo por usuário, nos mesmos
+    subdiretórios por hash do histórico), de modo que o caminho principal nunca
+    precisa ler o histórico completo.
+
+    Com 'validar_entre_processos', cada consulta compara o tamanho atual do
+    histórico (um os.stat) com o registrado no estado; se outro processo gravou
+    interações desse usuário, o estado é relido do índice.
+    """
+
+    def __init__(self, armazenamento_historico, diretorio_indice: str,
+                 capacidade: int = 10000, ttl_segundos: float = 1800,
+                 validar_entre_processos: bool = False):
+        self.armazenamento_historico = armazenamento_historico
+        self.diretorio_indice = diretorio_indice
+        self.validar_entre_processos = validar_entre_processos
+        self.cache = CacheLRU(capacidade, ttl_segundos)
+
+    def caminho_indice(self, id_usuario: str) -> str:
+        return os.path.join(self.diretorio_indice, subcaminho_usuario(id_usuario, '.json'))
+
+    def obter(self, id_usuario: str) -> dict:
+        """Retorna {'ultima_categoria': str | None, 'total_interacoes': int, 'tamanho_historico': int}."""
+        estado = self.cache.obter(id_usuario)
+        if estado is not None and self.validar_entre_processos:
+            if estado["tamanho_historico"] != self.armazenamento_historico.tamanho(id_usuario):
+                estado = None
+
+        if estado is None:
+            trava = self.armazenamento_historico.trava_leitura(id_usuario) \
+                if self.validar_entre_processos else nullcontext()
+            with trava:
+                estado = self._ler_indice(id_usuario)
+                if estado is not None and estado["tamanho_historico"] != self.armazenamento_historico.tamanho(id_usuario):
+                    estado = None
+            if estado is None:
+                # Usuário sem índice válido (ex.: histórico anterior a esta versão): reconstrói uma única vez
+                estado = self._reconstruir(id_usuario)
+            self.cache.definir(id_usuario, estado)
+        return estado
+
+    def registrar(self, id_usuario: str, categoria: str, quantidade: int = 1, tamanho_historico: int = None):
+        """
+        Atualiza o estado após novas interações já gravadas no histórico. Deve ser
+        chamado com a trava do histórico (ArmazenamentoHistorico.anexar_varios, 'apos_gravar').
+        """
+        anterior = None
+        if self.validar_entre_processos:
+            anterior = self._ler_indice(id_usuario)
+        if anterior is None:
+            anterior = self.cache.obter(id_usuario) or {"total_interacoes": 0}
+
+        estado = {
+            "ultima_categoria": categoria,
+            "total_interacoes": anterior["total_interacoes"] + quantidade,
+            "tamanho_historico": tamanho_historico if tamanho_historico is not None
+            else self.armazenamento_historico.tamanho(id_usuario)
+        }
+        self.cache.definir(id_usuario, estado)
+        self._gravar_indice(id_usuario, estado)
+
+    def _ler_indice(self, id_usuario: str):
+        caminho = self.caminho_indice(id_usuario)
+        if not os.path.exists(caminho):
+            return None
+        try:
+            with open(caminho, 'rb') as arquivo:
+                dados = de_json(arquivo.read())
+        except (json.JSONDecodeError, OSError):
+            return None
+        return {
+            "ultima_categoria": dados.get("c"),
+            "total_interacoes": dados.get("n", 0),
+            "tamanho_historico": dados.get("b")
+        }
+
+    def _reconstruir(self, id_usuario: str) -> dict:
+        historico = self.armazenamento_historico.carregar(id_usuario)
+        estado = {
+            "ultima_categoria": historico[-1].get("categoria") if historico else None,
+            "total_interacoes": len(historico),
+            "tamanho_historico": self.armazenamento_historico.tamanho(id_usuario)
+        }
+        if historico:
+            self._gravar_indice(id_usuario, estado)
+        return estado
+
+    def _gravar_indice(self, id_usuario: str, estado: dict):
+        caminho = self.caminho_indice(id_usuario)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        caminho_temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(caminho_temporario, 'wb') as arquivo:
+            arquivo.write(para_bytes({
+                "c": estado["ultima_categoria"],
+                "n": estado["total_interacoes"],
+                "b": estado["tamanho_historico"],
+                "t": datetime.datetime.now().isoformat()
+            }))
+        os.replace(caminho_temporario, caminho)
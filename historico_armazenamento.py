@@ -0,0 +1,468 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+from urllib.parse import unquote
+
+from serializacao import de_json, para_bytes
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem travas entre processos
+    fcntl = None
+
+# Caracteres aceitos como estão no nome do arquivo; os demais (inclusive '/', '\\' e '%') viram %XX
+_CARACTERES_INSEGUROS = re.compile(r'[^A-Za-z0-9_.@+-]')
+TAMANHO_MAXIMO_NOME = 200
+
+
+def nome_seguro(id_usuario) -> str:
+    """
+    Nome de arquivo derivado do usuario_id, sem separadores de diretório: a codificação
+    %XX é reversível (urllib.parse.unquote) e ids diferentes nunca dão o mesmo nome.
+    """
+    id_usuario = str(id_usuario)
+    nome = _CARACTERES_INSEGUROS.sub(
+        lambda trecho: ''.join(f'%{byte:02X}' for byte in trecho.group().encode('utf-8')), id_usuario
+    )
+    if not nome or len(nome) > TAMANHO_MAXIMO_NOME:
+        raise ValueError(f"usuario_id inválido (vazio ou longo demais): {id_usuario[:50]!r}")
+    return nome
+
+
+def id_usuario_valido(id_usuario) -> bool:
+    try:
+        nome_seguro(id_usuario)
+    except ValueError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=65536)
+def subcaminho_usuario(id_usuario, extensao: str) -> str:
+    """'ab/cd/<nome><extensao>': dois níveis de 256 subdiretórios pelo hash do id."""
+    nome = nome_seguro(id_usuario)
+    resumo = hashlib.sha256(str(id_usuario).encode('utf-8')).hexdigest()
+    return os.path.join(resumo[:2], resumo[2:4], nome + extensao)
+
+
+class CursorExpirado(ValueError):
+    """O cursor de paginação é de uma versão do arquivo que já foi reescrita (compactação, arquivamento)."""
+
+
+def codificar_cursor(inode: int, inicio: int, linha: bytes) -> str:
+    """Cursor opaco: arquivo (inode), byte inicial da interação e CRC32 da linha dela."""
+    return f"{inode:x}.{inicio:x}.{zlib.crc32(linha):08x}"
+
+
+def decodificar_cursor(cursor: str) -> tuple:
+    """(inode, inicio, crc) do cursor. Levanta ValueError se ele estiver malformado."""
+    partes = str(cursor).split('.')
+    if len(partes) != 3 or not all(re.fullmatch(r'[0-9a-f]{1,16}', parte) for parte in partes):
+        raise ValueError(f"Cursor inválido: {str(cursor)[:50]!r}")
+    return tuple(int(parte, 16) for parte in partes)
+
+
+class ArmazenamentoHistorico:
+    """
+    Armazena o histórico de conversas em JSONL (uma linha por interação).
+    Cada nova interação é apenas anexada ao final do arquivo, sem reler nem
+    reescrever o histórico inteiro.
+
+    Os arquivos ficam em subdiretórios pelo hash do id (<diretorio>/ab/cd/<id>_historico.jsonl),
+    para que nenhum diretório cresça demais. Arquivos do layout plano anterior
+    (<diretorio>/<id>_historico.jsonl e o JSON antigo <id>_historico.json) são migrados
+    automaticamente no primeiro acesso ou de uma vez com o comando 'migrar'.
+    Interações fora da política de retenção vão para <diretorio>/_arquivo/, em gzip, e as
+    que não puderam ser gravadas (ver guardar_falha) para <diretorio>/_falhas/.
+
+    Escritas, migração, compactação e arquivamento de um mesmo usuário são serializados
+    com trava de arquivo (fcntl.flock), inclusive entre processos diferentes.
+    """
+
+    EXTENSAO = '_historico.jsonl'
+    EXTENSAO_LEGADO = '_historico.json'
+    EXTENSAO_ARQUIVADO = '_historico.jsonl.gz'
+    DIRETORIO_ARQUIVO = '_arquivo'
+    DIRETORIO_FALHAS = '_falhas'
+
+    def __init__(self, diretorio='historico_usuarios'):
+        self.diretorio = diretorio
+        self._usuarios_verificados = set()
+
+    def caminho_arquivo(self, id_usuario: str) -> str:
+        return os.path.join(self.diretorio, subcaminho_usuario(id_usuario, self.EXTENSAO))
+
+    def caminho_arquivado(self, id_usuario: str) -> str:
+        return os.path.join(self.diretorio, self.DIRETORIO_ARQUIVO, subcaminho_usuario(id_usuario, self.EXTENSAO_ARQUIVADO))
+
+    def caminho_falhas(self, id_usuario: str) -> str:
+        return os.path.join(self.diretorio, self.DIRETORIO_FALHAS, subcaminho_usuario(id_usuario, self.EXTENSAO))
+
+    def caminho_legado(self, id_usuario: str) -> str:
+        """JSON antigo, no layout plano."""
+        return os.path.join(self.diretorio, f"{id_usuario}{self.EXTENSAO_LEGADO}")
+
+    def caminho_plano(self, id_usuario: str) -> str:
+        """JSONL no layout plano, anterior aos subdiretórios."""
+        return os.path.join(self.diretorio, f"{id_usuario}{self.EXTENSAO}")
+
+    def arquivos_usuario(self, id_usuario: str) -> list:
+        """Arquivos existentes com interações do usuário, das mais antigas para as mais recentes."""
+        caminhos = [self.caminho_arquivado(id_usuario), self.caminho_arquivo(id_usuario)]
+        if self._tem_layout_plano(id_usuario):
+            caminhos[1:1] = [self.caminho_legado(id_usuario), self.caminho_plano(id_usuario)]
+        return [caminho for caminho in caminhos if os.path.exists(caminho)]
+
+    def _tem_layout_plano(self, id_usuario: str) -> bool:
+        # Só ids que já eram nomes seguros podem ser procurados pelo nome no layout plano
+        return nome_seguro(id_usuario) == str(id_usuario)
+
+    # --- Travas entre processos ---
+    @contextmanager
+    def _travar(self, caminho: str):
+        """
+        Abre o arquivo para anexação com trava exclusiva. Se outro processo trocou o
+        arquivo (compactação/migração) enquanto esperávamos a trava, reabre o novo.
+        """
+        while True:
+            arquivo = open(caminho, 'ab+')
+            if fcntl is None:
+                break
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+            try:
+                if os.fstat(arquivo.fileno()).st_ino == os.stat(caminho).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            arquivo.close()
+        try:
+            yield arquivo
+        finally:
+            arquivo.close()  # fechar também libera a trava
+
+    @contextmanager
+    def trava_leitura(self, id_usuario: str):
+        """Trava compartilhada: espera escritas em andamento do usuário terminarem."""
+        caminho = self.caminho_arquivo(id_usuario)
+        if fcntl is None or not os.path.exists(caminho):
+            yield
+            return
+        with open(caminho, 'rb') as arquivo:
+            fcntl.flock(arquivo, fcntl.LOCK_SH)
+            yield
+
+    def tamanho(self, id_usuario: str) -> int:
+        """Tamanho em bytes do histórico: muda a cada interação gravada, por qualquer processo."""
+        try:
+            return os.stat(self.caminho_arquivo(id_usuario)).st_size
+        except FileNotFoundError:
+            return 0
+
+    # --- Leitura ---
+    def carregar(self, id_usuario: str) -> list:
+        """Retorna a lista completa de interações do usuário (mesmo formato do JSON antigo)."""
+        self._migrar_se_necessario(id_usuario)
+        caminho = self.caminho_arquivo(id_usuario)
+        if not os.path.exists(caminho):
+            return []
+        registros, linhas_invalidas = self._ler_jsonl(caminho)
+        if linhas_invalidas:
+            # Linhas truncadas (ex.: queda durante a escrita) são descartadas de vez
+            self.compactar(id_usuario)
+        return registros
+
+    def ler_reverso(self, id_usuario: str, cursor: str = None, desde: str = None, ate: str = None,
+                    tamanho_bloco: int = 8192):
+        """
+        Gera (cursor, registro) do mais recente para o mais antigo, lendo o arquivo
+        de trás para frente em blocos: o custo depende só do que é consumido, não do
+        tamanho do histórico. 'cursor' (o de um registro já visto) continua a leitura
+        a partir dos anteriores a ele; 'desde' (inclusive) e 'ate' (exclusive) filtram
+        pelo timestamp ISO.
+
+        Anexar não invalida cursores, mas compactar e arquivar reescrevem o arquivo: um
+        cursor de antes disso levanta CursorExpirado (na primeira leitura do gerador).
+        """
+        self._migrar_se_necessario(id_usuario)
+        caminho = self.caminho_arquivo(id_usuario)
+        if not os.path.exists(caminho):
+            if cursor is not None:
+                raise CursorExpirado("O histórico do cursor não existe mais")
+            return
+        with open(caminho, 'rb') as arquivo:
+            estado = os.fstat(arquivo.fileno())
+            tamanho = estado.st_size
+            posicao = tamanho
+            if cursor is not None:
+                inode, posicao, crc = decodificar_cursor(cursor)
+                arquivo.seek(posicao)
+                if inode != estado.st_ino or posicao >= tamanho or zlib.crc32(arquivo.readline().rstrip(b'\n')) != crc:
+                    raise CursorExpirado("O histórico foi reescrito depois da emissão do cursor")
+            resto = b''
+            while posicao > 0:
+                leitura = min(tamanho_bloco, posicao)
+                posicao -= leitura
+                arquivo.seek(posicao)
+                linhas = (arquivo.read(leitura) + resto).split(b'\n')
+                # A primeira linha pode estar incompleta: fica para o próximo bloco
+                resto = linhas.pop(0) if posicao > 0 else b''
+                inicio = posicao + (len(resto) + 1 if posicao > 0 else 0)
+
+                inicios = []
+                for linha in linhas:
+                    inicios.append(inicio)
+                    inicio += len(linha) + 1
+                for inicio_linha, linha in zip(reversed(inicios), reversed(linhas)):
+                    if not linha.strip():
+                        continue
+                    try:
+                        registro = de_json(linha)
+                    except json.JSONDecodeError:
+                        continue
+                    momento = registro.get("timestamp") or ''
+                    if ate is not None and momento >= ate:
+                        continue
+                    if desde is not None and momento < desde:
+                        return  # o arquivo está em ordem de gravação: o resto é mais antigo
+                    yield codificar_cursor(estado.st_ino, inicio_linha, linha), registro
+
+    def _ler_jsonl(self, caminho: str) -> tuple:
+        registros = []
+        linhas_invalidas = 0
+        with open(caminho, 'rb') as arquivo:
+            for linha in arquivo:
+                linha = linha.strip()
+                if not linha:
+                    continue
+                try:
+                    registros.append(de_json(linha))
+                except json.JSONDecodeError:
+                    linhas_invalidas += 1
+        return registros, linhas_invalidas
+
+    # --- Escrita ---
+    def anexar(self, id_usuario: str, registro: dict):
+        """Anexa uma interação ao final do histórico do usuário (custo O(1))."""
+        self.anexar_varios(id_usuario, [registro])
+
+    def anexar_varios(self, id_usuario: str, registros: list, apos_gravar=None):
+        """
+        Anexa várias interações do mesmo usuário com uma única escrita. 'apos_gravar',
+        se informado, é chamado com o novo tamanho do arquivo ainda com a trava.
+        """
+        if not registros:
+            return
+        self._migrar_se_necessario(id_usuario)
+        caminho = self.caminho_arquivo(id_usuario)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+        conteudo = b''.join(self._codificar(registro) + b'\n' for registro in registros)
+        with self._travar(caminho) as arquivo:
+            # Se a última escrita foi interrompida no meio da linha, começa uma linha nova
+            arquivo.seek(0, os.SEEK_END)
+            if arquivo.tell() > 0:
+                arquivo.seek(-1, os.SEEK_END)
+                if arquivo.read(1) != b'\n':
+                    conteudo = b'\n' + conteudo
+            arquivo.write(conteudo)
+            arquivo.flush()
+            if apos_gravar is not None:
+                apos_gravar(arquivo.tell())
+
+    def guardar_falha(self, id_usuario: str, registros: list, erro: Exception):
+        """
+        Anexa a <diretorio>/_falhas/ as interações que não puderam ir para o histórico
+        (ex.: um <id>_historico.json antigo corrompido, que faz a migração falhar sempre),
+        com o erro em 'erro_gravacao', para recuperação manual. Não passa pela migração.
+        """
+        caminho = self.caminho_falhas(id_usuario)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        conteudo = b''.join(self._codificar({**registro, "erro_gravacao": str(erro)}) + b'\n' for registro in registros)
+        with self._travar(caminho) as arquivo:
+            arquivo.write(conteudo)
+
+    def _codificar(self, registro: dict) -> bytes:
+        return para_bytes(registro)
+
+    def _reescrever(self, caminho: str, registros: list):
+        """Reescreve o arquivo de forma atômica (arquivo temporário + os.replace)."""
+        caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(caminho_temporario, 'wb') as arquivo:
+            for registro in registros:
+                arquivo.write(self._codificar(registro) + b'\n')
+        os.replace(caminho_temporario, caminho)
+
+    # --- Migração e compactação ---
+    def _migrar_se_necessario(self, id_usuario: str):
+        if id_usuario in self._usuarios_verificados:
+            return
+        if self._tem_layout_plano(id_usuario):
+            self.migrar_legado(id_usuario)
+        self._usuarios_verificados.add(id_usuario)
+
+    def migrar_legado(self, id_usuario: str, nome_plano: str = None) -> bool:
+        """
+        Move para o subdiretório do usuário o histórico do layout plano (<nome_plano>_historico.json
+        e/ou <nome_plano>_historico.jsonl, por padrão o próprio id). Retorna True se houve migração.
+        """
+        nome_plano = str(id_usuario) if nome_plano is None else nome_plano
+        caminho_legado = os.path.join(self.diretorio, f"{nome_plano}{self.EXTENSAO_LEGADO}")
+        caminho_plano = os.path.join(self.diretorio, f"{nome_plano}{self.EXTENSAO}")
+        if not (os.path.exists(caminho_legado) or os.path.exists(caminho_plano)):
+            return False
+
+        caminho = self.caminho_arquivo(id_usuario)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with self._travar(caminho):
+            # Outro processo pode ter migrado enquanto esperávamos a trava
+            if not (os.path.exists(caminho_legado) or os.path.exists(caminho_plano)):
+                return False
+            registros = []
+            if os.path.exists(caminho_legado):
+                with open(caminho_legado, 'r', encoding='utf-8') as arquivo:
+                    registros.extend(json.load(arquivo))
+            if os.path.exists(caminho_plano):
+                registros.extend(self._ler_jsonl(caminho_plano)[0])
+
+            # Interações já gravadas no layout novo vêm depois das antigas
+            registros_novos, _ = self._ler_jsonl(caminho)
+            self._reescrever(caminho, registros + registros_novos)
+            for caminho_antigo in (caminho_legado, caminho_plano):
+                if os.path.exists(caminho_antigo):
+                    os.remove(caminho_antigo)
+        return True
+
+    def compactar(self, id_usuario: str) -> int:
+        """Reescreve o JSONL do usuário descartando linhas inválidas. Retorna quantas foram removidas."""
+        caminho = self.caminho_arquivo(id_usuario)
+        if not os.path.exists(caminho):
+            return 0
+        with self._travar(caminho):
+            registros, linhas_invalidas = self._ler_jsonl(caminho)
+            if linhas_invalidas:
+                self._reescrever(caminho, registros)
+        return linhas_invalidas
+
+    def arquivar(self, id_usuario: str, dias_retencao: float = None, turnos_retencao: int = None) -> int:
+        """
+        Aplica a política de retenção: interações com mais de 'dias_retencao' dias ou além das
+        'turnos_retencao' mais recentes saem do histórico ativo e são anexadas, em gzip, ao
+        arquivo do usuário em _arquivo/. Retorna quantas foram arquivadas.
+        """
+        self._migrar_se_necessario(id_usuario)
+        caminho = self.caminho_arquivo(id_usuario)
+        if not os.path.exists(caminho) or (dias_retencao is None and turnos_retencao is None):
+            return 0
+        limite = None
+        if dias_retencao is not None:
+            limite = (datetime.datetime.now() - datetime.timedelta(days=dias_retencao)).isoformat()
+
+        with self._travar(caminho):
+            registros, _ = self._ler_jsonl(caminho)
+            corte = max(0, len(registros) - turnos_retencao) if turnos_retencao is not None else 0
+            if limite is not None:
+                # Em ordem de gravação: as antigas estão no começo
+                while corte < len(registros) and (registros[corte].get("timestamp") or '') < limite:
+                    corte += 1
+            if not corte:
+                return 0
+
+            caminho_arquivado = self.caminho_arquivado(id_usuario)
+            os.makedirs(os.path.dirname(caminho_arquivado), exist_ok=True)
+            # Primeiro o arquivo morto: uma queda entre as duas escritas duplica, mas não perde interações.
+            # Cada arquivamento é um novo membro gzip no fim do arquivo (gzip.open lê todos em sequência).
+            with gzip.open(caminho_arquivado, 'ab') as arquivo:
+                arquivo.write(b''.join(self._codificar(registro) + b'\n' for registro in registros[:corte]))
+            self._reescrever(caminho, registros[corte:])
+        return corte
+
+    def listar_usuarios(self) -> list:
+        """Lista os ids com histórico salvo (ativo, arquivado ou ainda no layout plano)."""
+        if not os.path.isdir(self.diretorio):
+            return []
+        extensoes = (self.EXTENSAO, self.EXTENSAO_LEGADO, self.EXTENSAO_ARQUIVADO)
+        usuarios = set()
+        for raiz, subdiretorios, nomes in os.walk(self.diretorio):
+            if raiz == self.diretorio:
+                # Layout plano: o nome do arquivo é o próprio id; diretórios internos (ex.: _sessoes) são ignorados
+                usuarios.update(self._ids_planos())
+                subdiretorios[:] = [nome for nome in subdiretorios
+                                    if not nome.startswith('_') or nome == self.DIRETORIO_ARQUIVO]
+                continue
+            for nome in nomes:
+                for extensao in extensoes:
+                    if nome.endswith(extensao):
+                        usuarios.add(unquote(nome[:-len(extensao)]))
+        return sorted(usuarios)
+
+    def _ids_planos(self) -> list:
+        ids = []
+        for nome in os.listdir(self.diretorio):
+            for extensao in (self.EXTENSAO, self.EXTENSAO_LEGADO):
+                if nome.endswith(extensao):
+                    ids.append(nome[:-len(extensao)])
+        return ids
+
+    def migrar_todos(self) -> int:
+        """Migra todos os históricos do layout plano para os subdiretórios. Retorna quantos foram movidos."""
+        migrados = 0
+        for id_usuario in set(self._ids_planos()) if os.path.isdir(self.diretorio) else ():
+            try:
+                migrados += self.migrar_legado(id_usuario, nome_plano=id_usuario)
+            except ValueError as erro:
+                print(f"⚠️  Histórico '{id_usuario}' não migrado: {erro}")
+        return migrados
+
+    def compactar_todos(self) -> int:
+        """Manutenção periódica: compacta todos os históricos. Retorna o total de linhas removidas."""
+        return sum(self.compactar(id_usuario) for id_usuario in self.listar_usuarios())
+
+    def arquivar_todos(self, dias_retencao: float = None, turnos_retencao: int = None) -> dict:
+        """Aplica a política de retenção a todos os usuários."""
+        usuarios = arquivadas = 0
+        for id_usuario in self.listar_usuarios():
+            quantidade = self.arquivar(id_usuario, dias_retencao, turnos_retencao)
+            usuarios += quantidade > 0
+            arquivadas += quantidade
+        return {"usuarios": usuarios, "interacoes": arquivadas}
+
+
+# --- Manutenção via linha de comando ---
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manutenção do histórico de conversas.")
+    parser.add_argument('comando', choices=['migrar', 'compactar', 'arquivar', 'caminho'],
+                        help="migrar: layout plano -> subdiretórios; compactar: remove linhas inválidas; "
+                             "arquivar: aplica a política de retenção (gzip em _arquivo/); "
+                             "caminho: mostra o arquivo do histórico de --usuario")
+    parser.add_argument('diretorio', nargs='?', default='historico_usuarios')
+    parser.add_argument('--dias', type=float, default=None, help="arquivar: interações com mais de N dias")
+    parser.add_argument('--turnos', type=int, default=None, help="arquivar: mantém só as N interações mais recentes")
+    parser.add_argument('--usuario', help="caminho: usuario_id do histórico")
+    argumentos = parser.parse_args()
+    armazenamento = ArmazenamentoHistorico(argumentos.diretorio)
+
+    if argumentos.comando == 'caminho':
+        if argumentos.usuario is None:
+            parser.error("caminho precisa de --usuario")
+        # Só o caminho na saída, para uso em outros comandos: $(python historico_armazenamento.py caminho --usuario x)
+        print(armazenamento.caminho_arquivo(argumentos.usuario))
+        sys.exit(0)
+
+    print(f"✅ {armazenamento.migrar_todos()} históricos migrados para o layout em subdiretórios.")
+    if argumentos.comando == 'compactar':
+        print(f"✅ Compactação concluída: {armazenamento.compactar_todos()} linhas inválidas removidas.")
+    elif argumentos.comando == 'arquivar':
+        if argumentos.dias is None and argumentos.turnos is None:
+            parser.error("arquivar precisa de --dias e/ou --turnos")
+        resultado = armazenamento.arquivar_todos(argumentos.dias, argumentos.turnos)
+        print(f"✅ {resultado['interacoes']} interações de {resultado['usuarios']} usuários arquivadas em "
+              f"{os.path.join(argumentos.diretorio, ArmazenamentoHistorico.DIRETORIO_ARQUIVO)}/.")
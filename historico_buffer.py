@@ -0,0 +1,239 @@
+import atexit
+import os
+import threading
+import time
+
+
+class BufferHistorico:
+    """
+    Fila em memória das interações a gravar no histórico, descarregada em grupos
+    (por tamanho ou tempo) por uma thread em segundo plano. Modos:
+    - 'sincrono': grava antes de retornar, sem fila (comportamento original);
+    - 'agrupado': quem grava espera a descarga do seu grupo, que faz uma escrita por usuário.
+      A descarga começa assim que há interações; as que chegam durante ela formam o grupo seguinte;
+    - 'assincrono': retorna logo e junta até 'tamanho_grupo' interações ou 'intervalo_segundos';
+      uma queda pode perder as interações ainda na fila.
+
+    'gravar(id_usuario, registros)' faz a escrita de fato. As interações continuam
+    visíveis em 'pendentes' e 'ultima_categoria' até estarem no disco. Se a escrita
+    de um usuário falha, as interações dele continuam na fila e são tentadas de novo
+    só para ele, com espera crescente; os demais usuários seguem gravando normalmente.
+    Depois de MAXIMO_TENTATIVAS falhas seguidas (ou na descarga final), vão para
+    'guardar_falha(id_usuario, registros, erro)', se informado. No modo 'agrupado',
+    quem esperava por elas recebe o erro.
+    """
+
+    MODOS = ('sincrono', 'agrupado', 'assincrono')
+    # Espera antes de tentar de novo a gravação de um usuário: dobra a cada falha seguida, até o máximo
+    ESPERA_NOVA_TENTATIVA_SEGUNDOS = 1.0
+    ESPERA_MAXIMA_SEGUNDOS = 30.0
+    MAXIMO_TENTATIVAS = 5
+
+    def __init__(self, gravar, modo: str = 'sincrono', tamanho_grupo: int = 256,
+                 intervalo_segundos: float = 0.05, limite_pendentes: int = 100000, guardar_falha=None):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de histórico inválido: {modo} (use {', '.join(self.MODOS)})")
+        self.gravar = gravar
+        self.guardar_falha = guardar_falha
+        self.modo = modo
+        self.tamanho_grupo = tamanho_grupo
+        self.intervalo_segundos = intervalo_segundos
+        self.limite_pendentes = limite_pendentes
+
+        self._pendentes = {}  # id_usuario -> registros ainda não gravados, em ordem
+        self._quantidade = 0
+        self._sequencia = 0
+        self._gravado_ate = 0
+        self._erros = {}  # id_usuario -> (sequência da descarga que falhou, erro)
+        self._tentativas = {}  # id_usuario -> (falhas seguidas, instante da próxima tentativa, último erro)
+        self._condicao = threading.Condition()
+        # Serializa as descargas e as leituras que juntam disco + pendentes
+        self._trava_descarga = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._encerrando = False
+        self._registrado_atexit = False
+        self.descargas = 0
+        self.falhas = 0
+        self.movidas_para_falhas = 0
+
+    # --- Escrita ---
+    def anexar(self, id_usuario: str, registros: list):
+        if self.modo == 'sincrono':
+            self.gravar(id_usuario, registros)
+            return
+
+        self._garantir_thread()
+        with self._condicao:
+            # Contrapressão: com o disco atrasado, a fila não cresce sem limite. As interações de
+            # usuários com falha não contam: não devem travar a gravação de todos os outros
+            self._condicao.wait_for(lambda: self._quantidade - self._quantidade_retida() < self.limite_pendentes)
+            self._pendentes.setdefault(id_usuario, []).extend(registros)
+            self._quantidade += len(registros)
+            self._sequencia += 1
+            sequencia = self._sequencia
+            self._condicao.notify_all()
+            if self.modo == 'agrupado':
+                self._condicao.wait_for(lambda: self._gravado_ate >= sequencia)
+                falha = self._erros.get(id_usuario)
+                if falha is not None and falha[0] >= sequencia:
+                    # As interações não estão no disco (seguem na fila ou foram para as falhas): não confirma
+                    raise falha[1]
+
+    def descarregar(self, forcar: bool = False) -> int:
+        """
+        Grava o que está pendente (uma escrita por usuário). Usuários esperando depois de uma
+        falha só entram quando a espera vence, ou com 'forcar'. Retorna quantos usuários falharam.
+        """
+        with self._trava_descarga:
+            agora = time.monotonic()
+            with self._condicao:
+                if not self._pendentes:
+                    return 0
+                lote = {id_usuario: list(registros) for id_usuario, registros in self._pendentes.items()
+                        if forcar or id_usuario not in self._tentativas or self._tentativas[id_usuario][1] <= agora}
+                sequencia = self._sequencia
+                # Ainda esperando: quem aguarda no modo 'agrupado' recebe o último erro, sem nova tentativa
+                for id_usuario in self._pendentes.keys() - lote.keys():
+                    self._erros[id_usuario] = (sequencia, self._tentativas[id_usuario][2])
+
+            erros = {}
+            falhas_seguidas = {}
+            movidos = set()
+            for id_usuario, registros in lote.items():
+                try:
+                    self.gravar(id_usuario, registros)
+                except Exception as erro:
+                    self.falhas += 1
+                    erros[id_usuario] = erro
+                    falhas_seguidas[id_usuario] = self._tentativas.get(id_usuario, (0,))[0] + 1
+                    if forcar or falhas_seguidas[id_usuario] >= self.MAXIMO_TENTATIVAS:
+                        if self._mover_para_falhas(id_usuario, registros, erro, falhas_seguidas[id_usuario]):
+                            movidos.add(id_usuario)
+                    else:
+                        print(f"❌ Erro ao gravar {len(registros)} interações de '{id_usuario}' "
+                              f"(tentativa {falhas_seguidas[id_usuario]}, mantidas na fila): {erro}")
+
+            # Só sai da fila depois de gravado (e com o estado de sessão já atualizado) ou movido para as falhas
+            with self._condicao:
+                agora = time.monotonic()
+                for id_usuario, registros in lote.items():
+                    if id_usuario in erros:
+                        self._erros[id_usuario] = (sequencia, erros[id_usuario])
+                        if id_usuario not in movidos:
+                            espera = min(self.ESPERA_NOVA_TENTATIVA_SEGUNDOS * 2 ** (falhas_seguidas[id_usuario] - 1),
+                                         self.ESPERA_MAXIMA_SEGUNDOS)
+                            self._tentativas[id_usuario] = (falhas_seguidas[id_usuario], agora + espera,
+                                                            erros[id_usuario])
+                            continue
+                    else:
+                        self._erros.pop(id_usuario, None)
+                    self._tentativas.pop(id_usuario, None)
+                    pendentes = self._pendentes[id_usuario]
+                    del pendentes[:len(registros)]
+                    if not pendentes:
+                        del self._pendentes[id_usuario]
+                    self._quantidade -= len(registros)
+                self._gravado_ate = sequencia
+                self.descargas += 1
+                self._condicao.notify_all()
+            return len(erros)
+
+    def _mover_para_falhas(self, id_usuario: str, registros: list, erro: Exception, tentativas: int) -> bool:
+        if self.guardar_falha is None:
+            return False
+        try:
+            self.guardar_falha(id_usuario, registros, erro)
+        except Exception as erro_falha:
+            print(f"❌ Interações de '{id_usuario}' também não foram para o arquivo de falhas: {erro_falha}")
+            return False
+        self.movidas_para_falhas += len(registros)
+        print(f"🚨 {len(registros)} interações de '{id_usuario}' movidas para o arquivo de falhas "
+              f"após {tentativas} tentativas: {erro}")
+        return True
+
+    def _quantidade_retida(self, agora: float = None) -> int:
+        """Interações de usuários com falha (só as que ainda esperam a próxima tentativa, se 'agora')."""
+        return sum(len(self._pendentes.get(id_usuario, ())) for id_usuario, (_, proxima, _) in self._tentativas.items()
+                   if agora is None or proxima > agora)
+
+    def _quantidade_liberada(self) -> int:
+        return self._quantidade - self._quantidade_retida(time.monotonic())
+
+    def _espera_proxima_tentativa(self):
+        if not self._tentativas:
+            return None
+        return max(0.0, min(proxima for _, proxima, _ in self._tentativas.values()) - time.monotonic())
+
+    # --- Leitura ---
+    def ultima_categoria(self, id_usuario: str):
+        """Categoria da interação mais recente ainda não gravada, ou None."""
+        with self._condicao:
+            pendentes = self._pendentes.get(id_usuario)
+            return pendentes[-1]["categoria"] if pendentes else None
+
+    def descarregar_usuario(self, id_usuario: str):
+        """Garante no disco as interações do usuário que ainda estão na fila."""
+        with self._condicao:
+            pendente = id_usuario in self._pendentes
+        if pendente:
+            self.descarregar()
+
+    def carregar_com_pendentes(self, id_usuario: str, carregar) -> list:
+        """Histórico gravado ('carregar(id_usuario)') seguido das interações ainda na fila."""
+        with self._trava_descarga:
+            historico = carregar(id_usuario)
+            with self._condicao:
+                return historico + list(self._pendentes.get(id_usuario, ()))
+
+    def estatisticas(self) -> dict:
+        return {
+            "modo": self.modo,
+            "pendentes": self._quantidade,
+            "descargas": self.descargas,
+            "falhas": self.falhas,
+            "usuarios_com_falha": len(self._tentativas),
+            "movidas_para_falhas": self.movidas_para_falhas
+        }
+
+    # --- Thread de descarga ---
+    def _garantir_thread(self):
+        # Iniciada no primeiro uso de cada processo: threads não sobrevivem ao fork do servidor de produção
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._condicao:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._encerrando = False
+                self._thread = threading.Thread(target=self._executar, name="descarga-historico", daemon=True)
+                self._thread.start()
+                if not self._registrado_atexit:
+                    atexit.register(self.encerrar)
+                    self._registrado_atexit = True
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                # Com só usuários esperando nova tentativa na fila, dorme até a primeira delas (ou nova interação)
+                while not (self._quantidade_liberada() or self._encerrando):
+                    self._condicao.wait(self._espera_proxima_tentativa())
+                if self._encerrando:
+                    return
+                if self.modo == 'assincrono':
+                    # Ninguém espera: junta mais interações até completar o grupo ou vencer o intervalo
+                    self._condicao.wait_for(
+                        lambda: self._quantidade_liberada() >= self.tamanho_grupo or self._encerrando,
+                        timeout=self.intervalo_segundos
+                    )
+            self.descarregar()
+
+    def encerrar(self):
+        """Descarga final: chamada no encerramento do processo (atexit e servidores)."""
+        with self._condicao:
+            self._encerrando = True
+            self._condicao.notify_all()
+        if self._thread is not None and self._pid == os.getpid() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        # Última chance: o que não gravar agora vai direto para o arquivo de falhas
+        self.descarregar(forcar=True)
@@ -0,0 +1,148 @@
+import heapq
+import json
+import math
+import os
+import sys
+from difflib import SequenceMatcher as ComparadorSequencia
+
+from normalizacao import normalizar_texto
+
+
+def buscar_linear(frases: list, categorias: list, mensagem: str) -> tuple:
+    """
+    Varredura original: compara a mensagem com todas as frases. Retorna (similaridade, categoria).
+    Frases e mensagem já devem estar normalizadas (normalizar_texto).
+    """
+    maior_similaridade = 0
+    categoria_mais_similar = None
+    for frase_base, categoria_base in zip(frases, categorias):
+        similaridade = ComparadorSequencia(None, mensagem, frase_base).ratio()
+        if similaridade > maior_similaridade:
+            maior_similaridade = similaridade
+            categoria_mais_similar = categoria_base
+    return maior_similaridade, categoria_mais_similar
+
+
+class IndiceSimilaridade:
+    """
+    Índice invertido de n-gramas de caracteres sobre as frases da base de conhecimento.
+    Em vez de comparar a mensagem com todas as frases, seleciona apenas as que
+    compartilham mais n-gramas com ela e calcula a similaridade exata
+    (SequenceMatcher) somente nessas candidatas, mantendo o mesmo significado
+    de 'limiar_similaridade'.
+
+    O trabalho por mensagem é limitado: no máximo 'max_avaliadas' frases têm os
+    n-gramas contados e 'max_candidatos' passam pelo SequenceMatcher, qualquer que
+    seja o tamanho da base (ver candidatas).
+    """
+
+    def __init__(self, frases: list, categorias: list, tamanho_ngrama: int = 3, max_candidatos: int = 50,
+                 sobreposicao_minima: float = 0.1, max_avaliadas: int = 1000):
+        self.tamanho_ngrama = tamanho_ngrama
+        self.max_candidatos = max_candidatos
+        self.sobreposicao_minima = sobreposicao_minima
+        self.max_avaliadas = max_avaliadas
+        self.frases = [normalizar_texto(frase) for frase in frases]
+        self.categorias = list(categorias)
+        self.ngramas_frases = [self._ngramas(frase) for frase in self.frases]
+        self.tamanhos = [len(ngramas) for ngramas in self.ngramas_frases]
+        self.postagens = {}  # n-grama -> lista de índices de frases
+
+        for indice, ngramas in enumerate(self.ngramas_frases):
+            for ngrama in ngramas:
+                self.postagens.setdefault(ngrama, []).append(indice)
+
+    def _ngramas(self, texto: str) -> set:
+        texto = f" {texto} "
+        return {texto[i:i + self.tamanho_ngrama] for i in range(len(texto) - self.tamanho_ngrama + 1)}
+
+    def candidatas(self, mensagem: str) -> list:
+        """
+        Índices das frases com maior coeficiente de Dice de n-gramas em relação à mensagem.
+
+        Só concorrem frases que compartilham ao menos 'sobreposicao_minima' dos n-gramas
+        da mensagem. Toda frase assim aparece em uma das listas de postagem mais curtas
+        (filtro de prefixo: basta olhar as len(listas) - mínimo + 1 mais raras), então
+        n-gramas comuns como " de" não trazem candidatas. Essas listas são percorridas da
+        mais rara para a mais comum até juntar 'max_avaliadas' frases; em uma mensagem só
+        de n-gramas comuns o custo fica em O(max_avaliadas x n-gramas da mensagem), em vez
+        de percorrer a base inteira.
+        """
+        ngramas = self._ngramas(mensagem)
+        postagens = sorted((self.postagens[ngrama] for ngrama in ngramas if ngrama in self.postagens), key=len)
+        minimo = max(1, math.ceil(self.sobreposicao_minima * len(ngramas)))
+        if len(postagens) < minimo:
+            return []
+
+        avaliadas = set()
+        for lista in postagens[:len(postagens) - minimo + 1]:
+            for indice in lista:
+                avaliadas.add(indice)
+                if len(avaliadas) >= self.max_avaliadas:
+                    break
+            else:
+                continue
+            break
+
+        pontuadas = []
+        for indice in avaliadas:
+            compartilhados = len(ngramas & self.ngramas_frases[indice])
+            if compartilhados >= minimo:
+                pontuadas.append((-2 * compartilhados / (len(ngramas) + self.tamanhos[indice]), indice))
+        return sorted(indice for _, indice in heapq.nsmallest(self.max_candidatos, pontuadas))
+
+    def buscar(self, mensagem: str) -> tuple:
+        """Retorna (similaridade, categoria) da frase mais parecida, como a varredura linear."""
+        maior_similaridade = 0
+        categoria_mais_similar = None
+        for indice in self.candidatas(mensagem):
+            similaridade = ComparadorSequencia(None, mensagem, self.frases[indice]).ratio()
+            if similaridade > maior_similaridade:
+                maior_similaridade = similaridade
+                categoria_mais_similar = self.categorias[indice]
+        return maior_similaridade, categoria_mais_similar
+
+
+def comparar_com_busca_linear(frases: list, categorias: list, mensagens: list,
+                              limiar_similaridade: float = 0.5) -> dict:
+    """Mede quantas decisões de fallback do índice coincidem com as da varredura linear."""
+    indice = IndiceSimilaridade(frases, categorias)
+    divergencias = []
+    for mensagem in mensagens:
+        similaridade_linear, categoria_linear = buscar_linear(frases, categorias, mensagem)
+        similaridade_indice, categoria_indice = indice.buscar(mensagem)
+        decisao_linear = categoria_linear if similaridade_linear >= limiar_similaridade else None
+        decisao_indice = categoria_indice if similaridade_indice >= limiar_similaridade else None
+        if decisao_linear != decisao_indice:
+            divergencias.append({"mensagem": mensagem, "linear": decisao_linear, "indice": decisao_indice})
+    return {
+        "total": len(mensagens),
+        "concordancia": 1 - len(divergencias) / len(mensagens) if mensagens else 1.0,
+        "divergencias": divergencias
+    }
+
+
+# --- Avaliação via linha de comando ---
+if __name__ == "__main__":
+    arquivo_base = sys.argv[1] if len(sys.argv) > 1 else 'base_conhecimento.json'
+    if not os.path.exists(arquivo_base):
+        print(f"❌ Base de conhecimento '{arquivo_base}' não encontrada.")
+        sys.exit(1)
+
+    with open(arquivo_base, 'r', encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+    frases_base, categorias_base = [normalizar_texto(frase) for frase in dados['frases']], dados['categorias']
+
+    # Frases da base com um caractere removido simulam erros de digitação
+    mensagens_teste = []
+    for frase in frases_base:
+        mensagens_teste.append(frase)
+        if len(frase) > 3:
+            meio = len(frase) // 2
+            mensagens_teste.append(frase[:meio] + frase[meio + 1:])
+
+    resultado = comparar_com_busca_linear(frases_base, categorias_base, mensagens_teste)
+    print(f"📊 Concordância índice x varredura linear: {resultado['concordancia']:.2%} "
+          f"({resultado['total']} mensagens, {len(resultado['divergencias'])} divergências)")
+    for divergencia in resultado['divergencias'][:20]:
+        print(f"  • '{divergencia['mensagem']}': linear={divergencia['linear']} índice={divergencia['indice']}")
@@ -7,11 +7,17 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 from difflib import SequenceMatcher as ComparadorSequencia
+from base_compilada import hash_conteudo
+from chatbot_core import PARAMETROS_MODELO_PADRAO
+from historico_armazenamento import ArmazenamentoHistorico
+from normalizacao import normalizar_texto
+from palavras_chave import CorrespondentePalavrasChave
 
 # --- Configurações Principais do Chatbot ---
 ARQUIVO_BASE_CONHECIMENTO = 'base_conhecimento.json'
 ARQUIVO_MODELO_ML = 'modelo_chatbot.joblib'
 DIRETORIO_HISTORICO_USUARIOS = 'historico_usuarios'
+ARMAZENAMENTO_HISTORICO = ArmazenamentoHistorico(DIRETORIO_HISTORICO_USUARIOS)
 
 # --- Funções para Gerenciar a Base de Conhecimento ---
 def carregar_base_conhecimento():
@@ -119,6 +125,9 @@ FRASES_CONHECIDAS, CATEGORIAS_CONHECIDAS = carregar_base_conhecimento()
 # Verifica consistência imediatamente após carregar
 FRASES_CONHECIDAS, CATEGORIAS_CONHECIDAS = verificar_consistencia_dados(FRASES_CONHECIDAS, CATEGORIAS_CONHECIDAS)
 
+# Frases normalizadas uma vez só, para a similaridade do fallback (a mensagem é normalizada a cada pedido)
+FRASES_CONHECIDAS_NORMALIZADAS = [normalizar_texto(frase) for frase in FRASES_CONHECIDAS]
+
 # Respostas pré-definidas para cada categoria identificada pelo chatbot
 RESPOSTAS_PRE_DEFINIDAS = {
     "SAUDAÇÃO": {
@@ -177,10 +186,15 @@ def criar_e_treinar_pipeline_ml(frases: list, categorias: list) -> Pipeline:
     print(f"🔧 Treinando modelo com {len(frases)} exemplos...")
     
     pipeline_ml = Pipeline([
-        ('vetorizacao', TfidfVectorizer(lowercase=True)),
+        # Mesmo texto do chatbot_core: normalizado (normalizar_texto), sem maiúsculas nem acentos
+        ('vetorizacao', TfidfVectorizer(lowercase=False)),
         ('classificador', MultinomialNB())
     ])
-    pipeline_ml.fit(frases, categorias)
+    frases_normalizadas = [normalizar_texto(frase) for frase in frases]
+    pipeline_ml.fit(frases_normalizadas, categorias)
+    # Carimbos do texto normalizado e dos parâmetros usados no treino (os mesmos do chatbot_core)
+    pipeline_ml.hash_base_conhecimento = hash_conteudo(frases_normalizadas, categorias)
+    pipeline_ml.parametros_modelo = dict(PARAMETROS_MODELO_PADRAO)
     print("✅ Modelo treinado com sucesso!")
     return pipeline_ml
 
@@ -195,6 +209,9 @@ def carregar_ou_treinar_modelo_ml(frases: list, categorias: list) -> Pipeline:
     if os.path.exists(ARQUIVO_MODELO_ML):
         try:
             modelo = joblib.load(ARQUIVO_MODELO_ML)
+            # Modelos sem carimbo foram treinados antes da normalização com remoção de acentos
+            if getattr(modelo, 'hash_base_conhecimento', None) is None:
+                raise ValueError("modelo treinado sem a normalização do texto")
             print("✅ Modelo de chatbot de ML carregado com sucesso do arquivo.")
             return modelo
         except Exception as erro:
@@ -221,51 +238,65 @@ except Exception as e:
 
 
 
-def obter_texto_resposta(categoria: str, historico_usuario: list) -> str:
-    """Define qual versão da resposta deve ser usada para uma dada categoria."""
-    if categoria not in RESPOSTAS_PRE_DEFINIDAS:
-        return RESPOSTAS_PRE_DEFINIDAS["DESCONHECIDO"]["initial"]
+# Palavras-chave prioritárias do fallback, em ordem de prioridade
+PALAVRAS_CHAVE_PRIORITARIAS = {
+    "cancelar": "CANCELAMENTO", "cancelamento": "CANCELAMENTO", "plano": "CANCELAMENTO",
+    "exame": "EXAMES", "resultado": "EXAMES", "agendar": "EXAMES", "laboratório": "EXAMES",
+    "horário": "INFORMAÇÃO", "telefone": "INFORMAÇÃO", "endereço": "INFORMAÇÃO", "contato": "INFORMAÇÃO",
+    "ajuda": "AJUDA", "auxílio": "AJUDA", "socorro": "AJUDA", "dúvida": "AJUDA",
+    "oi": "SAUDAÇÃO", "olá": "SAUDAÇÃO", "bom dia": "SAUDAÇÃO", "boa tarde": "SAUDAÇÃO", "boa noite": "SAUDAÇÃO",
+    "orçamento": "VALORES", "preço": "VALORES", "valor": "VALORES", "quanto custa": "VALORES", "custa": "VALORES"
+}
 
-    if not historico_usuario:
-        return RESPOSTAS_PRE_DEFINIDAS[categoria]["initial"]
+def carregar_palavras_chave() -> CorrespondentePalavrasChave:
+    """
+    Compila as palavras-chave uma única vez. Usa a chave "palavras_chave" da base de
+    conhecimento quando existir ({palavra: categoria} ou lista com "prioridade").
+    """
+    tabela = PALAVRAS_CHAVE_PRIORITARIAS
+    if os.path.exists(ARQUIVO_BASE_CONHECIMENTO):
+        with open(ARQUIVO_BASE_CONHECIMENTO, 'r', encoding='utf-8') as arquivo:
+            tabela = json.load(arquivo).get('palavras_chave') or tabela
+    return CorrespondentePalavrasChave(tabela)
+
+CORRESPONDENTE_PALAVRAS_CHAVE = carregar_palavras_chave()
 
-    ultima_categoria_interacao = None
-    if historico_usuario and 'categoria' in historico_usuario[-1]:
-        ultima_categoria_interacao = historico_usuario[-1]['categoria']
+def obter_tipo_resposta(categoria: str, historico_usuario: list) -> str:
+    """Define qual versão da resposta ('initial' ou 'continuation') deve ser usada para uma dada categoria."""
+    if categoria not in RESPOSTAS_PRE_DEFINIDAS or not historico_usuario:
+        return "initial"
 
+    ultima_categoria_interacao = historico_usuario[-1].get('categoria')
     if "continuation" in RESPOSTAS_PRE_DEFINIDAS[categoria] and \
        ultima_categoria_interacao in ["SAUDAÇÃO", "AJUDA"]:
-        return RESPOSTAS_PRE_DEFINIDAS[categoria]["continuation"]
-    
-    return RESPOSTAS_PRE_DEFINIDAS[categoria]["initial"]
+        return "continuation"
+
+    return "initial"
+
+def obter_texto_resposta(categoria: str, historico_usuario: list) -> str:
+    """Texto da versão da resposta escolhida por obter_tipo_resposta."""
+    if categoria not in RESPOSTAS_PRE_DEFINIDAS:
+        return RESPOSTAS_PRE_DEFINIDAS["DESCONHECIDO"]["initial"]
+    return RESPOSTAS_PRE_DEFINIDAS[categoria][obter_tipo_resposta(categoria, historico_usuario)]
 
 def obter_resposta_fallback(
     mensagem: str, frases_conhecidas: list, categorias_conhecidas: list,
     historico_usuario: list, limiar_similaridade: float = 0.5
 ) -> tuple:
-    """Mecanismo de fallback para quando o modelo de ML não está confiante."""
-    mensagem_lower = mensagem.lower()
-    
-    palavras_chave_prioritarias = {
-        "cancelar": "CANCELAMENTO", "cancelamento": "CANCELAMENTO", "plano": "CANCELAMENTO",
-        "exame": "EXAMES", "resultado": "EXAMES", "agendar": "EXAMES", "laboratório": "EXAMES",
-        "horário": "INFORMAÇÃO", "telefone": "INFORMAÇÃO", "endereço": "INFORMAÇÃO", "contato": "INFORMAÇÃO",
-        "ajuda": "AJUDA", "auxílio": "AJUDA", "socorro": "AJUDA", "dúvida": "AJUDA",
-        "oi": "SAUDAÇÃO", "olá": "SAUDAÇÃO", "bom dia": "SAUDAÇÃO", "boa tarde": "SAUDAÇÃO", "boa noite": "SAUDAÇÃO",
-        "orçamento": "VALORES", "preço": "VALORES", "valor": "VALORES", "quanto custa": "VALORES", "custa": "VALORES"
-    
-    }
-    
-    for palavra, categoria_prioritaria in palavras_chave_prioritarias.items():
-        if palavra in mensagem_lower:
-            texto_resposta = obter_texto_resposta(categoria_prioritaria, historico_usuario)
-            return texto_resposta, categoria_prioritaria, True
+    """
+    Mecanismo de fallback para quando o modelo de ML não está confiante.
+    Espera a mensagem e as frases já normalizadas (normalizar_texto), como em classificar_e_responder.
+    """
+    categoria_prioritaria = CORRESPONDENTE_PALAVRAS_CHAVE.buscar(mensagem)
+    if categoria_prioritaria is not None:
+        texto_resposta = obter_texto_resposta(categoria_prioritaria, historico_usuario)
+        return texto_resposta, categoria_prioritaria, True
 
     maior_similaridade = 0
     categoria_mais_similar = None
 
     for frase_base, categoria_base in zip(frases_conhecidas, categorias_conhecidas):
-        similaridade = ComparadorSequencia(None, mensagem_lower, frase_base.lower()).ratio()
+        similaridade = ComparadorSequencia(None, mensagem, frase_base).ratio()
         if similaridade > maior_similaridade:
             maior_similaridade = similaridade
             categoria_mais_similar = categoria_base
@@ -284,8 +315,9 @@ def classificar_e_responder(
     categorias_conhecidas: list,
     limiar_confianca_ml: float = 0.4
 ) -> tuple:
-    """Processa a mensagem do usuário e gera a resposta adequada."""
-    mensagem_limpa = mensagem.strip().lower()
+    """Processa a mensagem do usuário e gera a resposta adequada ('frases_conhecidas' já normalizadas)."""
+    # Normalização única, reaproveitada pelo modelo, pelas palavras-chave e pela similaridade
+    mensagem_limpa = normalizar_texto(mensagem)
 
     probabilidades = modelo_ml.predict_proba([mensagem_limpa])[0]
     indice_maior_prob = probabilidades.argmax()
@@ -306,38 +338,32 @@ def classificar_e_responder(
 
 def carregar_historico_usuario(id_usuario: str) -> list:
     """Carrega o histórico de conversas de um usuário específico."""
-    caminho_arquivo_usuario = os.path.join(DIRETORIO_HISTORICO_USUARIOS, f"{id_usuario}_historico.json")
-    if os.path.exists(caminho_arquivo_usuario):
-        with open(caminho_arquivo_usuario, 'r', encoding='utf-8') as arquivo:
-            return json.load(arquivo)
-    return []
-
-def salvar_historico_usuario(id_usuario: str, mensagem: str, resposta_bot: str, categoria: str):
-    """Salva a interação no histórico do usuário."""
-    if not os.path.exists(DIRETORIO_HISTORICO_USUARIOS):
-        os.makedirs(DIRETORIO_HISTORICO_USUARIOS)
-
-    historico = carregar_historico_usuario(id_usuario)
-    historico.append({
+    return ARMAZENAMENTO_HISTORICO.carregar(id_usuario)
+
+def salvar_historico_usuario(id_usuario: str, mensagem: str, resposta_bot: str, categoria: str,
+                             tipo_resposta: str = None):
+    """Anexa a interação ao final do histórico do usuário (sem reescrever o arquivo)."""
+    registro = {
         "mensagem_usuario": mensagem,
         "resposta_chatbot": resposta_bot,
         "categoria": categoria,
         "timestamp": datetime.datetime.now().isoformat()
-    })
-    
-    caminho_arquivo_usuario = os.path.join(DIRETORIO_HISTORICO_USUARIOS, f"{id_usuario}_historico.json")
-    with open(caminho_arquivo_usuario, 'w', encoding='utf-8') as arquivo:
-        json.dump(historico, arquivo, indent=4, ensure_ascii=False)
+    }
+    # Versão da resposta, para a analise_historico.py (os textos daqui diferem dos do chatbot_core)
+    if tipo_resposta is not None:
+        registro["tipo_resposta"] = tipo_resposta
+    ARMAZENAMENTO_HISTORICO.anexar(id_usuario, registro)
 
 def servico_chatbot_entrada(id_usuario: str, mensagem_usuario: str) -> dict:
     """Função principal para integração com backend."""
     historico_atual_usuario = carregar_historico_usuario(id_usuario)
 
     texto_resposta, categoria_detectada, usou_base_conhecimento = classificar_e_responder(
-        mensagem_usuario, historico_atual_usuario, MODELO_CHATBOT_ML, FRASES_CONHECIDAS, CATEGORIAS_CONHECIDAS
+        mensagem_usuario, historico_atual_usuario, MODELO_CHATBOT_ML, FRASES_CONHECIDAS_NORMALIZADAS, CATEGORIAS_CONHECIDAS
     )
 
-    salvar_historico_usuario(id_usuario, mensagem_usuario, texto_resposta, categoria_detectada)
+    salvar_historico_usuario(id_usuario, mensagem_usuario, texto_resposta, categoria_detectada,
+                             obter_tipo_resposta(categoria_detectada, historico_atual_usuario))
 
     return {
         "resposta_chatbot": texto_resposta,
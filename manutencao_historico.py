@@ -0,0 +1,91 @@
+import datetime
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+
+class ManutencaoHistorico:
+    """
+    Aplica a política de retenção do histórico em segundo plano: a cada
+    'intervalo_segundos', arquiva (gzip em _arquivo/) as interações com mais de
+    'dias_retencao' dias ou além das 'turnos_retencao' mais recentes de cada usuário.
+
+    Com vários processos servindo (servidor_producao.py), só um deles executa cada
+    rodada: quem conseguir a trava <diretorio>/_manutencao.lock sem esperar.
+    """
+
+    ARQUIVO_TRAVA = '_manutencao.lock'
+
+    def __init__(self, armazenamento, dias_retencao: float = None, turnos_retencao: int = None,
+                 intervalo_segundos: float = 3600):
+        self.armazenamento = armazenamento
+        self.dias_retencao = dias_retencao
+        self.turnos_retencao = turnos_retencao
+        self.intervalo_segundos = intervalo_segundos
+        self._parar = threading.Event()
+        self._thread = None
+        self.estado = {
+            "rodadas": 0,
+            "ultima_rodada": None,
+            "duracao_segundos": None,
+            "usuarios_arquivados": 0,
+            "interacoes_arquivadas": 0,
+            "ultimo_erro": None
+        }
+
+    @property
+    def ativa(self) -> bool:
+        return bool(self.dias_retencao or self.turnos_retencao)
+
+    def iniciar(self):
+        if self.ativa and self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="manutencao-historico", daemon=True)
+            self._thread.start()
+
+    def encerrar(self):
+        self._parar.set()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo_segundos):
+            self.executar_rodada()
+
+    def executar_rodada(self) -> bool:
+        """Arquiva o que saiu da retenção. Retorna False se outro processo já está executando."""
+        os.makedirs(self.armazenamento.diretorio, exist_ok=True)
+        with open(os.path.join(self.armazenamento.diretorio, self.ARQUIVO_TRAVA), 'a') as trava:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+
+            inicio = time.perf_counter()
+            try:
+                resultado = self.armazenamento.arquivar_todos(self.dias_retencao or None, self.turnos_retencao or None)
+                self.estado["usuarios_arquivados"] += resultado["usuarios"]
+                self.estado["interacoes_arquivadas"] += resultado["interacoes"]
+                self.estado["ultimo_erro"] = None
+                if resultado["interacoes"]:
+                    print(f"📦 {resultado['interacoes']} interações de {resultado['usuarios']} usuários arquivadas.")
+            except Exception as erro:
+                self.estado["ultimo_erro"] = str(erro)
+                print(f"❌ Erro no arquivamento do histórico: {erro}")
+            finally:
+                self.estado["rodadas"] += 1
+                self.estado["duracao_segundos"] = round(time.perf_counter() - inicio, 3)
+                self.estado["ultima_rodada"] = datetime.datetime.now().isoformat()
+        return True
+
+    def estatisticas(self) -> dict:
+        return {
+            "ativa": self.ativa,
+            "dias_retencao": self.dias_retencao,
+            "turnos_retencao": self.turnos_retencao,
+            "intervalo_segundos": self.intervalo_segundos,
+            **self.estado
+        }
@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+LIMITES_PADRAO = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histograma:
+    """Histograma cumulativo no formato do Prometheus (buckets fixos, soma e contagem)."""
+
+    def __init__(self, limites: tuple = LIMITES_PADRAO):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # último bucket: +Inf
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def _escapar_rotulo(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricasChatbot:
+    """
+    Tempo de cada etapa de processar_mensagem e contadores de decisões, exportados
+    em formato texto do Prometheus. Cada medição de etapa é amostrada com
+    probabilidade 'taxa_amostragem': fora da amostra, o custo é um random().
+    Os contadores de categoria e caminho são sempre atualizados.
+
+    'observadores' recebe funções (etapa, segundos) chamadas a cada medição, para
+    quem precisa das durações individuais (ex.: benchmark_replay.py).
+    """
+
+    def __init__(self, taxa_amostragem: float = 1.0):
+        self.taxa_amostragem = taxa_amostragem
+        self.etapas = {}
+        self.mensagens = {}  # (categoria, caminho) -> quantidade
+        self.observadores = []
+        self._trava = threading.Lock()
+
+    # --- Medição das etapas ---
+    def iniciar(self):
+        """Início da medição de uma etapa, ou None quando esta medição não foi amostrada."""
+        if self.taxa_amostragem >= 1.0 or random.random() < self.taxa_amostragem:
+            return time.perf_counter()
+        return None
+
+    def registrar_etapa(self, etapa: str, inicio):
+        if inicio is None:
+            return
+        duracao = time.perf_counter() - inicio
+        with self._trava:
+            histograma = self.etapas.get(etapa)
+            if histograma is None:
+                histograma = self.etapas[etapa] = Histograma()
+            histograma.observar(duracao)
+        for observador in self.observadores:
+            observador(etapa, duracao)
+
+    # --- Contadores ---
+    def contar_decisao(self, categoria: str, caminho: str):
+        chave = (categoria, caminho)
+        with self._trava:
+            self.mensagens[chave] = self.mensagens.get(chave, 0) + 1
+
+    def resumo(self) -> dict:
+        with self._trava:
+            total = sum(self.mensagens.values())
+            desconhecidas = sum(q for (categoria, _), q in self.mensagens.items() if categoria == "DESCONHECIDO")
+            fallback = sum(q for (_, caminho), q in self.mensagens.items() if caminho in ("palavra_chave", "similaridade"))
+        return {
+            "mensagens": total,
+            "taxa_desconhecido": round(desconhecidas / total, 4) if total else 0.0,
+            "taxa_fallback": round(fallback / total, 4) if total else 0.0
+        }
+
+    # --- Exportação ---
+    def exportar_prometheus(self, extras: dict = None) -> str:
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        linhas = [
+            "# HELP chatbot_etapa_duracao_segundos Duração de cada etapa do processamento de mensagens.",
+            "# TYPE chatbot_etapa_duracao_segundos histogram"
+        ]
+        with self._trava:
+            etapas = {etapa: (list(h.contagens), h.soma, h.total, h.limites) for etapa, h in self.etapas.items()}
+            mensagens = dict(self.mensagens)
+
+        for etapa, (contagens, soma, total, limites) in sorted(etapas.items()):
+            rotulo = _escapar_rotulo(etapa)
+            acumulado = 0
+            for limite, contagem in zip(limites + (float('inf'),), contagens):
+                acumulado += contagem
+                le = '+Inf' if limite == float('inf') else repr(limite)
+                linhas.append(f'chatbot_etapa_duracao_segundos_bucket{{etapa="{rotulo}",le="{le}"}} {acumulado}')
+            linhas.append(f'chatbot_etapa_duracao_segundos_sum{{etapa="{rotulo}"}} {soma}')
+            linhas.append(f'chatbot_etapa_duracao_segundos_count{{etapa="{rotulo}"}} {total}')
+
+        linhas += [
+            "# HELP chatbot_mensagens_total Mensagens classificadas, por categoria e caminho de decisão.",
+            "# TYPE chatbot_mensagens_total counter"
+        ]
+        for (categoria, caminho), quantidade in sorted(mensagens.items()):
+            linhas.append(f'chatbot_mensagens_total{{categoria="{_escapar_rotulo(categoria)}",'
+                          f'caminho="{_escapar_rotulo(caminho)}"}} {quantidade}')
+
+        linhas += [
+            "# HELP chatbot_mensagens_desconhecidas_total Mensagens respondidas como DESCONHECIDO.",
+            "# TYPE chatbot_mensagens_desconhecidas_total counter",
+            f"chatbot_mensagens_desconhecidas_total "
+            f"{sum(q for (categoria, _), q in mensagens.items() if categoria == 'DESCONHECIDO')}"
+        ]
+
+        for nome, (tipo, ajuda, valor) in (extras or {}).items():
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}", f"{nome} {valor}"]
+
+        return "\n".join(linhas) + "\n"
@@ -0,0 +1,89 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class DespachanteMicroLote:
+    """
+    Junta as mensagens de requisições simultâneas em uma única chamada vetorizada.
+    A primeira mensagem abre uma janela de 'janela_ms'; o que chegar até o fim da
+    janela (ou até 'tamanho_maximo' mensagens) é classificado de uma vez por
+    'classificar' (lista de textos -> lista de resultados, na mesma ordem) e cada
+    chamador recebe a sua parte. A espera extra de cada mensagem é, no máximo, a janela.
+    """
+
+    def __init__(self, classificar, janela_ms: float = 2.0, tamanho_maximo: int = 64):
+        self.classificar_lote = classificar
+        self.janela_segundos = janela_ms / 1000.0
+        self.tamanho_maximo = tamanho_maximo
+        self._fila = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._trava = threading.Lock()
+        self.lotes = 0
+        self.mensagens = 0
+
+    def classificar(self, mensagens: list) -> list:
+        """Entrega as mensagens ao próximo lote e espera o resultado."""
+        self._garantir_thread()
+        futuro = Future()
+        self._fila.put((mensagens, futuro))
+        return futuro.result()
+
+    def estatisticas(self) -> dict:
+        return {
+            "lotes": self.lotes,
+            "mensagens": self.mensagens,
+            "media_por_lote": round(self.mensagens / self.lotes, 2) if self.lotes else 0.0,
+            "janela_ms": self.janela_segundos * 1000,
+            "tamanho_maximo": self.tamanho_maximo
+        }
+
+    def _garantir_thread(self):
+        # Iniciada no primeiro uso de cada processo: threads não sobrevivem ao fork do servidor de produção
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._trava:
+            if self._thread is None or self._pid != os.getpid():
+                self._fila = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._executar, name="micro-lote", daemon=True)
+                self._thread.start()
+
+    def _executar(self):
+        fila = self._fila
+        while True:
+            lote = [fila.get()]
+            total = len(lote[0][0])
+            prazo = time.monotonic() + self.janela_segundos
+            while total < self.tamanho_maximo:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+                lote.append(item)
+                total += len(item[0])
+            self._processar(lote)
+
+    def _processar(self, lote: list):
+        # Mensagens repetidas entre chamadores são classificadas uma única vez
+        posicoes = {}
+        for mensagens, _ in lote:
+            for mensagem in mensagens:
+                posicoes.setdefault(mensagem, len(posicoes))
+        try:
+            resultados = self.classificar_lote(list(posicoes))
+        except Exception as erro:
+            for _, futuro in lote:
+                futuro.set_exception(erro)
+            return
+
+        self.lotes += 1
+        self.mensagens += sum(len(mensagens) for mensagens, _ in lote)
+        for mensagens, futuro in lote:
+            futuro.set_result([resultados[posicoes[mensagem]] for mensagem in mensagens])
@@ -0,0 +1,18 @@
+import re
+import unicodedata
+
+# Tudo o que não é letra ou dígito (pontuação, emojis, espaços repetidos) vira um espaço
+_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Forma canônica usada em toda a classificação (modelo, palavras-chave, similaridade
+    e cache): minúsculas, sem acentos ("Horário" -> "horario", "orçamento" ->
+    "orcamento"), com pontuação trocada por espaço e espaços simples.
+    """
+    texto = texto.lower()
+    if not texto.isascii():
+        texto = ''.join(caractere for caractere in unicodedata.normalize('NFKD', texto)
+                        if not unicodedata.combining(caractere))
+    return _SEPARADORES.sub(' ', texto).strip()
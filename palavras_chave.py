@@ -0,0 +1,103 @@
+from collections import deque
+
+from normalizacao import normalizar_texto
+
+
+def _e_caractere_de_palavra(caractere: str) -> bool:
+    return caractere.isalnum() or caractere == '_'
+
+
+def _termina_palavra(mensagem: str, posicao: int) -> bool:
+    """Verifica se a palavra termina em 'posicao', aceitando plural em -s/-es ("exame" -> "exames")."""
+    for sufixo in ('', 's', 'es'):
+        fim = posicao + len(sufixo)
+        if mensagem.startswith(sufixo, posicao) and (fim == len(mensagem) or not _e_caractere_de_palavra(mensagem[fim])):
+            return True
+    return False
+
+
+class CorrespondentePalavrasChave:
+    """
+    Tabela de palavras-chave prioritárias compilada uma única vez em um autômato
+    Aho-Corasick. A mensagem é percorrida em uma só passada, com custo que não
+    cresce com o número de palavras-chave, e só valem ocorrências de palavras
+    inteiras ("oi" não casa dentro de "noite" ou "dois"), admitindo apenas o plural.
+
+    Quando mais de uma palavra-chave aparece na mensagem vence a de maior
+    'prioridade'; em caso de empate, a que aparece primeiro na tabela.
+    """
+
+    def __init__(self, palavras_chave):
+        self.entradas = self._normalizar_tabela(palavras_chave)
+        self._transicoes = [{}]
+        self._falhas = [0]
+        self._saidas = [[]]
+        self._compilar()
+
+    @staticmethod
+    def _normalizar_tabela(palavras_chave) -> list:
+        """Aceita {palavra: categoria} ou [{"palavra", "categoria", "prioridade"?}, ...]."""
+        if isinstance(palavras_chave, dict):
+            palavras_chave = [{"palavra": palavra, "categoria": categoria}
+                              for palavra, categoria in palavras_chave.items()]
+
+        entradas = []
+        for ordem, entrada in enumerate(palavras_chave):
+            palavra = normalizar_texto(entrada["palavra"])
+            if palavra:
+                entradas.append((palavra, entrada["categoria"], (-entrada.get("prioridade", 0), ordem)))
+        return entradas
+
+    def _compilar(self):
+        # Trie com as palavras-chave
+        for indice, (palavra, _, _) in enumerate(self.entradas):
+            estado = 0
+            for caractere in palavra:
+                if caractere not in self._transicoes[estado]:
+                    self._transicoes.append({})
+                    self._falhas.append(0)
+                    self._saidas.append([])
+                    self._transicoes[estado][caractere] = len(self._transicoes) - 1
+                estado = self._transicoes[estado][caractere]
+            self._saidas[estado].append(indice)
+
+        # Ligações de falha em largura
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falhas[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falhas[falha]
+                self._falhas[proximo] = self._transicoes[falha].get(caractere, 0)
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falhas[proximo]]
+
+    def buscar(self, mensagem: str):
+        """Retorna a categoria da palavra-chave de maior prioridade presente na mensagem, ou None."""
+        transicoes, falhas, saidas = self._transicoes, self._falhas, self._saidas
+        melhor = None
+        estado = 0
+
+        for posicao, caractere in enumerate(mensagem):
+            while estado and caractere not in transicoes[estado]:
+                estado = falhas[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            if not saidas[estado]:
+                continue
+
+            if not _termina_palavra(mensagem, posicao + 1):
+                continue
+
+            for indice in saidas[estado]:
+                palavra, _, prioridade = self.entradas[indice]
+                inicio = posicao - len(palavra) + 1
+                if inicio > 0 and _e_caractere_de_palavra(mensagem[inicio - 1]):
+                    continue
+                if melhor is None or prioridade < self.entradas[melhor][2]:
+                    melhor = indice
+
+        return self.entradas[melhor][1] if melhor is not None else None
+
+    def __len__(self):
+        return len(self.entradas)
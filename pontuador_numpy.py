@@ -0,0 +1,231 @@
+import json
+import os
+import re
+import sys
+import unicodedata
+
+import numpy as np
+
+
+ARQUIVO_CONFIGURACAO = 'configuracao.json'
+ARQUIVO_VOCABULARIO = 'vocabulario.json'
+ARQUIVO_IDF = 'idf.npy'
+ARQUIVO_LOG_PROB_ATRIBUTOS = 'log_prob_atributos.npy'
+ARQUIVO_LOG_PROB_CLASSES = 'log_prob_classes.npy'
+
+
+def _remover_acentos_unicode(texto: str) -> str:
+    if texto.isascii():
+        return texto
+    normalizado = unicodedata.normalize('NFKD', texto)
+    return ''.join(caractere for caractere in normalizado if not unicodedata.combining(caractere))
+
+
+def _remover_acentos_ascii(texto: str) -> str:
+    return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
+
+
+def _salvar_atomico(caminho: str, gravar):
+    """
+    Grava em um arquivo temporário e troca com os.replace: processos que já mapearam
+    (mmap) a versão anterior continuam lendo o arquivo antigo sem serem truncados.
+    """
+    caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(caminho_temporario, 'wb') as arquivo:
+        gravar(arquivo)
+    os.replace(caminho_temporario, caminho)
+
+
+def exportar_modelo_compilado(pipeline_ml, diretorio: str, frases_verificacao: list = None,
+                              tolerancia: float = 1e-9, origem: dict = None):
+    """
+    Exporta um Pipeline TfidfVectorizer + MultinomialNB treinado para arquivos que
+    dispensam o scikit-learn: vocabulário (JSON), vetor idf e matrizes de
+    log-probabilidades (.npy, carregáveis com mmap). Se 'frases_verificacao' for
+    informado, confere que o pontuador reproduz o predict_proba do pipeline.
+    """
+    vetorizador = pipeline_ml.named_steps['vetorizacao']
+    classificador = pipeline_ml.named_steps['classificador']
+
+    nao_suportado = [
+        nome for nome, valor in (
+            ('tokenizer', vetorizador.tokenizer), ('preprocessor', vetorizador.preprocessor),
+            ('stop_words', vetorizador.stop_words)
+        ) if valor is not None
+    ]
+    if callable(vetorizador.analyzer) or callable(vetorizador.strip_accents) or vetorizador.binary:
+        nao_suportado.append('analyzer/strip_accents/binary')
+    if nao_suportado:
+        raise ValueError(f"Configuração do vetorizador não suportada pelo pontuador NumPy: {nao_suportado}")
+
+    os.makedirs(diretorio, exist_ok=True)
+    vocabulario = {termo: int(indice) for termo, indice in vetorizador.vocabulary_.items()}
+    idf = vetorizador.idf_ if vetorizador.use_idf else np.ones(len(vocabulario))
+
+    _salvar_atomico(os.path.join(diretorio, ARQUIVO_IDF),
+                    lambda arquivo: np.save(arquivo, np.asarray(idf, dtype=np.float64)))
+    # Uma linha por termo: as colunas de um termo ficam contíguas na leitura com mmap
+    _salvar_atomico(os.path.join(diretorio, ARQUIVO_LOG_PROB_ATRIBUTOS),
+                    lambda arquivo: np.save(arquivo, np.ascontiguousarray(classificador.feature_log_prob_.T,
+                                                                          dtype=np.float64)))
+    _salvar_atomico(os.path.join(diretorio, ARQUIVO_LOG_PROB_CLASSES),
+                    lambda arquivo: np.save(arquivo, np.asarray(classificador.class_log_prior_, dtype=np.float64)))
+    _salvar_atomico(os.path.join(diretorio, ARQUIVO_VOCABULARIO),
+                    lambda arquivo: arquivo.write(json.dumps(vocabulario, ensure_ascii=False,
+                                                             separators=(',', ':')).encode('utf-8')))
+
+    configuracao = {
+        "classes": [str(classe) for classe in classificador.classes_],
+        "analyzer": vetorizador.analyzer,
+        "token_pattern": vetorizador.token_pattern,
+        "lowercase": vetorizador.lowercase,
+        "strip_accents": vetorizador.strip_accents,
+        "ngram_range": list(vetorizador.ngram_range),
+        "norm": vetorizador.norm,
+        "sublinear_tf": vetorizador.sublinear_tf,
+        "origem": origem or {},
+        # Hash da base de conhecimento e parâmetros usados no treino (carimbados no pipeline pelo chatbot)
+        "hash_base": getattr(pipeline_ml, 'hash_base_conhecimento', None),
+        "parametros": getattr(pipeline_ml, 'parametros_modelo', None)
+    }
+    # A configuração é gravada por último: ela marca o artefato como completo
+    _salvar_atomico(os.path.join(diretorio, ARQUIVO_CONFIGURACAO),
+                    lambda arquivo: arquivo.write(json.dumps(configuracao, ensure_ascii=False,
+                                                             indent=4).encode('utf-8')))
+
+    if frases_verificacao:
+        esperado = pipeline_ml.predict_proba(frases_verificacao)
+        obtido = PontuadorNumPy(diretorio).predict_proba(frases_verificacao)
+        diferenca = float(np.max(np.abs(esperado - obtido)))
+        if diferenca > tolerancia:
+            raise ValueError(f"Pontuador NumPy diverge do pipeline (diferença máxima {diferenca:.2e})")
+
+
+class PontuadorNumPy:
+    """
+    Reproduz TfidfVectorizer + MultinomialNB usando apenas NumPy, a partir do
+    artefato gerado por 'exportar_modelo_compilado'. Expõe a mesma interface
+    usada pelo ChatbotClinica: 'predict_proba' e 'classes_'.
+    """
+
+    def __init__(self, diretorio: str, mmap_mode: str = 'r'):
+        self.diretorio = diretorio
+        with open(os.path.join(diretorio, ARQUIVO_CONFIGURACAO), 'r', encoding='utf-8') as arquivo:
+            self.configuracao = json.load(arquivo)
+        with open(os.path.join(diretorio, ARQUIVO_VOCABULARIO), 'r', encoding='utf-8') as arquivo:
+            self.vocabulario = json.load(arquivo)
+
+        self.idf = np.load(os.path.join(diretorio, ARQUIVO_IDF), mmap_mode=mmap_mode)
+        self.log_prob_atributos = np.load(os.path.join(diretorio, ARQUIVO_LOG_PROB_ATRIBUTOS), mmap_mode=mmap_mode)
+        self.log_prob_classes = np.load(os.path.join(diretorio, ARQUIVO_LOG_PROB_CLASSES), mmap_mode=mmap_mode)
+        self.classes_ = np.array(self.configuracao["classes"], dtype=object)
+
+        self._minimo_n, self._maximo_n = self.configuracao["ngram_range"]
+        self._padrao_token = re.compile(self.configuracao["token_pattern"] or r"(?u)\b\w\w+\b")
+        self._espacos = re.compile(r"\s\s+")
+        self._remover_acentos = {
+            None: None, 'unicode': _remover_acentos_unicode, 'ascii': _remover_acentos_ascii
+        }[self.configuracao["strip_accents"]]
+
+    @staticmethod
+    def existe(diretorio: str) -> bool:
+        return os.path.exists(os.path.join(diretorio, ARQUIVO_CONFIGURACAO))
+
+    # --- Análise do texto (mesmas regras do TfidfVectorizer) ---
+    def _preprocessar(self, texto: str) -> str:
+        if self.configuracao["lowercase"]:
+            texto = texto.lower()
+        if self._remover_acentos is not None:
+            texto = self._remover_acentos(texto)
+        return texto
+
+    def _termos(self, texto: str) -> list:
+        texto = self._preprocessar(texto)
+        analisador = self.configuracao["analyzer"]
+        if analisador == 'word':
+            return self._ngramas_palavras(self._padrao_token.findall(texto))
+        if analisador == 'char_wb':
+            return self._ngramas_caracteres_palavra(texto)
+        return self._ngramas_caracteres(texto)
+
+    def _ngramas_palavras(self, tokens: list) -> list:
+        minimo_n, maximo_n = self._minimo_n, self._maximo_n
+        if maximo_n == 1:
+            return tokens
+        termos = list(tokens) if minimo_n == 1 else []
+        for n in range(max(minimo_n, 2), min(maximo_n, len(tokens)) + 1):
+            termos.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return termos
+
+    def _ngramas_caracteres(self, texto: str) -> list:
+        texto = self._espacos.sub(" ", texto)
+        termos = []
+        for n in range(self._minimo_n, min(self._maximo_n, len(texto)) + 1):
+            termos.extend(texto[i:i + n] for i in range(len(texto) - n + 1))
+        return termos
+
+    def _ngramas_caracteres_palavra(self, texto: str) -> list:
+        texto = self._espacos.sub(" ", texto)
+        termos = []
+        for palavra in texto.split():
+            palavra = f" {palavra} "
+            for n in range(self._minimo_n, self._maximo_n + 1):
+                deslocamento = 0
+                termos.append(palavra[0:n])
+                while deslocamento + n < len(palavra):
+                    deslocamento += 1
+                    termos.append(palavra[deslocamento:deslocamento + n])
+                if deslocamento == 0:  # palavra menor que n conta uma única vez
+                    break
+        return termos
+
+    # --- Pontuação ---
+    def _vetorizar(self, texto: str) -> tuple:
+        contagens = {}
+        for termo in self._termos(texto):
+            indice = self.vocabulario.get(termo)
+            if indice is not None:
+                contagens[indice] = contagens.get(indice, 0) + 1
+        if not contagens:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        indices = np.fromiter(contagens.keys(), dtype=np.intp, count=len(contagens))
+        valores = np.fromiter(contagens.values(), dtype=np.float64, count=len(contagens))
+        if self.configuracao["sublinear_tf"]:
+            valores = np.log(valores) + 1
+        valores = valores * self.idf[indices]
+
+        norma = self.configuracao["norm"]
+        if norma == 'l2':
+            valores = valores / np.sqrt(np.dot(valores, valores))
+        elif norma == 'l1':
+            valores = valores / np.abs(valores).sum()
+        return indices, valores
+
+    def predict_proba(self, textos: list) -> np.ndarray:
+        log_verossimilhanca = np.empty((len(textos), len(self.classes_)))
+        for linha, texto in enumerate(textos):
+            indices, valores = self._vetorizar(texto)
+            log_verossimilhanca[linha] = valores @ self.log_prob_atributos[indices] + self.log_prob_classes
+
+        log_verossimilhanca -= log_verossimilhanca.max(axis=1, keepdims=True)
+        probabilidades = np.exp(log_verossimilhanca)
+        probabilidades /= probabilidades.sum(axis=1, keepdims=True)
+        return probabilidades
+
+
+# --- Exportação via linha de comando ---
+if __name__ == "__main__":
+    import joblib
+
+    arquivo_modelo = sys.argv[1] if len(sys.argv) > 1 else 'modelo_chatbot.joblib'
+    diretorio_saida = sys.argv[2] if len(sys.argv) > 2 else 'modelo_compilado'
+    arquivo_base = 'base_conhecimento.json'
+
+    frases = None
+    if os.path.exists(arquivo_base):
+        with open(arquivo_base, 'r', encoding='utf-8') as arquivo:
+            frases = json.load(arquivo)['frases']
+
+    exportar_modelo_compilado(joblib.load(arquivo_modelo), diretorio_saida, frases_verificacao=frases)
+    print(f"✅ Modelo exportado para '{diretorio_saida}' (pontuador NumPy verificado).")
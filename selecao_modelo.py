@@ -0,0 +1,224 @@
+"""
+Seleção do modelo por validação cruzada: avalia combinações de analisador (palavras
+ou n-gramas de caracteres), faixa de n-gramas, alpha do Naive Bayes e os limiares de
+confiança do ML e de similaridade do fallback, em todos os núcleos. Cada candidato é
+medido com a decisão completa do atendimento (ML, palavras-chave, similaridade):
+acurácia, taxas de fallback e de DESCONHECIDO e custo de inferência por mensagem
+(com o pipeline do scikit-learn, uma mensagem por chamada).
+
+O vencedor e o relatório vão para modelo_chatbot_selecao.json, ao lado do
+modelo_chatbot.joblib, que é retreinado com os parâmetros escolhidos. A busca é
+reprodutível: mesma base, mesma grade e mesma semente geram o mesmo relatório
+(exceto os tempos).
+
+Uso: python selecao_modelo.py [--dobras 5] [--trabalhadores 8] [--apenas-relatorio]
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from base_compilada import carregar_base_compilada
+from chatbot_core import (ChatbotClinica, PALAVRAS_CHAVE_PADRAO, PARAMETROS_MODELO_PADRAO,
+                          RESPOSTAS_PRE_DEFINIDAS, treinar_pipeline_ml)
+from indice_similaridade import IndiceSimilaridade
+from palavras_chave import CorrespondentePalavrasChave
+
+GRADE_MODELOS = {
+    "word": {"ngram_range": [[1, 1], [1, 2]], "alpha": [0.1, 0.5, 1.0]},
+    "char_wb": {"ngram_range": [[2, 4], [3, 5]], "alpha": [0.1, 0.5, 1.0]}
+}
+LIMIARES_CONFIANCA_ML = [0.3, 0.4, 0.5, 0.6]
+LIMIARES_SIMILARIDADE = [0.4, 0.5, 0.6, 0.7]
+
+_dados = None
+
+
+def gerar_parametros() -> list:
+    return [{"analyzer": analisador, "ngram_range": faixa, "alpha": alpha}
+            for analisador, grade in GRADE_MODELOS.items()
+            for faixa, alpha in itertools.product(grade["ngram_range"], grade["alpha"])]
+
+
+def gerar_dobras(categorias: list, quantidade: int, semente: int) -> list:
+    """Índices de teste de cada dobra, estratificados por categoria."""
+    from sklearn.model_selection import StratifiedKFold
+
+    menor_categoria = min(categorias.count(categoria) for categoria in set(categorias))
+    quantidade = max(2, min(quantidade, menor_categoria))
+    divisor = StratifiedKFold(n_splits=quantidade, shuffle=True, random_state=semente)
+    return [teste.tolist() for _, teste in divisor.split(categorias, categorias)]
+
+
+# --- Processos trabalhadores ---
+def _iniciar_trabalhador(frases: list, categorias: list, palavras_chave):
+    global _dados
+    _dados = (frases, categorias, CorrespondentePalavrasChave(palavras_chave))
+
+
+def _avaliar_dobra(parametros: dict, indices_teste: list) -> list:
+    """
+    Treina com as demais dobras e registra, por mensagem de teste, o que cada etapa da
+    decisão respondeu e quanto custou. Os limiares são aplicados depois, sem retreinar.
+    """
+    frases, categorias, palavras_chave = _dados
+    teste = set(indices_teste)
+    frases_treino = [frase for indice, frase in enumerate(frases) if indice not in teste]
+    categorias_treino = [categoria for indice, categoria in enumerate(categorias) if indice not in teste]
+    modelo = treinar_pipeline_ml(frases_treino, categorias_treino, parametros)
+    indice_similaridade = IndiceSimilaridade(frases_treino, categorias_treino)
+
+    registros = []
+    for indice in indices_teste:
+        mensagem = frases[indice]
+        inicio = time.perf_counter()
+        probabilidades = modelo.predict_proba([mensagem])[0]
+        tempo_ml = time.perf_counter() - inicio
+        maior = probabilidades.argmax()
+
+        inicio = time.perf_counter()
+        categoria_palavra_chave = palavras_chave.buscar(mensagem)
+        tempo_palavras_chave = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        similaridade, categoria_similar = indice_similaridade.buscar(mensagem)
+        tempo_similaridade = time.perf_counter() - inicio
+
+        registros.append((categorias[indice], str(modelo.classes_[maior]), float(probabilidades[maior]), tempo_ml,
+                          categoria_palavra_chave, tempo_palavras_chave, similaridade, categoria_similar,
+                          tempo_similaridade))
+    return registros
+
+
+# --- Avaliação dos limiares ---
+def avaliar_limiares(registros: list, limiar_confianca_ml: float, limiar_similaridade: float) -> dict:
+    """Aplica a decisão do atendimento (mesma ordem de _decidir_categoria) a cada registro."""
+    acertos = fallback = desconhecido = 0
+    custo = 0.0
+    for (categoria_real, categoria_ml, probabilidade, tempo_ml, categoria_palavra_chave, tempo_palavras_chave,
+         similaridade, categoria_similar, tempo_similaridade) in registros:
+        custo += tempo_ml
+        if probabilidade >= limiar_confianca_ml and categoria_ml in RESPOSTAS_PRE_DEFINIDAS:
+            decisao = categoria_ml
+        else:
+            custo += tempo_palavras_chave
+            if categoria_palavra_chave is not None:
+                decisao = categoria_palavra_chave
+            else:
+                custo += tempo_similaridade
+                decisao = categoria_similar if (similaridade >= limiar_similaridade
+                                                and categoria_similar in RESPOSTAS_PRE_DEFINIDAS) else None
+            if decisao is None:
+                desconhecido += 1
+                decisao = "DESCONHECIDO"
+            else:
+                fallback += 1
+        acertos += decisao == categoria_real
+
+    total = len(registros) or 1
+    return {
+        "acuracia": round(acertos / total, 4),
+        "taxa_fallback": round(fallback / total, 4),
+        "taxa_desconhecido": round(desconhecido / total, 4),
+        "custo_medio_us": round(custo / total * 1e6, 1)
+    }
+
+
+def selecionar_modelo(frases: list, categorias: list, palavras_chave, dobras: int = 5,
+                      trabalhadores: int = None, semente: int = 42) -> dict:
+    lista_parametros = gerar_parametros()
+    lista_dobras = gerar_dobras(categorias, dobras, semente)
+    trabalhadores = trabalhadores or os.cpu_count() or 2
+
+    inicio = time.perf_counter()
+    tarefas = list(itertools.product(range(len(lista_parametros)), range(len(lista_dobras))))
+    with ProcessPoolExecutor(trabalhadores, initializer=_iniciar_trabalhador,
+                             initargs=(frases, categorias, palavras_chave)) as executor:
+        resultados = executor.map(_avaliar_dobra, [lista_parametros[p] for p, _ in tarefas],
+                                  [lista_dobras[d] for _, d in tarefas])
+        registros_por_parametros = [[] for _ in lista_parametros]
+        for (indice_parametros, _), registros in zip(tarefas, resultados):
+            registros_por_parametros[indice_parametros].extend(registros)
+
+    candidatos = []
+    for parametros, registros in zip(lista_parametros, registros_por_parametros):
+        for limiar_confianca_ml, limiar_similaridade in itertools.product(LIMIARES_CONFIANCA_ML,
+                                                                          LIMIARES_SIMILARIDADE):
+            candidatos.append({
+                "parametros": parametros,
+                "limiares": {"confianca_ml": limiar_confianca_ml, "similaridade": limiar_similaridade},
+                "metricas": avaliar_limiares(registros, limiar_confianca_ml, limiar_similaridade),
+                "custo_ml_us": round(statistics.mean(registro[3] for registro in registros) * 1e6, 1)
+            })
+
+    # Maior acurácia; no empate, menos fallback (mais decisões do modelo) e menor custo
+    candidatos.sort(key=lambda candidato: (-candidato["metricas"]["acuracia"], candidato["metricas"]["taxa_fallback"],
+                                           candidato["metricas"]["custo_medio_us"]))
+    atual = next(candidato for candidato in candidatos
+                 if candidato["parametros"] == PARAMETROS_MODELO_PADRAO
+                 and candidato["limiares"] == {"confianca_ml": 0.4, "similaridade": 0.5})
+    return {
+        "vencedor": candidatos[0],
+        "padrao": atual,
+        "candidatos": candidatos,
+        "busca": {
+            "dobras": len(lista_dobras),
+            "semente": semente,
+            "grade_modelos": GRADE_MODELOS,
+            "limiares_confianca_ml": LIMIARES_CONFIANCA_ML,
+            "limiares_similaridade": LIMIARES_SIMILARIDADE,
+            "frases": len(frases),
+            "trabalhadores": trabalhadores,
+            "segundos": round(time.perf_counter() - inicio, 2)
+        }
+    }
+
+
+def salvar_relatorio(relatorio: dict, caminho: str):
+    caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(caminho_temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho_temporario, caminho)
+
+
+def _descrever(candidato: dict) -> str:
+    parametros, limiares, metricas = candidato["parametros"], candidato["limiares"], candidato["metricas"]
+    return (f"{parametros['analyzer']} {tuple(parametros['ngram_range'])} alpha={parametros['alpha']} | "
+            f"limiares ML {limiares['confianca_ml']} / similaridade {limiares['similaridade']} | "
+            f"acurácia {metricas['acuracia']:.2%} | fallback {metricas['taxa_fallback']:.2%} | "
+            f"desconhecido {metricas['taxa_desconhecido']:.2%} | {metricas['custo_medio_us']:.0f} µs/msg")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seleção do modelo e dos limiares por validação cruzada.")
+    parser.add_argument('--dobras', type=int, default=5)
+    parser.add_argument('--trabalhadores', type=int, default=None, help="processos (padrão: número de CPUs)")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--top', type=int, default=10, help="candidatos mostrados no terminal")
+    parser.add_argument('--apenas-relatorio', action='store_true',
+                        help="mostra o resultado sem gravar a seleção nem retreinar o modelo")
+    argumentos = parser.parse_args()
+
+    chatbot = ChatbotClinica()
+    base = carregar_base_compilada(chatbot.ARQUIVO_BASE_CONHECIMENTO, chatbot.ARQUIVO_BASE_COMPILADA)
+    relatorio = selecionar_modelo(base["frases"], base["categorias"], base["palavras_chave"] or PALAVRAS_CHAVE_PADRAO,
+                                  argumentos.dobras, argumentos.trabalhadores, argumentos.semente)
+    relatorio["gerado_em"] = datetime.datetime.now().isoformat()
+    relatorio["hash_base"] = base["hash"]
+
+    busca = relatorio["busca"]
+    print(f"📊 {len(relatorio['candidatos'])} candidatos, {busca['dobras']} dobras, {busca['frases']} frases, "
+          f"{busca['trabalhadores']} processos, {busca['segundos']} s")
+    for posicao, candidato in enumerate(relatorio["candidatos"][:argumentos.top], 1):
+        print(f"  {posicao:2d}. {_descrever(candidato)}")
+    print(f"  Padrão: {_descrever(relatorio['padrao'])}")
+
+    if argumentos.apenas_relatorio:
+        print("ℹ️  Seleção não gravada (--apenas-relatorio).")
+    else:
+        salvar_relatorio(relatorio, chatbot.ARQUIVO_SELECAO_MODELO)
+        print(f"✅ Vencedor gravado em '{chatbot.ARQUIVO_SELECAO_MODELO}'; "
+              f"modelo retreinado com {chatbot.retreinar_modelo()} frases.")
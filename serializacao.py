@@ -0,0 +1,79 @@
+"""
+Serialização JSON do chatbot: usa o orjson quando está instalado e, sem ele, o json da
+biblioteca padrão, com o mesmo formato nos dois casos (UTF-8 sem escapes e sem espaços).
+Histórico, índice de sessões e base de conhecimento são gravados compactos; para ler
+um desses arquivos formatado:
+
+    python serializacao.py historico_usuarios/ab/cd/<id>_historico.jsonl
+    python serializacao.py base_conhecimento.json --indentacao 4
+"""
+import argparse
+import gzip
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele, usa o json da biblioteca padrão
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def _json_para_bytes(dados, padrao=None) -> bytes:
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':'), default=padrao).encode('utf-8')
+
+
+def para_bytes(dados, padrao=None) -> bytes:
+    """JSON compacto em UTF-8. 'padrao' converte os tipos que o JSON não conhece (como o 'default' do json)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(dados, default=padrao)
+        except TypeError:
+            pass  # o que o orjson recusa (ex.: inteiros acima de 64 bits, chaves numéricas) fica com o json
+    return _json_para_bytes(dados, padrao)
+
+
+def para_texto(dados, padrao=None) -> str:
+    return para_bytes(dados, padrao).decode('utf-8')
+
+
+def de_json(conteudo):
+    """Lê JSON de bytes ou str. Conteúdo inválido levanta json.JSONDecodeError (o do orjson é subclasse)."""
+    if orjson is not None:
+        return orjson.loads(conteudo)
+    return json.loads(conteudo)
+
+
+def formatar(dados, indentacao: int = 2) -> str:
+    """Versão legível, só para exibição: o que é gravado continua compacto."""
+    return json.dumps(dados, ensure_ascii=False, indent=indentacao)
+
+
+def ler_arquivo(caminho: str):
+    """Gera os documentos de um arquivo .json ou .jsonl (em gzip ou não)."""
+    abrir = gzip.open if caminho.endswith('.gz') else open
+    with abrir(caminho, 'rb') as arquivo:
+        conteudo = arquivo.read()
+    try:
+        yield de_json(conteudo)
+        return
+    except json.JSONDecodeError:
+        pass  # JSONL: um documento por linha
+    for linha in conteudo.splitlines():
+        if linha.strip():
+            yield de_json(linha)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mostra arquivos JSON/JSONL do chatbot formatados.")
+    parser.add_argument('arquivos', nargs='+')
+    parser.add_argument('--indentacao', type=int, default=2)
+    argumentos = parser.parse_args()
+
+    for caminho in argumentos.arquivos:
+        try:
+            for documento in ler_arquivo(caminho):
+                print(formatar(documento, argumentos.indentacao))
+        except (OSError, json.JSONDecodeError) as erro:
+            print(f"❌ {caminho}: {erro}", file=sys.stderr)
@@ -1,13 +1,85 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from chatbot_core import ChatbotClinica
+from configuracao_servidor import chatbot, controle_admissao, dados_prontidao, dados_saude, usuario_id_aceito
+from historico_armazenamento import CursorExpirado, decodificar_cursor
+from serializacao import de_json, para_texto
+from treinamento_incremental import TreinadorEmSegundoPlano
+from collections import Counter
+from functools import wraps
+from itertools import chain
 import datetime
+import math
+import os
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    """jsonify e request.get_json pelo serializacao.py (orjson, se instalado); indentado só no modo debug."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get('indent'):
+            return super().dumps(obj, **kwargs)
+        return para_texto(obj, self.default)
+
+    def loads(self, s, **kwargs):
+        return de_json(s)
+
 
 app = Flask(__name__)
+app.json = ProvedorJSON(app)
 CORS(app)  # Permite frontend acessar
 
-# Instância global do chatbot
-chatbot = ChatbotClinica()
+# Instância do chatbot e /api/health vêm do configuracao_servidor.py (compartilhado com o servidor_async.py)
+
+# Limite de mensagens aceitas em /api/chat/lote
+TAMANHO_MAXIMO_LOTE = 500
+
+# Interações por página em /api/chat/historico/<usuario_id>
+LIMITE_PADRAO_HISTORICO = 20
+LIMITE_MAXIMO_HISTORICO = 200
+
+# Inclusão de frases e retreino sem reiniciar o servidor
+treinador = TreinadorEmSegundoPlano(chatbot)
+
+# Rotas /api/admin/* só ficam disponíveis com um token definido no ambiente
+TOKEN_ADMIN = os.environ.get('CHATBOT_TOKEN_ADMIN')
+
+def exigir_token_admin(funcao):
+    @wraps(funcao)
+    def verificar(*args, **kwargs):
+        if not TOKEN_ADMIN:
+            return jsonify({"success": False, "error": "Administração desabilitada (defina CHATBOT_TOKEN_ADMIN)"}), 403
+        if request.headers.get('X-Token-Admin') != TOKEN_ADMIN:
+            return jsonify({"success": False, "error": "Token de administração inválido"}), 401
+        return funcao(*args, **kwargs)
+    return verificar
+
+def recusar_se_sobrecarregado(mensagens_por_usuario=None):
+    """
+    Admissão da requisição: limite por usuário (429) e de requisições em andamento (503).
+    'mensagens_por_usuario' é {usuario_id: mensagens} só dos itens que informam o usuario_id.
+    Retorna a resposta de recusa, ou None se admitida; nesse caso, chamar controle_admissao.sair() no final.
+    """
+    if mensagens_por_usuario:
+        espera = controle_admissao.consumir_usuarios(mensagens_por_usuario)
+        if espera == math.inf:
+            return jsonify({
+                "success": False,
+                "error": f"Mais de {controle_admissao.rajada_por_usuario} mensagens do mesmo usuário na requisição"
+            }), 429
+        if espera:
+            return jsonify({
+                "success": False,
+                "error": "Muitas mensagens em pouco tempo. Aguarde um instante e tente novamente."
+            }), 429, {'Retry-After': str(math.ceil(espera))}
+    if not controle_admissao.entrar():
+        # O trabalho não foi feito: os tokens voltam, para a nova tentativa não receber 429
+        controle_admissao.devolver_usuarios(mensagens_por_usuario)
+        return jsonify({
+            "success": False,
+            "error": "Serviço sobrecarregado. Tente novamente em instantes."
+        }), 503, {'Retry-After': '1'}
+    return None
 
 @app.route('/api/chat/mensagem', methods=['POST'])
 def processar_mensagem():
@@ -25,8 +97,21 @@ def processar_mensagem():
         
         mensagem = data['mensagem']
         usuario_id = data.get('usuario_id', 'anonimo')
-        
-        resultado = chatbot.processar_mensagem(mensagem, usuario_id)
+        if not usuario_id_aceito(usuario_id):
+            return jsonify({
+                "success": False,
+                "error": "Campo 'usuario_id' inválido"
+            }), 400
+
+        # O limite por usuário só vale para quem se identifica: 'anonimo' é compartilhado
+        # Chave normalizada: 1 e "1" são o mesmo usuário (e o mesmo histórico)
+        recusa = recusar_se_sobrecarregado({str(usuario_id): 1} if 'usuario_id' in data else None)
+        if recusa is not None:
+            return recusa
+        try:
+            resultado = chatbot.processar_mensagem(mensagem, usuario_id)
+        finally:
+            controle_admissao.sair()
         return jsonify(resultado)
         
     except Exception as e:
@@ -35,14 +120,173 @@ def processar_mensagem():
             "error": f"Erro interno: {str(e)}"
         }), 500
 
+@app.route('/api/chat/lote', methods=['POST'])
+def processar_lote():
+    """
+    Processa uma rajada de mensagens - espera JSON:
+    {"mensagens": [{"mensagem": "texto", "usuario_id": "opcional"}, ...]}
+    Cada item com usuario_id consome um token do limite por usuário, como em /api/chat/mensagem.
+    """
+    try:
+        data = request.get_json()
+        mensagens = data.get('mensagens') if isinstance(data, dict) else None
+
+        if not isinstance(mensagens, list) or not all(isinstance(item, dict) and isinstance(item.get('mensagem'), str) for item in mensagens):
+            return jsonify({
+                "success": False,
+                "error": "Campo 'mensagens' deve ser uma lista de objetos com 'mensagem'"
+            }), 400
+
+        if not all(usuario_id_aceito(item.get('usuario_id', 'anonimo')) for item in mensagens):
+            return jsonify({
+                "success": False,
+                "error": "Campo 'usuario_id' inválido"
+            }), 400
+
+        if len(mensagens) > TAMANHO_MAXIMO_LOTE:
+            return jsonify({
+                "success": False,
+                "error": f"Lote excede o limite de {TAMANHO_MAXIMO_LOTE} mensagens"
+            }), 400
+
+        recusa = recusar_se_sobrecarregado(Counter(str(item['usuario_id']) for item in mensagens if 'usuario_id' in item))
+        if recusa is not None:
+            return recusa
+        try:
+            resultados = chatbot.processar_lote(mensagens)
+        finally:
+            controle_admissao.sair()
+        return jsonify({"success": True, "data": resultados})
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Erro interno: {str(e)}"
+        }), 500
+
+@app.route('/api/chat/historico/<usuario_id>', methods=['GET'])
+@exigir_token_admin
+def historico_usuario(usuario_id):
+    """
+    Conversa de um usuário, da interação mais recente para a mais antiga, em páginas:
+    ?limite=20&cursor=<proximo_cursor da página anterior>&desde=<ISO>&ate=<ISO>
+    ('desde' inclusive, 'ate' exclusive). A resposta é enviada aos poucos (chunked).
+    Um cursor de antes de uma compactação ou arquivamento do histórico recebe 409.
+    """
+    if not usuario_id_aceito(usuario_id):
+        return jsonify({"success": False, "error": "usuario_id inválido"}), 400
+    try:
+        limite = int(request.args.get('limite', LIMITE_PADRAO_HISTORICO))
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            decodificar_cursor(cursor)
+        desde, ate = (datetime.datetime.fromisoformat(request.args[nome]).isoformat() if nome in request.args else None
+                      for nome in ('desde', 'ate'))
+        if not 1 <= limite <= LIMITE_MAXIMO_HISTORICO:
+            raise ValueError
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": f"Parâmetros inválidos: 'limite' entre 1 e {LIMITE_MAXIMO_HISTORICO}, 'cursor' como "
+                     f"recebido em 'proximo_cursor', 'desde'/'ate' em formato ISO"
+        }), 400
+
+    interacoes = chatbot.ler_historico_reverso(usuario_id, cursor, desde, ate)
+    try:
+        # O cursor é conferido na primeira leitura: antes de a resposta começar a ser enviada
+        primeira = next(interacoes, None)
+    except CursorExpirado:
+        return jsonify({
+            "success": False,
+            "error": "O histórico foi compactado ou arquivado depois deste cursor; recomece da primeira página"
+        }), 409
+    if primeira is not None:
+        interacoes = chain([primeira], interacoes)
+
+    def gerar():
+        yield '{"success":true,"data":{"usuario_id":' + para_texto(usuario_id) + ',"interacoes":['
+        enviadas = 0
+        proximo_cursor = None
+        for cursor_registro, registro in interacoes:
+            if enviadas == limite:
+                proximo_cursor = ultimo_cursor  # há interações mais antigas
+                break
+            yield (',' if enviadas else '') + para_texto(registro)
+            enviadas += 1
+            ultimo_cursor = cursor_registro
+        yield '],"proximo_cursor":' + para_texto(proximo_cursor) + '}}'
+
+    return Response(stream_with_context(gerar()), content_type='application/json; charset=utf-8')
+
+@app.route('/api/admin/frases', methods=['POST'])
+@exigir_token_admin
+def adicionar_frases():
+    """
+    Inclui frases rotuladas e agenda o retreino - espera JSON:
+    {"frases": [{"frase": "texto", "categoria": "EXAMES"}, ...]}
+    """
+    data = request.get_json(silent=True)
+    frases = data.get('frases') if isinstance(data, dict) else None
+
+    if not isinstance(frases, list) or not frases or not all(
+            isinstance(item, dict) and isinstance(item.get('frase'), str) and isinstance(item.get('categoria'), str)
+            for item in frases):
+        return jsonify({
+            "success": False,
+            "error": "Campo 'frases' deve ser uma lista de objetos com 'frase' e 'categoria'"
+        }), 400
+
+    desconhecidas = sorted({item['categoria'] for item in frases} - set(chatbot.respostas))
+    if desconhecidas:
+        return jsonify({
+            "success": False,
+            "error": f"Categorias sem resposta cadastrada: {', '.join(desconhecidas)}"
+        }), 400
+
+    adicionadas = treinador.adicionar_frases(frases)
+    return jsonify({"success": True, "data": {"adicionadas": adicionadas, "treinamento": treinador.estado}}), 202
+
+@app.route('/api/admin/retreinar', methods=['POST'])
+@exigir_token_admin
+def retreinar():
+    """Retreina o modelo a partir da base de conhecimento atual, em segundo plano"""
+    treinador.agendar_retreino()
+    return jsonify({"success": True, "data": {"treinamento": treinador.estado}}), 202
+
+@app.route('/api/admin/treinamento', methods=['GET'])
+@exigir_token_admin
+def estado_treinamento():
+    """Situação do último retreino"""
+    return jsonify({"success": True, "data": treinador.estado})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Verifica se o serviço está online"""
-    return jsonify({
-        "status": "online", 
-        "service": "chatbot-clinica",
-        "timestamp": datetime.datetime.now().isoformat()
+    return jsonify(dados_saude())
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Prontidão para receber tráfego: 200 depois do aquecimento, 503 antes (ou se ele falhou)"""
+    pronto, dados = dados_prontidao()
+    return jsonify(dados), 200 if pronto else 503
+
+@app.route('/api/metrics', methods=['GET'])
+def metricas():
+    """Métricas no formato texto do Prometheus (latência por etapa, categorias e caminhos)"""
+    cache = chatbot.cache_predicao.estatisticas()
+    admissao = controle_admissao.estatisticas()
+    texto = chatbot.metricas.exportar_prometheus({
+        "chatbot_cache_predicao_acertos_total": ("counter", "Consultas atendidas pelo cache de predições.", cache["acertos"]),
+        "chatbot_cache_predicao_falhas_total": ("counter", "Consultas ausentes do cache de predições.", cache["falhas"]),
+        "chatbot_cache_predicao_itens": ("gauge", "Predições guardadas no cache.", cache["itens"]),
+        "chatbot_requisicoes_em_andamento": ("gauge", "Requisições de chat em processamento.", admissao["em_andamento"]),
+        "chatbot_requisicoes_na_fila": ("gauge", "Requisições de chat esperando um lugar.", admissao["fila"]),
+        "chatbot_recusas_sobrecarga_total": ("counter", "Requisições recusadas com 503 (fila cheia ou espera esgotada).",
+                                             admissao["rejeitadas_sobrecarga"] + admissao["rejeitadas_espera"]),
+        "chatbot_recusas_limite_usuario_total": ("counter", "Requisições recusadas com 429 (limite por usuário).",
+                                                 admissao["rejeitadas_limite_usuario"])
     })
+    return Response(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     print("🌐 Iniciando servidor do chatbot...")
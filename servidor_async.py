@@ -0,0 +1,310 @@
+"""
+Servidor assíncrono (ASGI) do chatbot, com o mesmo contrato de /api/chat/mensagem e
+/api/health e /api/ready do servidor_api.py. A classificação roda em um pool de threads limitado
+e o histórico é gravado em segundo plano: a resposta não espera o disco, e milhares
+de conexões abertas custam apenas corrotinas.
+
+Uso:
+    python servidor_async.py --porta 5000     # uvicorn, se instalado; senão o servidor HTTP embutido
+    uvicorn servidor_async:app --port 5000
+"""
+import argparse
+import asyncio
+import math
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+try:
+    import uvicorn
+except ImportError:  # opcional: sem ele, usa o servidor HTTP embutido
+    uvicorn = None
+
+# Sem o Flask: o servidor assíncrono sobe importando só o chatbot
+from configuracao_servidor import chatbot, controle_admissao, dados_prontidao, dados_saude, usuario_id_aceito
+from serializacao import de_json, para_bytes
+
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+# Conexões keep-alive ociosas (ex.: do gateway de mensagens) são fechadas após este tempo
+TEMPO_OCIOSO_SEGUNDOS = 75
+
+
+class ServicoAssincrono:
+    """
+    Atende mensagens sem bloquear o loop de eventos. Mensagens do mesmo usuário são
+    atendidas em ordem (a próxima espera a gravação da anterior, para ver a última
+    categoria correta); usuários diferentes seguem em paralelo.
+    """
+
+    def __init__(self, chatbot, trabalhadores_classificacao: int = None, trabalhadores_historico: int = 8):
+        self.chatbot = chatbot
+        self.executor_classificacao = ThreadPoolExecutor(
+            trabalhadores_classificacao or os.cpu_count() or 2, thread_name_prefix='classificacao'
+        )
+        self.executor_historico = ThreadPoolExecutor(trabalhadores_historico, thread_name_prefix='historico')
+        self._travas = {}  # id_usuario -> [asyncio.Lock, requisições usando]
+        self._gravacoes = set()
+
+    async def processar_mensagem(self, mensagem: str, id_usuario: str) -> dict:
+        id_usuario = id_usuario or 'anonimo'
+        await self._adquirir(id_usuario)
+        try:
+            inicio = self.chatbot.metricas.iniciar()
+            resultados, interacoes_por_usuario = await asyncio.get_running_loop().run_in_executor(
+                self.executor_classificacao, self.chatbot.preparar_respostas,
+                [{"mensagem": mensagem, "usuario_id": id_usuario}]
+            )
+            self.chatbot.metricas.registrar_etapa("total", inicio)
+        except BaseException:
+            self._liberar(id_usuario)
+            raise
+
+        # A trava do usuário só é liberada quando a gravação termina
+        tarefa = asyncio.create_task(self._gravar(id_usuario, interacoes_por_usuario))
+        self._gravacoes.add(tarefa)
+        tarefa.add_done_callback(self._gravacoes.discard)
+        return {"success": True, "data": resultados[0]}
+
+    async def _gravar(self, id_usuario: str, interacoes_por_usuario: dict):
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor_historico, self.chatbot.salvar_interacoes, interacoes_por_usuario
+            )
+        except Exception as erro:
+            print(f"❌ Erro ao gravar o histórico de '{id_usuario}': {erro}")
+        finally:
+            self._liberar(id_usuario)
+
+    async def _adquirir(self, id_usuario: str):
+        entrada = self._travas.get(id_usuario)
+        if entrada is None:
+            entrada = self._travas[id_usuario] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            await entrada[0].acquire()
+        except BaseException:
+            self._descartar(id_usuario)
+            raise
+
+    def _liberar(self, id_usuario: str):
+        self._travas[id_usuario][0].release()
+        self._descartar(id_usuario)
+
+    def _descartar(self, id_usuario: str):
+        entrada = self._travas[id_usuario]
+        entrada[1] -= 1
+        if entrada[1] == 0:
+            del self._travas[id_usuario]
+
+    async def encerrar(self):
+        """Espera as gravações pendentes do histórico antes de encerrar."""
+        while self._gravacoes:
+            await asyncio.gather(*list(self._gravacoes), return_exceptions=True)
+        self.executor_classificacao.shutdown()
+        self.executor_historico.shutdown()
+        self.chatbot.encerrar()
+
+
+servico = ServicoAssincrono(chatbot)
+
+
+# --- Aplicação ASGI ---
+def _json(status: int, dados: dict, cabecalhos: list = ()) -> tuple:
+    return status, para_bytes(dados), list(cabecalhos)
+
+
+async def _ler_corpo(receive) -> bytes:
+    corpo = b''
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get('body', b'')
+        if len(corpo) > TAMANHO_MAXIMO_CORPO:
+            raise ValueError("Corpo da requisição muito grande")
+        if not mensagem.get('more_body'):
+            return corpo
+
+
+async def _rotear(metodo: str, caminho: str, receive) -> tuple:
+    if caminho == '/api/health':
+        if metodo != 'GET':
+            return _json(405, {"success": False, "error": "Método não permitido"})
+        return _json(200, dados_saude())
+    if caminho == '/api/ready':
+        if metodo != 'GET':
+            return _json(405, {"success": False, "error": "Método não permitido"})
+        pronto, dados = dados_prontidao()
+        return _json(200 if pronto else 503, dados)
+
+    if caminho != '/api/chat/mensagem':
+        return _json(404, {"success": False, "error": "Rota não encontrada"})
+    if metodo != 'POST':
+        return _json(405, {"success": False, "error": "Método não permitido"})
+
+    try:
+        dados = de_json(await _ler_corpo(receive) or b'null')
+    except ValueError:
+        dados = None
+    if not isinstance(dados, dict) or not isinstance(dados.get('mensagem'), str):
+        return _json(400, {"success": False, "error": "Campo 'mensagem' é obrigatório"})
+    if not usuario_id_aceito(dados.get('usuario_id', 'anonimo')):
+        return _json(400, {"success": False, "error": "Campo 'usuario_id' inválido"})
+
+    # Mesma admissão do servidor_api.py, sem esperar na fila: o loop de eventos não pode bloquear
+    mensagens_por_usuario = {str(dados['usuario_id']): 1} if 'usuario_id' in dados else None
+    if mensagens_por_usuario:
+        espera = controle_admissao.consumir_usuarios(mensagens_por_usuario)
+        if espera:
+            return _json(429, {"success": False,
+                               "error": "Muitas mensagens em pouco tempo. Aguarde um instante e tente novamente."},
+                         [(b'retry-after', str(math.ceil(espera)).encode())])
+    if not controle_admissao.entrar(bloquear=False):
+        controle_admissao.devolver_usuarios(mensagens_por_usuario)  # trabalho não feito: os tokens voltam
+        return _json(503, {"success": False, "error": "Serviço sobrecarregado. Tente novamente em instantes."},
+                     [(b'retry-after', b'1')])
+
+    try:
+        return _json(200, await servico.processar_mensagem(dados['mensagem'], dados.get('usuario_id', 'anonimo')))
+    except Exception as e:
+        return _json(500, {"success": False, "error": f"Erro interno: {str(e)}"})
+    finally:
+        controle_admissao.sair()
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                await servico.encerrar()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    if scope['method'] == 'OPTIONS':  # pré-verificação de CORS, como o flask_cors
+        status, corpo, cabecalhos = 204, b'', []
+    else:
+        status, corpo, cabecalhos = await _rotear(scope['method'], scope['path'], receive)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(corpo)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            (b'access-control-allow-headers', b'content-type'),
+            (b'access-control-allow-methods', b'GET, POST, OPTIONS')
+        ] + cabecalhos
+    })
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+# --- Servidor HTTP/1.1 embutido (quando o uvicorn não está instalado) ---
+async def _responder_erro(writer, status: int):
+    writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                 f"content-length: 0\r\nconnection: close\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+
+
+async def _atender_conexao(reader, writer):
+    try:
+        while True:
+            try:
+                linha = await asyncio.wait_for(reader.readline(), TEMPO_OCIOSO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                break
+            partes = linha.decode('latin-1').split()
+            if len(partes) != 3:
+                break
+
+            metodo, alvo, versao = partes
+            cabecalhos = []
+            while True:
+                linha = await reader.readline()
+                if linha in (b'\r\n', b'\n', b''):
+                    break
+                nome, _, valor = linha.decode('latin-1').partition(':')
+                cabecalhos.append((nome.strip().lower().encode('latin-1'), valor.strip().encode('latin-1')))
+            indice = dict(cabecalhos)
+
+            if b'transfer-encoding' in indice:
+                await _responder_erro(writer, 411)
+                break
+            tamanho = int(indice.get(b'content-length') or 0)
+            if tamanho > TAMANHO_MAXIMO_CORPO:
+                await _responder_erro(writer, 413)
+                break
+            corpo = await reader.readexactly(tamanho) if tamanho else b''
+
+            caminho, _, consulta = alvo.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': versao.split('/')[-1],
+                'method': metodo.upper(), 'scheme': 'http', 'path': caminho, 'raw_path': caminho.encode('latin-1'),
+                'query_string': consulta.encode('latin-1'), 'root_path': '', 'headers': cabecalhos,
+                'client': writer.get_extra_info('peername'), 'server': writer.get_extra_info('sockname')
+            }
+
+            async def receive():
+                return {'type': 'http.request', 'body': corpo, 'more_body': False}
+
+            resposta = {'status': 500, 'headers': [], 'corpo': b''}
+
+            async def send(mensagem):
+                if mensagem['type'] == 'http.response.start':
+                    resposta['status'] = mensagem['status']
+                    resposta['headers'] = mensagem.get('headers', [])
+                elif mensagem['type'] == 'http.response.body':
+                    resposta['corpo'] += mensagem.get('body', b'')
+
+            await app(scope, receive, send)
+
+            manter_conexao = versao == 'HTTP/1.1' and indice.get(b'connection', b'').lower() != b'close'
+            cabecalho = f"HTTP/1.1 {resposta['status']} {HTTPStatus(resposta['status']).phrase}\r\n"
+            cabecalho += ''.join(f"{nome.decode('latin-1')}: {valor.decode('latin-1')}\r\n"
+                                 for nome, valor in resposta['headers'])
+            cabecalho += f"connection: {'keep-alive' if manter_conexao else 'close'}\r\n\r\n"
+            writer.write(cabecalho.encode('latin-1') + resposta['corpo'])
+            await writer.drain()
+            if not manter_conexao:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def servir_embutido(host: str, porta: int, fila: int):
+    servidor = await asyncio.start_server(_atender_conexao, host, porta, backlog=fila)
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sinal, parar.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    print(f"🌐 Servidor assíncrono em http://{host}:{porta} (servidor embutido)")
+    async with servidor:
+        await parar.wait()
+    await servico.encerrar()
+    print("👋 Servidor assíncrono encerrado.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor assíncrono (ASGI) do chatbot.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=5000)
+    parser.add_argument('--fila', type=int, default=4096, help="conexões pendentes aceitas pelo socket")
+    parser.add_argument('--servidor', choices=['auto', 'uvicorn', 'embutido'], default='auto')
+    argumentos = parser.parse_args()
+
+    if argumentos.servidor == 'uvicorn' and uvicorn is None:
+        print("❌ uvicorn não está instalado (pip install uvicorn); use --servidor embutido.")
+    elif argumentos.servidor != 'embutido' and uvicorn is not None:
+        uvicorn.run(app, host=argumentos.host, port=argumentos.porta, backlog=argumentos.fila,
+                    lifespan='on', timeout_keep_alive=TEMPO_OCIOSO_SEGUNDOS)
+    else:
+        asyncio.run(servir_embutido(argumentos.host, argumentos.porta, argumentos.fila))
@@ -0,0 +1,99 @@
+"""
+Servidor de produção do chatbot: um processo principal carrega o modelo uma única
+vez (pontuador NumPy mapeado em memória) e cria N processos trabalhadores com
+fork, que compartilham o socket de escuta e as páginas do modelo.
+
+Uso: python servidor_producao.py --trabalhadores 4 --porta 5000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def criar_socket(host: str, porta: int, fila: int) -> socket.socket:
+    socket_servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    socket_servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    socket_servidor.bind((host, porta))
+    socket_servidor.listen(fila)
+    socket_servidor.set_inheritable(True)
+    return socket_servidor
+
+
+def iniciar_trabalhador(app, chatbot, socket_servidor: socket.socket, host: str, porta: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # --- Processo trabalhador ---
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # o Ctrl+C é tratado pelo processo principal
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        servidor = make_server(host, porta, app, threaded=True, fd=socket_servidor.fileno())
+        servidor.serve_forever()
+    finally:
+        # os._exit não roda o atexit: grava aqui o que estiver no buffer do histórico
+        chatbot.encerrar()
+        os._exit(0)
+
+
+def executar(trabalhadores: int, host: str, porta: int, fila: int):
+    # O modo multiprocesso precisa estar definido antes de o configuracao_servidor criar o chatbot
+    os.environ['CHATBOT_MULTIPROCESSO'] = '1'
+    from servidor_api import app, chatbot
+
+    if not hasattr(os, 'fork'):
+        print("❌ O modo de produção com vários processos exige um sistema com fork (Linux/macOS).")
+        sys.exit(1)
+
+    socket_servidor = criar_socket(host, porta, fila)
+    # Objetos já carregados deixam de ser visitados pelo coletor, evitando cópias das páginas nos filhos
+    gc.freeze()
+
+    processos = {iniciar_trabalhador(app, chatbot, socket_servidor, host, porta) for _ in range(trabalhadores)}
+    print(f"🌐 Servidor de produção em http://{host}:{porta} com {trabalhadores} processos: {sorted(processos)}")
+
+    encerrando = False
+
+    def encerrar(*_):
+        nonlocal encerrando
+        encerrando = True
+        for pid in processos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+    while processos:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        processos.discard(pid)
+        if not encerrando:
+            print(f"⚠️  Processo {pid} terminou inesperadamente; iniciando um substituto.")
+            time.sleep(0.5)
+            processos.add(iniciar_trabalhador(app, chatbot, socket_servidor, host, porta))
+
+    socket_servidor.close()
+    print("👋 Servidor de produção encerrado.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor de produção do chatbot com vários processos.")
+    parser.add_argument('--trabalhadores', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=5000)
+    parser.add_argument('--fila', type=int, default=1024, help="conexões pendentes aceitas pelo socket")
+    argumentos = parser.parse_args()
+    executar(argumentos.trabalhadores, argumentos.host, argumentos.porta, argumentos.fila)
@@ -0,0 +1,162 @@
+"""
+Mede o tempo de inicialização a frio: cada medição é um processo Python novo que
+importa o chatbot (ou um dos servidores), o constrói e responde à primeira mensagem.
+Roda em um diretório temporário com cópias da base e do modelo: não toca no
+histórico real. Com --meta-ms, termina com código 1 se a mediana ultrapassar a meta
+(útil para barrar regressões no deploy).
+
+Exemplos:
+    python tempo_inicializacao.py
+    python tempo_inicializacao.py --modo async --repeticoes 10 --meta-ms 800
+    python tempo_inicializacao.py --sem-artefatos     # sem base compilada nem modelo_compilado/
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODOS = ('nucleo', 'flask', 'async')
+ARQUIVOS_MODELO = ('base_conhecimento.json', 'base_conhecimento_compilada.json',
+                   'modelo_chatbot.joblib', 'modelo_compilado')
+ARTEFATOS_DERIVADOS = ('base_conhecimento_compilada.json', 'modelo_compilado')
+MENSAGEM = "quero agendar um exame"
+
+
+# --- Processo medido ---
+def medir_filho(modo: str) -> dict:
+    inicio = time.perf_counter()
+    if modo == 'nucleo':
+        from chatbot_core import ChatbotClinica
+        importacao = time.perf_counter() - inicio
+        chatbot = ChatbotClinica(usar_pontuador_compilado=True)
+
+        def responder():
+            return chatbot.processar_mensagem(MENSAGEM, 'medicao_inicializacao')
+    elif modo == 'flask':
+        from servidor_api import app, chatbot
+        cliente = app.test_client()
+
+        def responder():
+            return cliente.post('/api/chat/mensagem', json={"mensagem": MENSAGEM,
+                                                            "usuario_id": 'medicao_inicializacao'}).get_json()
+    else:
+        import asyncio
+        from servidor_async import servico, chatbot
+
+        def responder():
+            return asyncio.run(servico.processar_mensagem(MENSAGEM, 'medicao_inicializacao'))
+    pronto = time.perf_counter()
+    if modo != 'nucleo':
+        # Nos servidores o chatbot é criado na importação do módulo
+        importacao = pronto - inicio - chatbot.tempos_inicializacao["total"]
+
+    resposta = responder()
+    fim = time.perf_counter()
+    return {
+        "importacao": importacao,
+        "inicializacao": chatbot.tempos_inicializacao["total"],
+        "fases": chatbot.tempos_inicializacao,
+        "primeira_resposta": fim - pronto,
+        "no_processo": fim - inicio,
+        "categoria": resposta["data"]["categoria"],
+        "sklearn_importado": 'sklearn' in sys.modules,
+        "flask_importado": 'flask' in sys.modules,
+        "relogio_fim": time.time()
+    }
+
+
+# --- Processo principal ---
+def preparar_ambiente(diretorio_origem: str) -> str:
+    diretorio = tempfile.mkdtemp(prefix='inicializacao_chatbot_')
+    for nome in ARQUIVOS_MODELO:
+        origem = os.path.join(diretorio_origem, nome)
+        if os.path.isdir(origem):
+            shutil.copytree(origem, os.path.join(diretorio, nome))
+        elif os.path.exists(origem):
+            shutil.copy(origem, diretorio)
+    return diretorio
+
+
+def remover_artefatos(diretorio: str):
+    for nome in ARTEFATOS_DERIVADOS:
+        caminho = os.path.join(diretorio, nome)
+        if os.path.isdir(caminho):
+            shutil.rmtree(caminho)
+        elif os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def executar_medicao(modo: str, diretorio: str) -> dict:
+    ambiente = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    inicio = time.time()
+    processo = subprocess.run([sys.executable, os.path.abspath(__file__), '--filho', modo], cwd=diretorio,
+                              env=ambiente, capture_output=True, text=True)
+    if processo.returncode != 0:
+        raise RuntimeError(f"Medição '{modo}' falhou:\n{processo.stderr}")
+    resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+    # Inclui a partida do interpretador, que o processo medido não enxerga
+    resultado["ate_primeira_resposta"] = resultado.pop("relogio_fim") - inicio
+    return resultado
+
+
+def resumir(medicoes: list) -> dict:
+    def mediana_ms(chave):
+        return round(statistics.median(medicao[chave] for medicao in medicoes) * 1000, 1)
+
+    return {
+        "medicoes": len(medicoes),
+        "ate_primeira_resposta_ms": mediana_ms("ate_primeira_resposta"),
+        "maximo_ms": round(max(medicao["ate_primeira_resposta"] for medicao in medicoes) * 1000, 1),
+        "importacao_ms": mediana_ms("importacao"),
+        "inicializacao_ms": mediana_ms("inicializacao"),
+        "primeira_resposta_ms": mediana_ms("primeira_resposta"),
+        "fases_ms": {fase: round(statistics.median(medicao["fases"][fase] for medicao in medicoes) * 1000, 1)
+                     for fase in medicoes[0]["fases"]},
+        "sklearn_importado": any(medicao["sklearn_importado"] for medicao in medicoes),
+        "flask_importado": any(medicao["flask_importado"] for medicao in medicoes)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempo de inicialização a frio do chatbot.")
+    parser.add_argument('--modo', choices=MODOS + ('todos',), default='todos')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--meta-ms', type=float, default=None, help="mediana máxima até a primeira resposta")
+    parser.add_argument('--sem-artefatos', action='store_true',
+                        help="apaga a base compilada e o modelo_compilado/ antes de cada medição")
+    parser.add_argument('--filho', choices=MODOS, help=argparse.SUPPRESS)
+    argumentos = parser.parse_args()
+
+    if argumentos.filho:
+        resultado = medir_filho(argumentos.filho)
+        print(json.dumps(resultado))
+        sys.exit(0)
+
+    diretorio = preparar_ambiente(os.getcwd())
+    relatorio = {}
+    try:
+        modos = MODOS if argumentos.modo == 'todos' else (argumentos.modo,)
+        for modo in modos:
+            executar_medicao(modo, diretorio)  # gera os artefatos que faltarem (e aquece o cache de disco)
+            medicoes = []
+            for _ in range(argumentos.repeticoes):
+                if argumentos.sem_artefatos:
+                    remover_artefatos(diretorio)
+                medicoes.append(executar_medicao(modo, diretorio))
+            relatorio[modo] = resumir(medicoes)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    acima_da_meta = [modo for modo, resumo in relatorio.items()
+                     if argumentos.meta_ms is not None and resumo["ate_primeira_resposta_ms"] > argumentos.meta_ms]
+    if acima_da_meta:
+        print(f"❌ Acima da meta de {argumentos.meta_ms:.0f} ms: {', '.join(acima_da_meta)}")
+        sys.exit(1)
+    if argumentos.meta_ms is not None:
+        print(f"✅ Todos os modos abaixo da meta de {argumentos.meta_ms:.0f} ms")
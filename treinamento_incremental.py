@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import threading
+import time
+import datetime
+import urllib.request
+
+from normalizacao import normalizar_texto
+
+
+def adicionar_frases_base(arquivo_base: str, novas_frases: list,
+                          frases_iniciais: list = None, categorias_iniciais: list = None) -> int:
+    """
+    Acrescenta pares {"frase", "categoria"} à base de conhecimento, ignorando os que
+    já existem, e regrava o arquivo de forma atômica. Retorna quantos foram adicionados.
+    """
+    if os.path.exists(arquivo_base):
+        with open(arquivo_base, 'r', encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+    else:
+        dados = {'frases': list(frases_iniciais or []), 'categorias': list(categorias_iniciais or [])}
+
+    existentes = {(normalizar_texto(frase), categoria) for frase, categoria in zip(dados['frases'], dados['categorias'])}
+    adicionadas = 0
+    for item in novas_frases:
+        frase, categoria = item['frase'].strip(), item['categoria']
+        if not frase or (normalizar_texto(frase), categoria) in existentes:
+            continue
+        existentes.add((normalizar_texto(frase), categoria))
+        dados['frases'].append(frase)
+        dados['categorias'].append(categoria)
+        adicionadas += 1
+
+    if adicionadas:
+        caminho_temporario = f"{arquivo_base}.{os.getpid()}.tmp"
+        with open(caminho_temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(dados, arquivo, indent=4, ensure_ascii=False)
+        os.replace(caminho_temporario, arquivo_base)
+    return adicionadas
+
+
+class TreinadorEmSegundoPlano:
+    """
+    Recebe novas frases, grava na base de conhecimento e retreina o modelo em uma
+    thread separada, trocando-o no ChatbotClinica em uso ao final. Pedidos que chegam
+    durante a espera ('atraso_segundos') ou durante um treino são agrupados em um
+    único retreino, de modo que rajadas de inclusões não geram um treino por frase.
+    """
+
+    def __init__(self, chatbot, atraso_segundos: float = 2.0):
+        self.chatbot = chatbot
+        self.atraso_segundos = atraso_segundos
+        self._trava = threading.Lock()
+        self._thread = None
+        self.estado = {
+            "pendente": False,
+            "em_andamento": False,
+            "ultimo_treino": None,
+            "duracao_segundos": None,
+            "frases_treinadas": len(chatbot.frases),
+            "ultimo_erro": None
+        }
+
+    def adicionar_frases(self, novas_frases: list) -> int:
+        with self._trava:
+            adicionadas = adicionar_frases_base(
+                self.chatbot.ARQUIVO_BASE_CONHECIMENTO, novas_frases,
+                self.chatbot.frases, self.chatbot.categorias
+            )
+        if adicionadas:
+            self.agendar_retreino()
+        return adicionadas
+
+    def agendar_retreino(self):
+        with self._trava:
+            self.estado["pendente"] = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name="treinador-chatbot", daemon=True)
+                self._thread.start()
+
+    def _executar(self):
+        while True:
+            time.sleep(self.atraso_segundos)
+            with self._trava:
+                if not self.estado["pendente"]:
+                    self._thread = None
+                    return
+                self.estado["pendente"] = False
+                self.estado["em_andamento"] = True
+
+            inicio = time.perf_counter()
+            try:
+                self.estado["frases_treinadas"] = self.chatbot.retreinar_modelo()
+                self.estado["ultimo_erro"] = None
+                print(f"✅ Modelo retreinado em segundo plano com {self.estado['frases_treinadas']} frases.")
+            except Exception as erro:
+                self.estado["ultimo_erro"] = str(erro)
+                print(f"❌ Erro no retreino em segundo plano: {erro}")
+            finally:
+                self.estado["em_andamento"] = False
+                self.estado["duracao_segundos"] = round(time.perf_counter() - inicio, 3)
+                self.estado["ultimo_treino"] = datetime.datetime.now().isoformat()
+
+
+def _enviar_ao_servidor(url: str, caminho: str, dados: dict, token: str) -> dict:
+    requisicao = urllib.request.Request(
+        url.rstrip('/') + caminho,
+        data=json.dumps(dados).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'X-Token-Admin': token or ''},
+        method='POST'
+    )
+    with urllib.request.urlopen(requisicao) as resposta:
+        return json.load(resposta)
+
+
+# --- Uso via linha de comando ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inclui frases na base de conhecimento e retreina o chatbot.")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    adicionar = subcomandos.add_parser('adicionar', help="adiciona uma frase rotulada")
+    adicionar.add_argument('frase')
+    adicionar.add_argument('categoria')
+
+    importar = subcomandos.add_parser('importar', help="adiciona frases de um JSONL com 'frase' e 'categoria'")
+    importar.add_argument('arquivo')
+
+    subcomandos.add_parser('retreinar', help="retreina o modelo a partir da base atual")
+
+    for subcomando in subcomandos.choices.values():
+        subcomando.add_argument('--url', help="servidor em execução (ex.: http://localhost:5000); "
+                                              "sem ele, altera os arquivos locais")
+        subcomando.add_argument('--token', default=os.environ.get('CHATBOT_TOKEN_ADMIN'),
+                                help="token das rotas de administração")
+    argumentos = parser.parse_args()
+
+    novas = []
+    if argumentos.comando == 'adicionar':
+        novas = [{"frase": argumentos.frase, "categoria": argumentos.categoria}]
+    elif argumentos.comando == 'importar':
+        with open(argumentos.arquivo, 'r', encoding='utf-8') as arquivo:
+            novas = [json.loads(linha) for linha in arquivo if linha.strip()]
+
+    if argumentos.url:
+        if novas:
+            resposta = _enviar_ao_servidor(argumentos.url, '/api/admin/frases', {"frases": novas}, argumentos.token)
+        else:
+            resposta = _enviar_ao_servidor(argumentos.url, '/api/admin/retreinar', {}, argumentos.token)
+        print(json.dumps(resposta, ensure_ascii=False, indent=2))
+    else:
+        from chatbot_core import ChatbotClinica
+
+        chatbot = ChatbotClinica()
+        if novas:
+            print(f"➕ {adicionar_frases_base(chatbot.ARQUIVO_BASE_CONHECIMENTO, novas, chatbot.frases, chatbot.categorias)}"
+                  f" frases adicionadas à base.")
+        print(f"✅ Modelo retreinado com {chatbot.retreinar_modelo()} frases.")